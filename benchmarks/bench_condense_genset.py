@@ -0,0 +1,62 @@
+""" Benchmark of `_condense_genset_co2_differences` against the NEMED v0.3.3 loop, on a synthetic multi-year GENUNITS
+history (after mapping GENSETID to DUID).
+
+Usage: python benchmarks/bench_condense_genset.py --years 12 --duids 400 --multi-genset 0.2
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from nemed.process import _condense_genset_co2_differences
+import legacy
+
+SOURCES = ['Black coal', 'Brown coal', 'Natural Gas (Pipeline)', 'Diesel oil', 'Hydro', 'Wind', 'Solar']
+DATA_SOURCES = ['NGA 2018', 'ISP 2018', 'NTNDP 2014']
+
+
+def synthetic_genunits_history(years, duids, multi_genset, seed=0):
+    """Monthly GENUNITS factors for `duids` units over `years`, where a `multi_genset` share of DUIDs map to 2-4
+    GENSETIDs with differing factors, sources and occasional missing entries."""
+    rng = np.random.default_rng(seed)
+    n_gensets = np.where(rng.random(duids) < multi_genset, rng.integers(2, 5, duids), 1)
+    units = pd.DataFrame([(f"DUID{i}", f"DUID{i}_G{j}") for i in range(duids) for j in range(n_gensets[i])],
+                         columns=['DUID', 'GENSETID'])
+    units['CO2E_ENERGY_SOURCE'] = rng.choice(SOURCES, len(units))
+    units['CO2E_DATA_SOURCE'] = rng.choice(DATA_SOURCES, len(units))
+    units['CO2E_EMISSIONS_FACTOR'] = rng.uniform(0, 1.3, len(units)).round(3)
+
+    months = pd.DataFrame({'file_year': np.repeat(np.arange(2011, 2011 + years), 12),
+                           'file_month': np.tile(np.arange(1, 13), years)})
+    table = months.merge(units, how='cross')
+    table.loc[rng.random(len(table)) < 0.02, 'CO2E_EMISSIONS_FACTOR'] = np.nan
+    return table[['file_year', 'file_month', 'GENSETID', 'DUID', 'CO2E_EMISSIONS_FACTOR', 'CO2E_ENERGY_SOURCE',
+                  'CO2E_DATA_SOURCE']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=12)
+    parser.add_argument('--duids', type=int, default=400)
+    parser.add_argument('--multi-genset', type=float, default=0.2)
+    args = parser.parse_args()
+
+    table = synthetic_genunits_history(args.years, args.duids, args.multi_genset)
+    print(f"GENUNITS history: {len(table)} rows, {args.years} years, {args.duids} DUIDs")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        start = time.perf_counter()
+        expected = legacy.condense_genset_co2_differences(table)
+        legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = _condense_genset_co2_differences(table)
+    vectorised_s = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(result, expected)
+    print(f"legacy loop: {legacy_s:.3f}s | vectorised: {vectorised_s:.3f}s | speedup: {legacy_s / vectorised_s:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+""" Offline benchmark suite of the total and marginal emissions calculations, on synthetic inputs written to a temporary
+cache by `fixtures.py`. Reports wall time, throughput and peak (traced) memory of each case.
+
+Usage: python benchmarks/bench_suite.py --duids 300 --months 1 --repeat 3
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+from nemed import get_total_emissions
+from nemed import process
+from nemed.downloader import download_unit_dispatch, download_plant_emissions_factors, download_genset_map
+from nemed.defaults import CO2E_DATA_SOURCE_YEARMAP
+from nemed.helper_functions import table_memo
+from nemed.helper_functions.result_cache import MANIFEST_NAME
+from nemed.helper_functions.rollup_store import STORE_DIR as ROLLUP_DIR
+import fixtures
+
+
+def measure(func, repeat):
+    """Runs `func` `repeat` times, returning the result of the last run, the best wall time [s] and the peak memory
+    [MB] allocated (as traced by tracemalloc) over all runs."""
+    best, peak = float('inf'), 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, best, peak / 2**20
+
+
+def clear_results(cache):
+    """Removes processed results, rollups and memoised tables so that the next run computes from inputs."""
+    for path in glob.glob(os.path.join(cache, "processed_co2_total_*.parquet")):
+        os.remove(path)
+    for path in [os.path.join(cache, MANIFEST_NAME), os.path.join(cache, ROLLUP_DIR)]:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    table_memo.clear_memo()
+
+
+def run_suite(cache, start_time, end_time, repeat):
+    """Benchmarks each case on the cache, returning a table with a row per case."""
+    dispatch = download_unit_dispatch(start_time, end_time, cache, return_all=False, check=False)
+    genunits = download_plant_emissions_factors(start_time, end_time, cache)
+    genunits = genunits.merge(download_genset_map(cache)[['GENSETID', 'DUID']], on='GENSETID', how='left')
+    genunits['CO2E_DATA_YEAR'] = genunits['CO2E_DATA_SOURCE'].map(CO2E_DATA_SOURCE_YEARMAP)
+
+    def total_emissions_cold():
+        clear_results(cache)
+        return get_total_emissions(start_time, end_time, cache)
+
+    # Each case is (name, callable, rows in)
+    cases = [
+        ('_calculate_energy_ramp', lambda: process._calculate_energy_ramp(dispatch), len(dispatch)),
+        ('_condense_genset_co2_differences', lambda: process._condense_genset_co2_differences(genunits),
+         len(genunits)),
+        ('get_total_emissions (cold)', total_emissions_cold, len(dispatch)),
+        ('get_total_emissions (cached)', lambda: get_total_emissions(start_time, end_time, cache, by='day'),
+         len(dispatch)),
+        ('get_marginal_emitter', lambda: process.get_marginal_emitter(start_time, end_time, cache), None),
+    ]
+    results, outputs = [], {}
+    for name, func, rows in cases:
+        outputs[name], seconds, peak_mb = measure(func, repeat)
+        results += [(name, rows, seconds, peak_mb)]
+
+    regions = outputs['get_total_emissions (cold)'].drop(columns='Intensity_Index')
+    for by in ['hour', 'day', 'month']:
+        _, seconds, peak_mb = measure(lambda: process.aggregate_data_by(regions, by), repeat)
+        results += [(f"aggregate_data_by ({by})", len(regions), seconds, peak_mb)]
+
+    table = pd.DataFrame(results, columns=['case', 'rows_in', 'seconds', 'peak_mb'])
+    table['rows_per_s'] = (table['rows_in'] / table['seconds']).round(0)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duids', type=int, default=300)
+    parser.add_argument('--months', type=int, default=1)
+    parser.add_argument('--start', default='2022/01')
+    parser.add_argument('--multi-genset', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cache', default=None,
+                        help="Directory for synthetic inputs, by default a temporary directory")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, "%Y/%m")
+    end = start + pd.DateOffset(months=args.months)
+    cache = args.cache or tempfile.mkdtemp(prefix="nemed_bench_")
+    try:
+        fixtures.write_cache(cache, fixtures.synthetic_units(args.duids, args.multi_genset), start, args.months)
+        print(f"Synthetic inputs: {args.duids} DUIDs, {args.months} month(s) from {start:%Y-%m} in {cache}")
+        table = run_suite(cache, f"{start:%Y/%m/%d %H:%M}", f"{end:%Y/%m/%d %H:%M}", args.repeat)
+        print(table.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    finally:
+        if args.cache is None:
+            shutil.rmtree(cache)
+
+
+if __name__ == '__main__':
+    main()
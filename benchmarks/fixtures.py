@@ -0,0 +1,145 @@
+""" Synthetic NEMWEB-shaped inputs written to a cache directory in the formats read by NEMED, such that total and
+marginal emissions can be computed offline.
+
+Usage: python benchmarks/fixtures.py CACHE --duids 300 --months 1 --start 2022/01
+"""
+import argparse
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from nemed.downloader import _default_asof_date, read_plant_auxload_csv
+from nemed.helper_functions import pricesetter_store
+from nemed.helper_functions.mod_nemosis import mms_cache_filename
+from nemed.helper_functions.result_cache import mms_month_files
+
+REGIONS = ['NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1']
+# Energy sources with a typical emissions factor [tCO2-e/MWh] and capacity [MW]
+SOURCES = {'Black coal': (0.9, 600), 'Brown coal': (1.2, 500), 'Natural Gas (Pipeline)': (0.5, 200),
+           'Diesel oil': (0.8, 50), 'Hydro': (0.0, 150), 'Wind': (0.0, 100), 'Solar': (0.0, 80)}
+DATA_SOURCES = ['NGA 2018', 'ISP 2018', 'NTNDP 2014']
+
+
+def synthetic_units(duids, multi_genset=0.1, load_share=0.1, seed=0):
+    """Unit register of `duids` units, using DUIDs from the packaged auxiliary load assumptions first (so that sent-out
+    energy is exercised) followed by synthetic DUIDs. A `multi_genset` share of units map to 2-3 GENSETIDs.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Units with columns [DUID, REGIONID, DISPATCHTYPE, CO2E_ENERGY_SOURCE, CO2E_EMISSIONS_FACTOR, CAPACITY,
+        N_GENSETS]
+    """
+    rng = np.random.default_rng(seed)
+    known = list(read_plant_auxload_csv()['DUID'].drop_duplicates())[:duids]
+    names = known + [f"SYN{i:04d}" for i in range(duids - len(known))]
+    source = rng.choice(list(SOURCES), duids)
+    return pd.DataFrame({
+        'DUID': names,
+        'REGIONID': rng.choice(REGIONS, duids),
+        'DISPATCHTYPE': np.where(rng.random(duids) < load_share, 'LOAD', 'GENERATOR'),
+        'CO2E_ENERGY_SOURCE': source,
+        'CO2E_EMISSIONS_FACTOR': [round(SOURCES[s][0] * rng.uniform(0.9, 1.1), 3) for s in source],
+        'CAPACITY': [SOURCES[s][1] * rng.uniform(0.5, 1.5) for s in source],
+        'N_GENSETS': np.where(rng.random(duids) < multi_genset, rng.integers(2, 4, duids), 1),
+    })
+
+
+def write_cache(cache, units, start, months, seed=0):
+    """Writes synthetic inputs for `months` calendar months from `start` to `cache`:
+
+    - DISPATCH_UNIT_SCADA and GENUNITS monthly feather files, as cached by nemosis, for the period plus a month either
+      side (read for the energy ramp at segment boundaries).
+    - DUALLOC and DUDETAILSUMMARY feather snapshots as of `_default_asof_date`.
+    - Energy market price setters in the Parquet store, one file per day.
+
+    Parameters
+    ----------
+    cache : str
+        Cache directory to write to.
+    units : pandas.DataFrame
+        Unit register, from `synthetic_units`.
+    start : datetime
+        Start of the first month.
+    months : int
+        Number of calendar months.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(cache, exist_ok=True)
+    gensets = units.loc[units.index.repeat(units['N_GENSETS'])].reset_index(drop=True)
+    gensets['GENSETID'] = gensets['DUID'] + '_G' + gensets.groupby('DUID').cumcount().astype(str)
+
+    month_starts = pd.date_range(start - pd.DateOffset(months=1), periods=months + 2, freq='MS')
+    for month in month_starts:
+        _write_feather(_scada_month(units, month, rng), "DISPATCH_UNIT_SCADA", month, cache)
+        _write_feather(_genunits_month(gensets, rng), "GENUNITS", month, cache)
+
+    asof = _default_asof_date()
+    dualloc = pd.DataFrame({'EFFECTIVEDATE': '2020/01/01 00:00:00', 'VERSIONNO': '1', 'DUID': gensets['DUID'],
+                            'GENSETID': gensets['GENSETID'], 'LASTCHANGED': '2020/01/01 00:00:00'})
+    dudetail = pd.DataFrame({'DUID': units['DUID'], 'START_DATE': '2020/01/01 00:00:00',
+                             'END_DATE': '2999/12/31 00:00:00', 'DISPATCHTYPE': units['DISPATCHTYPE'],
+                             'REGIONID': units['REGIONID'], 'LASTCHANGED': '2020/01/01 00:00:00'})
+    for table_name, table in [("DUALLOC", dualloc), ("DUDETAILSUMMARY", dudetail)]:
+        for path in mms_month_files(table_name, asof, asof, cache):
+            table.reset_index(drop=True).to_feather(path)
+
+    generators = units[units['DISPATCHTYPE'] == 'GENERATOR']
+    for day in pd.date_range(start, start + pd.DateOffset(months=months), freq='D', inclusive='left'):
+        pricesetter_store.write_day(cache, day.to_pydatetime(), _pricesetter_day(generators, day, rng))
+
+
+def _write_feather(table, table_name, month, cache):
+    table.reset_index(drop=True).to_feather(mms_cache_filename(table_name, month.year, month.month, cache))
+
+
+def _scada_month(units, month, rng):
+    """DISPATCH_UNIT_SCADA records for each unit and interval ending within a month, following a daily profile."""
+    times = pd.date_range(month + pd.Timedelta(minutes=5), month + pd.DateOffset(months=1), freq='5T')
+    profile = 0.6 + 0.3 * np.sin(2 * np.pi * (times.hour * 60 + times.minute) / 1440)
+    scada = np.outer(profile, units['CAPACITY']) * rng.uniform(0.9, 1.0, (len(times), len(units)))
+    return pd.DataFrame({'SETTLEMENTDATE': np.repeat(times, len(units)),
+                         'DUID': np.tile(units['DUID'], len(times)),
+                         'SCADAVALUE': scada.ravel().round(3)})
+
+
+def _genunits_month(gensets, rng):
+    """GENUNITS records of a month, with string columns as cached from the MMS CSV. A small share of factors are
+    missing, as occurs in MMS."""
+    factor = gensets['CO2E_EMISSIONS_FACTOR'].astype(str).where(rng.random(len(gensets)) > 0.01, None)
+    return pd.DataFrame({'GENSETID': gensets['GENSETID'], 'LASTCHANGED': '2020/01/01 00:00:00',
+                         'DISPATCHTYPE': gensets['DISPATCHTYPE'], 'CO2E_EMISSIONS_FACTOR': factor,
+                         'CO2E_ENERGY_SOURCE': gensets['CO2E_ENERGY_SOURCE'],
+                         'CO2E_DATA_SOURCE': rng.choice(DATA_SOURCES, len(gensets))})
+
+
+def _pricesetter_day(generators, day, rng, max_setters=3):
+    """Energy market price setters for each region and interval ending within a day, of 1 to `max_setters` units."""
+    times = pd.date_range(day + pd.Timedelta(minutes=5), day + pd.Timedelta(days=1), freq='5T')
+    keys = pd.MultiIndex.from_product([times, REGIONS], names=['PeriodID', 'RegionID']).to_frame(index=False)
+    keys = keys.loc[keys.index.repeat(rng.integers(1, max_setters + 1, len(keys)))].reset_index(drop=True)
+    increase = rng.uniform(0.05, 1.0, len(keys))
+    band_price = rng.uniform(20, 300, len(keys)).round(2)
+    return pd.DataFrame({'PeriodID': keys['PeriodID'].dt.strftime("%Y-%m-%d %H:%M:%S"),
+                         'RegionID': keys['RegionID'], 'Price': band_price,
+                         'Unit': rng.choice(generators['DUID'].to_numpy(), len(keys)),
+                         'BandNo': rng.integers(1, 11, len(keys)), 'Increase': increase,
+                         'RRNBandPrice': band_price, 'BandCost': (increase * band_price).round(3)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('cache')
+    parser.add_argument('--duids', type=int, default=300)
+    parser.add_argument('--months', type=int, default=1)
+    parser.add_argument('--start', default='2022/01')
+    parser.add_argument('--multi-genset', type=float, default=0.1)
+    args = parser.parse_args()
+
+    units = synthetic_units(args.duids, args.multi_genset)
+    write_cache(args.cache, units, datetime.strptime(args.start, "%Y/%m"), args.months)
+    print(f"Wrote {args.months} month(s) of synthetic inputs for {args.duids} DUIDs to {args.cache}")
+
+
+if __name__ == '__main__':
+    main()
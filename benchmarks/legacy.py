@@ -0,0 +1,34 @@
+""" Reference implementations of process functions prior to vectorisation, retained for benchmark comparisons """
+import pandas as pd
+
+
+def condense_genset_co2_differences(all_df):
+    """`process._condense_genset_co2_differences` as of NEMED v0.3.3"""
+    for duid in all_df[all_df.duplicated(['file_year', 'file_month', 'DUID'])]['DUID'].unique():
+        correction = all_df[all_df['DUID'] == duid].dropna(subset=['CO2E_EMISSIONS_FACTOR', 'CO2E_ENERGY_SOURCE',
+                                                                   'CO2E_DATA_SOURCE'])
+
+        # If year-month-gensetid is duplicated in correction df, average vals and drop correction
+        if correction.duplicated(subset=['file_year', 'file_month', 'DUID']).any():
+            result = []
+            for yr in correction['file_year'].unique():
+                for mn in correction[correction['file_year'] == yr]['file_month'].unique():
+                    subset = correction[(correction['file_year'] == yr) & (correction['file_month'] == mn)]
+                    descriptor = [' / '.join(subset['CO2E_ENERGY_SOURCE'].to_list())
+                                  if len(subset['CO2E_DATA_SOURCE'].unique()) == 1
+                                  else subset['CO2E_ENERGY_SOURCE'].iloc[0]][0]
+                    emissions = subset['CO2E_EMISSIONS_FACTOR'].mean()
+                    subset = subset.drop_duplicates(['file_year', 'file_month', 'DUID'], keep='first')
+                    subset['CO2E_ENERGY_SOURCE'] = descriptor
+                    subset['CO2E_EMISSIONS_FACTOR'] = emissions
+                    result += [subset]
+            result = pd.concat(result, ignore_index=True)
+        else:
+            result = correction
+
+        # Remove duid entry in main df
+        all_df = all_df[~all_df['DUID'].isin([duid])]
+
+        # Add resultant duid entry to main df
+        all_df = pd.concat([all_df, result], ignore_index=True)
+    return all_df.drop(['GENSETID'], axis=1).reset_index(drop=True)
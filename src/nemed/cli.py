@@ -0,0 +1,132 @@
+""" Command line interface, for preparing a cache ahead of offline processing
+
+Usage: nemed warm-cache --start "2022/01/01 00:00" --end "2022/07/01 00:00" --cache CACHE
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import pandas as pd
+from tqdm import tqdm
+from .downloader import download_pricesetter_files, download_aemo_cdeii_summary, _default_asof_date
+from .helper_functions import helpers as hp
+from .helper_functions import dispatch_store
+from .helper_functions.mod_nemosis import overwrite_nemosis_defaults, cache_mms_month, mms_cache_filename
+
+logger = logging.getLogger(__name__)
+DISPATCH_INT_MIN = 5
+# MMS tables read for data in the period, and snapshot tables read as of `_default_asof_date`
+PERIOD_TABLES = ["DISPATCH_UNIT_SCADA", "GENUNITS"]
+SNAPSHOT_TABLES = ["DUALLOC", "DUDETAILSUMMARY"]
+INPUTS = ['mms', 'pricesetters', 'cdeii']
+
+
+def warm_cache(start_time, end_time, cache, workers=4, skip=()):
+    """Downloads and converts all inputs read by `get_total_emissions` and `get_marginal_emissions` for a period, such
+    that later calls do not access NEMWEB. Inputs already cached are skipped, so an interrupted run may be repeated to
+    resume it.
+
+    Parameters
+    ----------
+    start_time : str
+        Start Time Period in format 'yyyy/mm/dd HH:MM'
+    end_time : str
+        End Time Period in format 'yyyy/mm/dd HH:MM'
+    cache : str
+        Raw data location in local directory
+    workers : int, optional
+        Maximum number of concurrent downloads, by default 4
+    skip : list(str), optional
+        Inputs not to retrieve, of 'mms' (DISPATCH_UNIT_SCADA, GENUNITS, DUALLOC and DUDETAILSUMMARY),
+        'pricesetters' and 'cdeii', by default none
+
+    Returns
+    -------
+    list(str)
+        Descriptions of inputs which could not be retrieved.
+    """
+    cache = hp._check_cache(cache)
+    stime = hp._validate_and_convert_date(start_time, "start_time")
+    etime = hp._validate_and_convert_date(end_time, "end_time")
+    failed = []
+
+    if 'mms' not in skip:
+        tasks = [(table, month) for table in PERIOD_TABLES for month in _months(stime, etime)]
+        asof = _default_asof_date()
+        tasks += [(table, month) for table in SNAPSHOT_TABLES for month in _months(asof, asof)]
+        failed += _cache_mms_months(tasks, cache, workers)
+
+    if 'pricesetters' not in skip:
+        logger.info("Caching Price Setter Files...")
+        try:
+            download_pricesetter_files(start_time, end_time, cache, max_downloads=workers)
+        except Exception as e:
+            failed += [f"Price setters ({e})"]
+
+    if 'cdeii' not in skip:
+        logger.info("Caching AEMO CDEII Summary Files...")
+        try:
+            download_aemo_cdeii_summary(start_time, end_time, cache)
+        except Exception as e:
+            failed += [f"CDEII summaries ({e})"]
+
+    for failure in failed:
+        logger.warning(f"Failed to cache: {failure}")
+    return failed
+
+
+def _months(first, last):
+    """Months of the MMS files read for data between `first` and `last`, as in `result_cache.mms_month_files`, with
+    the dispatch interval ending after `last`."""
+    return pd.date_range(datetime(first.year, first.month, 1) - pd.DateOffset(months=1),
+                         last + timedelta(minutes=DISPATCH_INT_MIN), freq='MS')
+
+
+def _cache_mms_months(tasks, cache, workers):
+    """Downloads and converts MMS monthly files to feather concurrently, returning descriptions of failed files."""
+    overwrite_nemosis_defaults()
+    pending = [(table, month) for table, month in tasks
+               if not os.path.exists(mms_cache_filename(table, month.year, month.month, cache))]
+    logger.info(f"Caching {len(pending)} MMS files ({len(tasks) - len(pending)} already cached)...")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool, tqdm(total=len(pending)) as pbar:
+        futures = {pool.submit(_cache_mms_month, table, month, cache): (table, month) for table, month in pending}
+        for future in as_completed(futures):
+            table, month = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += [f"{table} {month:%Y-%m} ({e})"]
+            pbar.update(1)
+    return failed
+
+
+def _cache_mms_month(table_name, month, cache):
+    """Downloads a single MMS monthly file and converts it to feather, without reading it. Unit dispatch is also
+    written to the dispatch store."""
+    cache_mms_month(table_name, month, cache)
+    if table_name == "DISPATCH_UNIT_SCADA":
+        dispatch_store.ensure_month(cache, month)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nemed", description="NEM Emissions Data tool")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm-cache", help=warm_cache.__doc__.splitlines()[0])
+    warm.add_argument("--start", required=True, help="Start Time Period in format 'yyyy/mm/dd HH:MM'")
+    warm.add_argument("--end", required=True, help="End Time Period in format 'yyyy/mm/dd HH:MM'")
+    warm.add_argument("--cache", required=True, help="Raw data location in local directory")
+    warm.add_argument("--workers", type=int, default=4, help="Maximum number of concurrent downloads")
+    warm.add_argument("--skip", nargs="*", choices=INPUTS, default=[], help="Inputs not to retrieve")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm-cache":
+        failed = warm_cache(args.start, args.end, args.cache, workers=args.workers, skip=args.skip)
+        return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,16 @@ CDEII_NEMWEB_BASEURL = (
     "http://nemweb.com.au/Reports/Current/CDEII/"
 )
 
+CDEII_CURRENT_URL = (
+    "https://www.nemweb.com.au/Reports/Current/CDEII/CO2EII_SUMMARY_RESULTS.CSV"
+)
+
+# NEMDE Price Setter daily archive (per market day, starting 04:05)
+PRICESETTER_URL = (
+    "https://www.nemweb.com.au/Data_Archive/Wholesale_Electricity/NEMDE/{year}/NEMDE_{year}_{month}/"
+    "NEMDE_Market_Data/NEMDE_Files/NemPriceSetter_{year}{month}{day}_xml.zip"
+)
+
 # Requests parameters
 REQ_URL_REF = 'https://aemo.com.au/'
 REQ_URL_HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) \
@@ -1,17 +1,19 @@
 """ Downloader functions for retrieving data from various sources"""
 from nemosis import dynamic_data_compiler, static_table
-from nemosis.data_fetch_methods import _read_mms_csv, _dynamic_data_fetch_loop
-from nempy.historical_inputs.xml_cache import XMLCacheManager as XML
 from .defaults import *
 from .helper_functions import helpers as hp
-from .helper_functions.mod_xml_cache import overwrite_xmlcachemanager_with_pricesetter_config, convert_xml_to_json,\
-    read_json_to_df, modpricesetter_get_file_name, modpricesetter_download_xml_from_nemweb
 from .helper_functions.mod_nemosis import overwrite_nemosis_defaults, mod_dynamic_data_fetch_loop
+from .helper_functions.pricesetter_fetch import fetch_pricesetter_days
+from .helper_functions import pricesetter_store as ps_store
+from .helper_functions import dispatch_store
+from .helper_functions import cache_index
+from .helper_functions.result_cache import mms_month_files
+from .helper_functions.table_memo import memoize_table
+from .helper_functions import unit_dimension as ud
 
 import logging
 import os
 import json
-import glob
 from tqdm import tqdm
 import numpy as np
 import pandas as pd
@@ -19,9 +21,24 @@ from datetime import datetime, timedelta
 import requests
 from pathlib import Path
 DISPATCH_INT_MIN = 5
+PLANT_AUXLOAD_FILEPATH = Path(__file__).parent / "./data/plant_auxiliary/_plant_auxload_assumptions.csv"
 logger = logging.getLogger(__name__)
 
 
+def _reference_table_files(table_name):
+    """Files read by `download_genset_map` or `download_dudetailsummary`, used to invalidate memoised tables"""
+    def input_files(cache, asof_date=None, history=False):
+        latest = _default_asof_date() if asof_date is None else hp._validate_and_convert_date(asof_date, "asof_date")
+        return mms_month_files(table_name, latest, latest, cache)
+    return input_files
+
+
+def _plant_emissions_factors_files(start_date, end_date, cache):
+    """Files read by `download_plant_emissions_factors`, used to invalidate memoised tables"""
+    return mms_month_files("GENUNITS", datetime.strptime(start_date, "%Y/%m/%d %H:%M"),
+                           datetime.strptime(end_date, "%Y/%m/%d %H:%M"), cache)
+
+
 def download_cdeii_table():
     # """LEGACY. DEPRECATED.
     
@@ -91,6 +108,7 @@ def download_duid_auxload():
     raise Exception("DEPRECATED in this version of NEMED. See `read_plant_auxload_csv`")
 
 
+@memoize_table(lambda *args, **kwargs: [PLANT_AUXLOAD_FILEPATH])
 def read_plant_auxload_csv(select_columns=['EFFECTIVEFROM', 'DUID', 'PCT_AUXILIARY_LOAD'],
                             coltype={'EFFECTIVEFROM': str, 'DUID': str, 'PCT_AUXILIARY_LOAD': float}):
     """Reads locally stored .csv in package with auxiliary load data mapped to each DUID. Users can update this .csv
@@ -109,13 +127,13 @@ def read_plant_auxload_csv(select_columns=['EFFECTIVEFROM', 'DUID', 'PCT_AUXILIA
     pandas.DataFrame
         Custom table containing columns=['EFFECTIVEFROM', 'DUID', 'PCT_AUXILIARY_LOAD']
     """
-    filepath = Path(__file__).parent / "./data/plant_auxiliary/_plant_auxload_assumptions.csv"
-    table = pd.read_csv(filepath)
+    table = pd.read_csv(PLANT_AUXLOAD_FILEPATH)
     table['EFFECTIVEFROM'] = pd.to_datetime(table['EFFECTIVEFROM'], format="%d/%m/%Y")
     return table[table.columns[table.columns.isin(select_columns)]]
 
 
-def download_plant_emissions_factors(start_date, end_date, cache):
+@memoize_table(_plant_emissions_factors_files)
+def download_plant_emissions_factors(start_date, end_date, cache, max_downloads=4, max_converters=None):
     """Retrieves CO2-equivalent emissions intensity factors (tCO2-e/MWh) for each generator. Metric is reflective of
     sent-out generation. Underlying data is sourced from the 'GENUNITS' table of AEMO MMS at monthly time resolution.
 
@@ -127,6 +145,10 @@ def download_plant_emissions_factors(start_date, end_date, cache):
         Data download period start, in the format: 'yyyy/mm/dd HH:MM'
     end_date : str
         Data download period end, in the format: 'yyyy/mm/dd HH:MM'
+    max_downloads : int, optional
+        Maximum number of concurrent monthly file downloads, by default 4
+    max_converters : int, optional
+        Number of processes converting downloaded files to feather, by default None to use the number of CPUs
 
     Returns
     -------
@@ -162,6 +184,8 @@ def download_plant_emissions_factors(start_date, end_date, cache):
                                         'CO2E_DATA_SOURCE'],
                                     date_filter=None,
                                     fformat="feather",
+                                    max_downloads=max_downloads,
+                                    max_converters=max_converters,
                                     )
     df = pd.concat(df)
     df['file_year'] = df['file_year'].astype(int)
@@ -170,7 +194,8 @@ def download_plant_emissions_factors(start_date, end_date, cache):
     return df.sort_values(['GENSETID','file_year','file_month'])
 
 
-def download_genset_map(cache, asof_date=None):
+@memoize_table(_reference_table_files("DUALLOC"))
+def download_genset_map(cache, asof_date=None, history=False):
     """Download the GENSETID to DUID mapping from DUALLOC MMS Table.
 
     Parameters
@@ -180,6 +205,14 @@ def download_genset_map(cache, asof_date=None):
     asof_date : str, optional
         Date to retrieve DUALLOC table as of, in the format: 'yyyy/mm/dd HH:MM', by default None which will retrieve
         recent data 
+    history : bool, optional
+        Whether to return every effective-dated allocation held in the DUALLOC snapshot as of `asof_date` (the latest
+        version for each DUID and EFFECTIVEDATE, with EFFECTIVEDATE as datetime), for lookups as of a time by
+        `effective_index.EffectiveDatedIndex`. By default False, returning only the latest allocation of each GENSETID.
+
+        .. note::
+            The snapshot holds the allocations of all effective dates, as registered at `asof_date`. Historical
+            snapshots are not read, so allocations later revised or removed are returned as revised.
 
     Returns
     -------
@@ -200,7 +233,7 @@ def download_genset_map(cache, asof_date=None):
     if asof_date != None:
         latest = hp._validate_and_convert_date(asof_date, "asof_date")
     else:
-        latest = datetime(datetime.now().year, datetime.now().month, 1) - timedelta(days = 90)
+        latest = _default_asof_date()
     
     cache = hp._check_cache(cache)
     overwrite_nemosis_defaults()
@@ -215,17 +248,29 @@ def download_genset_map(cache, asof_date=None):
                                     end_time=latest,
                                     table_name="DUALLOC",
                                     raw_data_location=cache,
-                                    select_columns=["EFFECTIVEDATE", "DUID", "GENSETID", "LASTCHANGED"],
+                                    select_columns=["EFFECTIVEDATE", "VERSIONNO", "DUID", "GENSETID", "LASTCHANGED"],
                                     date_filter=None,
                                     fformat="feather",
                                     )
     df = pd.concat(df)
-    df = df.drop(['file_year','file_month', 'LASTCHANGED'], axis=1)
+    if history:
+        # GENSETIDs allocated to a DUID from each EFFECTIVEDATE are those of the latest version
+        df['VERSIONNO'] = pd.to_numeric(df['VERSIONNO'])
+        df = _reference_history(df, 'EFFECTIVEDATE', ['DUID', 'EFFECTIVEDATE'], 'VERSIONNO')
+        return df[['EFFECTIVEDATE', 'DUID', 'GENSETID']].sort_values(['GENSETID', 'EFFECTIVEDATE']) \
+            .reset_index(drop=True)
+    df = df.drop(['file_year','file_month', 'VERSIONNO', 'LASTCHANGED'], axis=1)
     filtered = df.sort_values('EFFECTIVEDATE').drop_duplicates(['GENSETID'], keep='last')
     return filtered.sort_values(['GENSETID','EFFECTIVEDATE']).reset_index(drop=True)
 
 
-def download_dudetailsummary(cache, asof_date=None):
+def _default_asof_date():
+    """Date of the MMS snapshot used for reference tables (DUALLOC, DUDETAILSUMMARY) when `asof_date` is not given."""
+    return datetime(datetime.now().year, datetime.now().month, 1) - timedelta(days = 90)
+
+
+@memoize_table(_reference_table_files("DUDETAILSUMMARY"))
+def download_dudetailsummary(cache, asof_date=None, history=False):
     """Download the DUDETAILSUMMARY MMS table with mapping of Dispatch Type and Region to DUID
 
     Parameters
@@ -235,6 +280,14 @@ def download_dudetailsummary(cache, asof_date=None):
     asof_date : str, optional
         Date to retrieve DUALLOC table as of, in the format: 'yyyy/mm/dd HH:MM', by default None which will retrieve
         recent data 
+    history : bool, optional
+        Whether to return every effective-dated row held in the DUDETAILSUMMARY snapshot as of `asof_date` (the last
+        changed row for each DUID and START_DATE, with START_DATE as datetime), for lookups as of a time by
+        `effective_index.EffectiveDatedIndex`. By default False, returning only the latest details of each DUID.
+
+        .. note::
+            The snapshot holds the details of all start dates, as registered at `asof_date`. Historical snapshots are
+            not read, so details later revised or removed are returned as revised.
 
     Returns
     -------
@@ -256,7 +309,7 @@ def download_dudetailsummary(cache, asof_date=None):
     if asof_date != None:
         latest = hp._validate_and_convert_date(asof_date, "asof_date")
     else:
-        latest = datetime(datetime.now().year, datetime.now().month, 1) - timedelta(days = 90)
+        latest = _default_asof_date()
     
     cache = hp._check_cache(cache)
     overwrite_nemosis_defaults()
@@ -276,11 +329,28 @@ def download_dudetailsummary(cache, asof_date=None):
                                     fformat="feather",
                                     )
     df = pd.concat(df)
+    if history:
+        if not pd.api.types.is_datetime64_any_dtype(df['LASTCHANGED']):
+            # As cached from the MMS CSV, LASTCHANGED ('yyyy/mm/dd HH:MM:SS') orders as text
+            df['LASTCHANGED'] = df['LASTCHANGED'].fillna('')
+        df = _reference_history(df, 'START_DATE', ['DUID', 'START_DATE'], 'LASTCHANGED')
+        return df[['DUID', 'START_DATE', 'DISPATCHTYPE', 'REGIONID']].sort_values(['DUID', 'START_DATE']) \
+            .reset_index(drop=True)
     df = df.drop(['file_year','file_month', 'LASTCHANGED'], axis=1)
     filtered = df.sort_values('START_DATE').drop_duplicates(['DUID'], keep='last')
     return filtered.sort_values(['DUID','START_DATE']).reset_index(drop=True)
 
 
+def _reference_history(df, effective, entry, version):
+    """Effective-dated rows of an MMS reference table snapshot, being those with the latest `version` of each `entry`,
+    with the `effective` column parsed as datetime."""
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df[effective]):
+        df[effective] = pd.to_datetime(df[effective], format="%Y/%m/%d %H:%M:%S")
+    latest = df.groupby(entry, observed=True)[version].transform('max')
+    return df[df[version] == latest]
+
+
 def _download_duid_mapping():
     # """LEGACY. TO BE DEPRECATED.
     
@@ -412,28 +482,12 @@ def download_aemo_cdeii_summary(filter_start, filter_end, cache):
             else:
                 url = urlbase + f'{year}/co2eii_summary_results_{yearname}.csv?la=en'
 
-            filepath = os.path.join(cache, f'AEMO_CO2EII_{yearname}.csv')
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            r = requests.get(url, headers=REQ_URL_HEADERS)
-            with open(filepath, 'wb') as f:
-                f.write(r.content)
-            aemo_file = pd.read_csv(filepath, header=1, usecols=[6, 7, 8, 9, 10])
-            aemo_file['SETTLEMENTDATE'] = pd.to_datetime(aemo_file['SETTLEMENTDATE'],
-                                                         format=CDEII_SUMFILES_DTFMT[yearname])
-            aemodata += [aemo_file]
+            aemodata += [_cdeii_summary_file(yearname, url, CDEII_SUMFILES_DTFMT[yearname], cache)]
 
     if extract_current:
         # Extract CDEII datafiles from current file
         print(f"Extracting AEMO CDEII Datafile for: CURRENT")
-        url = "https://www.nemweb.com.au/Reports/Current/CDEII/CO2EII_SUMMARY_RESULTS.CSV"
-        filepath = os.path.join(cache, f'AEMO_CO2EII_CURRENT.csv')
-        r = requests.get(url, headers=REQ_URL_HEADERS)
-        with open(filepath, 'wb') as f:
-            f.write(r.content)
-        aemo_file = pd.read_csv(filepath, header=1, usecols=[6, 7, 8, 9, 10])
-        aemo_file['SETTLEMENTDATE'] = pd.to_datetime(aemo_file['SETTLEMENTDATE'], format="%Y/%m/%d %H:%M:%S")
-        aemodata += [aemo_file]
+        aemodata += [_cdeii_summary_file('CURRENT', CDEII_CURRENT_URL, "%Y/%m/%d %H:%M:%S", cache, revalidate=True)]
 
     table = pd.concat(aemodata)
     table = table[table['SETTLEMENTDATE'].between(fil_start_dt, fil_end_dt, inclusive="left")]
@@ -443,6 +497,63 @@ def download_aemo_cdeii_summary(filter_start, filter_end, cache):
     return table.sort_values('SETTLEMENTDATE').reset_index(drop=True)
 
 
+def _cdeii_summary_file(yearname, url, date_format, cache, revalidate=False):
+    """Returns a CDEII summary file with SETTLEMENTDATE parsed, from a Parquet copy in cache where available.
+
+    Historical files do not change once published, so are downloaded (or read from a CSV cached by earlier versions)
+    and parsed once. With `revalidate` the file is requested conditionally on the ETag and Last-Modified of the cached
+    copy, and only downloaded and parsed again if it has changed. The cached copy is used if the request fails.
+    """
+    csv_path = os.path.join(cache, f'AEMO_CO2EII_{yearname}.csv')
+    parquet_path = os.path.join(cache, f'AEMO_CO2EII_{yearname}.parquet')
+    validators_path = os.path.join(cache, f'AEMO_CO2EII_{yearname}.json')
+    if not revalidate:
+        if os.path.exists(parquet_path):
+            return pd.read_parquet(parquet_path)
+        if os.path.exists(csv_path):
+            return _parse_cdeii_summary_csv(csv_path, parquet_path, date_format)
+
+    headers = dict(REQ_URL_HEADERS)
+    if os.path.exists(parquet_path) and os.path.exists(validators_path):
+        with open(validators_path, 'r') as f:
+            validators = json.load(f)
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    try:
+        r = requests.get(url, headers=headers, timeout=120)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        if os.path.exists(parquet_path):
+            logger.warning(f"CDEII summary file {yearname} could not be revalidated ({e}). Using cached copy.")
+            return pd.read_parquet(parquet_path)
+        raise
+    if r.status_code == 304:
+        logger.info(f"CDEII summary file {yearname} is unchanged. Using cached copy.")
+        return pd.read_parquet(parquet_path)
+
+    # Write to a temporary file and rename, so a partial download is never read
+    with open(csv_path + ".tmp", 'wb') as f:
+        f.write(r.content)
+    os.replace(csv_path + ".tmp", csv_path)
+    aemo_file = _parse_cdeii_summary_csv(csv_path, parquet_path, date_format)
+    if revalidate:
+        with open(validators_path, 'w') as f:
+            json.dump({'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}, f)
+    return aemo_file
+
+
+def _parse_cdeii_summary_csv(csv_path, parquet_path, date_format):
+    """Parses a CDEII summary CSV, normalising SETTLEMENTDATE from the file's date format, and writes it to Parquet."""
+    aemo_file = pd.read_csv(csv_path, header=1, usecols=[6, 7, 8, 9, 10])
+    aemo_file['SETTLEMENTDATE'] = pd.to_datetime(aemo_file['SETTLEMENTDATE'], format=date_format)
+    aemo_file.to_parquet(parquet_path + ".tmp", index=False)
+    os.replace(parquet_path + ".tmp", parquet_path)
+    return aemo_file
+
+
 def download_current_aemo_cdeii_summary(filter_start, filter_end, financialyear="1920"):
     # """
     # LEGACY. TO BE DEPRECATED.
@@ -491,8 +602,9 @@ def get_aemo_comparison_data(filter_start, filter_end, filename='AEMO_CO2EII_Aug
 
 
 def download_unit_dispatch(start_time, end_time, cache, source_initialmw=False, source_scada=True, overwrite='scada',
-                           return_all=True, check=True, rm_negative=True):
-    """Downloads historical generation dispatch data via NEMOSIS.
+                           return_all=True, check=True, rm_negative=True, duids=None):
+    """Downloads historical generation dispatch data via NEMOSIS. DISPATCH_UNIT_SCADA data is read through the dispatch
+    store in cache.
 
     Parameters
     ----------
@@ -516,6 +628,8 @@ def download_unit_dispatch(start_time, end_time, cache, source_initialmw=False,
         Whether to check for, and remove duplicates after function is complete, by default True.
     rm_negative: bool
         Checks for negative dispatch values in SCADA and replaces them with zero, by default True.
+    duids : list(str), optional
+        Units to return, by default None for all units. Only data of these units is read from the dispatch store.
 
     Returns
     -------
@@ -551,6 +665,8 @@ def download_unit_dispatch(start_time, end_time, cache, source_initialmw=False,
             select_columns=["SETTLEMENTDATE", "DUID", "INITIALMW", "INTERVENTION"],
             fformat="feather",
         )
+        if duids is not None:
+            disp_load = disp_load[disp_load["DUID"].isin(duids)]
         disp_load["Time"] = disp_load["SETTLEMENTDATE"] - timedelta(minutes=DISPATCH_INT_MIN)
 
     elif (not source_initialmw) and (not source_scada):
@@ -558,14 +674,7 @@ def download_unit_dispatch(start_time, end_time, cache, source_initialmw=False,
 
     # Download Dispatch Unit Scada table via NEMOSIS (this includes Non-Scheduled generators)
     if source_scada:
-        disp_scada = dynamic_data_compiler(
-            start_time=get_start_time,
-            end_time=get_end_time,
-            table_name="DISPATCH_UNIT_SCADA",
-            raw_data_location=cache,
-            select_columns=["SETTLEMENTDATE", "DUID", "SCADAVALUE"],
-            fformat="feather",
-        )
+        disp_scada = dispatch_store.read_unit_scada(cache, shift_stime, shift_etime, duids=duids)
         disp_scada["Time"] = disp_scada["SETTLEMENTDATE"] - timedelta(minutes=DISPATCH_INT_MIN)
 
     """ ====> Change this back to fill dispatch col with initialmw and scada and dispatch col, return all """
@@ -664,9 +773,10 @@ def _check_interventions(table):
         return table
 
 
-def download_pricesetter_files(start_time, end_time, cache):
+def download_pricesetter_files(start_time, end_time, cache, max_downloads=4, max_parsers=None):
     """Download NEM Price Setter files from MMS table.
-    First caches raw XML files as JSON and then reads and returns data in the form of pandas.DataFrame.
+    First caches Energy market price setters in a Parquet store partitioned by year and month, then reads and returns
+    data in the form of pandas.DataFrame.
     Processed data only considers the marginal generator for the Energy market.
 
     For further explaination on NEMPriceSetting refer to: https://aemo.com.au/-/media/files/electricity/nem/it-systems-and-change/nemde-queue/nemde_queue_users_guide.pdf?la=en
@@ -679,6 +789,10 @@ def download_pricesetter_files(start_time, end_time, cache):
         Start Time Period in format 'yyyy/mm/dd HH:MM'
     end_time : str
         End Time Period in format 'yyyy/mm/dd HH:MM'
+    max_downloads : int, optional
+        Maximum number of concurrent daily archive downloads, by default 4
+    max_parsers : int, optional
+        Number of processes parsing downloaded archives, by default None to use the number of CPUs
 
     Returns
     -------
@@ -697,76 +811,40 @@ def download_pricesetter_files(start_time, end_time, cache):
         ============  ========  ================================================================================================
 
     """
+    return ud.decode(_pricesetter_table(start_time, end_time, cache, max_downloads, max_parsers))
+
+
+def _pricesetter_table(start_time, end_time, cache, max_downloads=4, max_parsers=None):
+    """As `download_pricesetter_files`, with RegionID and Unit returned as categoricals."""
     # Check inputs
     cache = hp._check_cache(cache)
     start_time = hp._validate_and_convert_date(start_time, "start_time")
     end_time = hp._validate_and_convert_date(end_time, "end_time")
 
-    # Adjust data collection date range
-    collect_sdt = datetime(start_time.year, start_time.month, start_time.day)
-    if (end_time.hour == 0) & (end_time.minute == 0):
-        collect_edt = datetime(end_time.year, end_time.month, end_time.day)
-    else:
-        collect_edt = datetime(end_time.year, end_time.month, end_time.day) + timedelta(days=1)
-
-    daterange_list = pd.date_range(collect_sdt, collect_edt)
+    # Calendar days spanning intervals ending within (start_time, end_time]
+    daterange_list = pd.date_range(datetime(start_time.year, start_time.month, start_time.day),
+                                   end_time - timedelta(minutes=DISPATCH_INT_MIN))
 
-    # Check if any files in cache already exist within daterange, remove them from new dateranges to create json for new dates only
-    xml_files = glob.glob(os.path.join(cache, "NEMED_PS_DAILY_*.json"))
-    exist_file_list = [datetime.strptime(existing_files[-15:-5],"%Y-%m-%d") for existing_files in xml_files]
+    # Move any daily JSON files from earlier versions into the store, and only retrieve days not already stored
+    ps_store.migrate_json(cache)
+    exist_file_list = ps_store.stored_days(cache)
     new_daterange_only = [x for x in daterange_list if x not in exist_file_list]
 
     # Download & Process Price Setter Files
     logger.info("Processing Price Setter Files...")
-    for date in tqdm(new_daterange_only):
-        try:
-            _populate_xml_into_daily_json(cache, year=date.year, month=date.month, day=date.day)
-        except:
-            logger.warning("PriceSetter Download for {} failed. Continuing with remaining dates...".format(date))
-
-    # Read cached JSON Price Setter Files
-    table = read_json_to_df(start_time, end_time, cache)
+    if new_daterange_only:
+        with tqdm(total=len(new_daterange_only)) as pbar, cache_index.batch(cache):
+            def write_day(date, records):
+                ps_store.write_day(cache, date, records)
+                pbar.update(1)
+            fetch_pricesetter_days([d.to_pydatetime() for d in new_daterange_only], write_day,
+                                   max_downloads=max_downloads, max_parsers=max_parsers)
+
+    # Read cached Price Setter data
+    table = ps_store.read_pricesetters(cache, start_time, end_time)
     return table
 
 
-def _populate_xml_into_daily_json(cache, year, month, day, rm_xml=True):
-    """Iterative function to extract all price setter xml files for a single day and combined into a single JSON file"""
-    sdate = datetime(year, month, day)
-    edate = sdate + timedelta(days=1)
-    date_str_list = [datetime.strftime(i,"%Y/%m/%d %H:%M:%S") for i in pd.date_range(sdate, edate, freq='5T', \
-        inclusive="right")]
-
-    # Load individual xml files
-    dataset = []
-    for interval in date_str_list:
-        xml_cache_manager = XML(cache)
-        overwrite_xmlcachemanager_with_pricesetter_config()
-
-        xml_cache_manager.load_interval(interval)
-        d = xml_cache_manager.xml['SolutionAnalysis']['PriceSetting']
-        dataset += [d]
-    dataset = [item for sublist in dataset for item in sublist]
-
-    # Write JSON daily summary file to cache
-    write_file = "NEMED_PS_DAILY_" + sdate.strftime("%Y-%m-%d") + ".json"
-    json_path = os.path.join(cache, write_file)
-    with open(json_path, 'w') as fp:
-        json.dump(dataset, fp)
-
-    if rm_xml:
-        # Remove XML files cached by nempy XMLCacheManager
-        prev_date = datetime(year, month, day) - timedelta(days=1)
-        XML_files = glob.glob(os.path.join(cache, "NEMPriceSetter_{}{}{}*.xml"\
-            .format(year,str(month).zfill(2),str(day).zfill(2))))
-        XML_files += glob.glob(os.path.join(cache, "NEMPriceSetter_{}{}{}*.xml"\
-            .format(prev_date.year,str(prev_date.month).zfill(2),str(prev_date.day).zfill(2))))
-
-        for filepath in XML_files:
-            os.remove(filepath)
-    return
-
-
-
 def download_pricesetters(cache, start_year, start_month, start_day, end_year, end_month, end_day,
                           redownload_xml=False):
     # """LEGACY: Deprecated
@@ -0,0 +1,265 @@
+""" Persistent index of files in cache, so checks for cached files are lookups rather than directory scans"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+INDEX_NAME = "nemed_cache_index.json"
+# Changes since the index was last written, appended as a JSON line each, so recording a file does not rewrite the index
+JOURNAL_NAME = "nemed_cache_index.journal"
+# Size of journal at which it is compacted into the index
+COMPACT_BYTES = 2**20
+_lock = threading.Lock()
+# In-process copy of each cache's index, with the fingerprint of the index file it was read from
+_loaded = {}
+# Changes not yet written to each cache's index, while within `batch`
+_pending = {}
+
+
+def _index_path(cache):
+    return os.path.join(cache, INDEX_NAME)
+
+
+def _journal_path(cache):
+    return os.path.join(cache, JOURNAL_NAME)
+
+
+def _key(cache, path):
+    return os.path.relpath(path, cache).replace(os.sep, "/")
+
+
+def _fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_checksum(path):
+    """Returns the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry(path, checksum):
+    stat = os.stat(path)
+    return {'format': os.path.splitext(path)[1].lstrip(".").lower(), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns, 'sha256': file_checksum(path) if checksum else None}
+
+
+def _scan(cache):
+    """Builds an index of all files in cache with a single walk of the directory, without checksums."""
+    index = {}
+    for root, dirs, files in os.walk(cache):
+        for name in files:
+            path = os.path.join(root, name)
+            if name in [INDEX_NAME, JOURNAL_NAME] or name.endswith(".tmp"):
+                continue
+            try:
+                index[_key(cache, path)] = _entry(path, checksum=False)
+            except OSError:
+                continue
+    return index
+
+
+def read_index(cache):
+    """Returns the index of files in cache, mapping path relative to cache to its format, size, mtime and checksum.
+    The index (and its journal of later changes) is read from disk only when it has changed since last read, and is
+    built by scanning the cache if it does not yet exist.
+    """
+    with _lock:
+        return _current(cache)
+
+
+def _current(cache):
+    # Latest index of cache, called with _lock held
+    path = _index_path(cache)
+    fingerprint = (_fingerprint(path), _fingerprint(_journal_path(cache)))
+    loaded = _loaded.get(cache)
+    if loaded is not None and loaded[0] == fingerprint:
+        return loaded[1]
+    index = None
+    if fingerprint[0] is not None:
+        try:
+            with open(path, 'r') as f:
+                index = json.load(f)
+        except ValueError:
+            logger.warning(f"Cache index {path} could not be read and will be rebuilt")
+    if index is None:
+        logger.info(f"Building cache index {path}...")
+        index = _scan(cache)
+        _write_index(cache, index)
+        return index
+    _apply(index, _read_journal(cache))
+    _apply(index, _pending.get(cache, {}))
+    _loaded[cache] = (fingerprint, index)
+    return index
+
+
+def _read_journal(cache):
+    changes = {}
+    try:
+        with open(_journal_path(cache), 'r') as f:
+            for line in f:
+                try:
+                    changes.update(json.loads(line))
+                except ValueError:
+                    # A line left partially written is skipped, its file being retrieved again if required
+                    continue
+    except OSError:
+        pass
+    return changes
+
+
+def _write_index(cache, index):
+    # Write to a temporary file and rename, so the index is never left partially written. The journal is then
+    # discarded, its changes being held in the index.
+    path = _index_path(cache)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    try:
+        os.remove(_journal_path(cache))
+    except OSError:
+        pass
+    _loaded[cache] = ((_fingerprint(path), None), index)
+
+
+def _append(cache, changes):
+    # Appends changes to the journal, compacting it into the index once large. Called with _lock held.
+    index = _current(cache)
+    _apply(index, changes)
+    with open(_journal_path(cache), 'a') as f:
+        f.write(json.dumps(changes, separators=(",", ":")) + "\n")
+    fingerprint = (_fingerprint(_index_path(cache)), _fingerprint(_journal_path(cache)))
+    if fingerprint[1][0] > COMPACT_BYTES:
+        _write_index(cache, index)
+    else:
+        _loaded[cache] = (fingerprint, index)
+
+
+def _apply(index, changes):
+    for key, entry in changes.items():
+        if entry is None:
+            index.pop(key, None)
+        else:
+            index[key] = entry
+
+
+def _update(cache, changes):
+    with _lock:
+        if cache in _pending:
+            # Within `batch`, changes are visible in process and written to disk on exit
+            _pending[cache].update(changes)
+            _apply(_current(cache), changes)
+            return
+        # Changes are appended to the journal, keeping entries written by other processes
+        _append(cache, changes)
+
+
+@contextmanager
+def batch(cache):
+    """Defers writing index changes made within the context to a single write on exit, for callers writing many
+    files to cache."""
+    with _lock:
+        outermost = cache not in _pending
+        if outermost:
+            _pending[cache] = {}
+    try:
+        yield
+    finally:
+        if outermost:
+            with _lock:
+                changes = _pending.pop(cache)
+                if changes:
+                    _append(cache, changes)
+
+
+def record(cache, path, checksum=True):
+    """Adds a file written to cache to the index, with its size, mtime and (optionally) checksum."""
+    _update(cache, {_key(cache, path): _entry(path, checksum)})
+
+
+def forget(cache, path):
+    """Removes a file from the index, e.g. once it is deleted from cache."""
+    _update(cache, {_key(cache, path): None})
+
+
+def _stale(cache, keys):
+    """Forgets indexed files no longer in cache, returning the set of their keys. Files changed since indexed are
+    recorded again (without checksum)."""
+    index = read_index(cache)
+    changes = {}
+    for key in keys:
+        path = os.path.join(cache, *key.split("/"))
+        fingerprint = _fingerprint(path)
+        if fingerprint is None:
+            logger.warning(f"Cached file {path} is missing and will be retrieved again")
+            changes[key] = None
+        elif fingerprint != (index[key]['size'], index[key]['mtime_ns']):
+            changes[key] = _entry(path, checksum=False)
+    if changes:
+        _update(cache, changes)
+    return {key for key, entry in changes.items() if entry is None}
+
+
+def find(cache, *paths):
+    """Returns the first of `paths` in cache, or None if none are cached.
+
+    The index is authoritative, so a path not indexed is not cached, without checking the cache directory. An indexed
+    path is checked to still be in cache before it is returned. Files written to cache other than by NEMED are found
+    once `rescan` is called.
+    """
+    index = read_index(cache)
+    for path in paths:
+        key = _key(cache, path)
+        if key in index and key not in _stale(cache, [key]):
+            return path
+    return None
+
+
+def files(cache, prefix):
+    """Lists the paths of indexed files in cache whose path relative to cache starts with `prefix` (using "/" as the
+    separator), in sorted order. Files are not checked to still be in cache, so callers opening a listed file which is
+    missing should `forget` it."""
+    keys = sorted(key for key in read_index(cache) if key.startswith(prefix))
+    return [os.path.join(cache, *key.split("/")) for key in keys]
+
+
+def rescan(cache):
+    """Rebuilds the index from a scan of the cache directory, e.g. once files are added to or removed from cache other
+    than by NEMED. Checksums are kept for files unchanged since they were recorded.
+
+    Returns
+    -------
+    int
+        Number of files indexed.
+    """
+    with _lock:
+        previous = _current(cache)
+        index = _scan(cache)
+        for key, entry in index.items():
+            if key in previous and (previous[key]['size'], previous[key]['mtime_ns']) == (entry['size'],
+                                                                                          entry['mtime_ns']):
+                entry['sha256'] = previous[key]['sha256']
+        _pending.get(cache, {}).clear()
+        _write_index(cache, index)
+    logger.info(f"Rebuilt cache index {_index_path(cache)} with {len(index)} files")
+    return len(index)
+
+
+def verify(cache, path):
+    """Returns True if a file exists with the size and checksum recorded in the index. Files indexed without a checksum
+    are checked by size alone."""
+    entry = read_index(cache).get(_key(cache, path))
+    if entry is None or _fingerprint(path) is None or os.path.getsize(path) != entry['size']:
+        return False
+    return entry['sha256'] is None or file_checksum(path) == entry['sha256']
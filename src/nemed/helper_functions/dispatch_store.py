@@ -0,0 +1,104 @@
+""" Columnar store of unit dispatch (DISPATCH_UNIT_SCADA) in cache, as a Parquet file per month sorted by DUID"""
+import os
+import logging
+import threading
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from .mod_nemosis import mms_cache_filename, cache_mms_month
+
+logger = logging.getLogger(__name__)
+STORE_DIR = "NEMED_DISPATCH_STORE"
+# Rows are sorted by DUID, so each row group spans few units and its DUID statistics allow it to be skipped
+ROW_GROUP_SIZE = 2**16
+SCHEMA = pa.schema([
+    ('SETTLEMENTDATE', pa.timestamp('ns')),
+    ('DUID', pa.string()),
+    ('SCADAVALUE', pa.float64()),
+])
+
+
+def month_path(cache, month):
+    """Path of the Parquet file holding unit dispatch of the monthly DISPATCH_UNIT_SCADA file for `month`."""
+    return os.path.join(cache, STORE_DIR, f"DISPATCH_UNIT_SCADA_{month:%Y%m}.parquet")
+
+
+def ensure_month(cache, month):
+    """Writes the store file for a month from the cached DISPATCH_UNIT_SCADA feather file, downloading it if required.
+    An existing store file is rewritten if the feather file has since changed.
+
+    Parameters
+    ----------
+    cache : str
+        Raw data location in local directory
+    month : datetime
+        Any time within the month.
+
+    Returns
+    -------
+    str
+        Path of the store file.
+    """
+    path = month_path(cache, month)
+    feather = mms_cache_filename("DISPATCH_UNIT_SCADA", month.year, month.month, cache)
+    if os.path.exists(path) and (not os.path.exists(feather) or os.path.getmtime(feather) <= os.path.getmtime(path)):
+        return path
+    if not os.path.exists(feather):
+        cache_mms_month("DISPATCH_UNIT_SCADA", datetime(month.year, month.month, 1), cache)
+
+    df = pd.read_feather(feather, columns=SCHEMA.names)
+    if not pd.api.types.is_datetime64_any_dtype(df['SETTLEMENTDATE']):
+        df['SETTLEMENTDATE'] = pd.to_datetime(df['SETTLEMENTDATE'], format="%Y/%m/%d %H:%M:%S")
+    df['SCADAVALUE'] = pd.to_numeric(df['SCADAVALUE'])
+    df['DUID'] = df['DUID'].astype(str)
+    df = df.drop_duplicates(subset=['SETTLEMENTDATE', 'DUID'], keep='last')
+    df = df.sort_values(['DUID', 'SETTLEMENTDATE'], kind='stable')
+    table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file and rename, so a partially written month is never read
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd", row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_unit_scada(cache, start_dt, end_dt, duids=None):
+    """Reads unit dispatch for SETTLEMENTDATE within (start_dt, end_dt] from the store, as `dynamic_data_compiler`
+    reads DISPATCH_UNIT_SCADA. Months not yet in the store are written first. SETTLEMENTDATE and DUID filters are pushed
+    down to the Parquet reader, so row groups of other units are not read.
+
+    Parameters
+    ----------
+    cache : str
+        Raw data location in local directory
+    start_dt : datetime
+        Start of period (exclusive)
+    end_dt : datetime
+        End of period (inclusive)
+    duids : list(str), optional
+        Units to return, by default None for all units
+
+    Returns
+    -------
+    pandas.DataFrame
+        Dispatch dataframe containing columns: [SETTLEMENTDATE, DUID, SCADAVALUE], sorted by SETTLEMENTDATE then DUID
+    """
+    files = []
+    for month in pd.date_range(datetime(start_dt.year, start_dt.month, 1), end_dt, freq='MS'):
+        try:
+            files += [ensure_month(cache, month)]
+        except Exception as e:
+            logger.warning(f"Loading dispatch for {month:%Y-%m} failed ({e}).")
+    if not files or (duids is not None and len(duids) == 0):
+        return SCHEMA.empty_table().to_pandas()
+
+    condition = (ds.field('SETTLEMENTDATE') > pa.scalar(start_dt, pa.timestamp('ns'))) & \
+        (ds.field('SETTLEMENTDATE') <= pa.scalar(end_dt, pa.timestamp('ns')))
+    if duids is not None:
+        condition = condition & ds.field('DUID').isin([str(duid) for duid in duids])
+    table = ds.dataset(files, schema=SCHEMA, format="parquet").to_table(filter=condition)
+    # Time-major order, as read from the MMS files
+    return table.to_pandas().sort_values('SETTLEMENTDATE', kind='stable').reset_index(drop=True)
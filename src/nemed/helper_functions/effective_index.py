@@ -0,0 +1,99 @@
+""" Index of effective-dated reference data, answering the value of each key as of a time by array search"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype, is_datetime64_any_dtype
+
+
+class EffectiveDatedIndex:
+    """Breakpoint index of a table holding values for each key from an effective date, until the key's next effective
+    date. Rows are sorted once by (key code, effective date), such that finding the row in effect for N (key, time)
+    pairs is a single `numpy.searchsorted` on an integer composite of the two, with no merge and no more than one row
+    per lookup.
+
+    Parameters
+    ----------
+    table : pandas.DataFrame
+        Effective-dated data, with at most one row per key and effective date (the last is kept otherwise).
+    key : str
+        Key column, encoded as categorical (see `unit_dimension`). Rows without a key are ignored.
+    effective : str
+        Datetime column from which each row is in effect. Rows without an effective date are ignored.
+    columns : list(str)
+        Value columns to hold. Categorical and datetime columns are returned as such, others as floats.
+    backfill : bool, optional
+        Whether times before a key's first effective date take its first row, by default False to return missing
+        values.
+    """
+    def __init__(self, table, key, effective, columns, backfill=False):
+        if not is_categorical_dtype(table[key]):
+            raise ValueError(f"{key} of effective-dated data must be encoded as categorical")
+        self.key_dtype = table[key].dtype
+        self.backfill = backfill
+        codes = table[key].cat.codes.values.astype(np.int64)
+        dates = table[effective].values.astype('datetime64[ns]')
+        valid = (codes >= 0) & ~np.isnat(dates)
+
+        # Sort by key then date, keeping the last of any rows with the same key and date
+        order = np.flatnonzero(valid)
+        order = order[np.lexsort((order, dates[order], codes[order]))]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (codes[order][1:] != codes[order][:-1]) | (dates[order][1:] != dates[order][:-1])
+        order = order[last]
+
+        self.codes = codes[order]
+        self.dates = np.unique(dates[order])
+        self.composite = self._composite(self.codes, np.searchsorted(self.dates, dates[order]))
+        self.starts = np.searchsorted(self.codes, np.arange(len(self.key_dtype.categories) + 1))
+        self.values = {}
+        for col in [effective] + list(columns):
+            values = table[col].iloc[order]
+            if is_categorical_dtype(values):
+                self.values[col] = (values.cat.codes.values, -1, values.dtype)
+            elif is_datetime64_any_dtype(values):
+                self.values[col] = (values.values.astype('datetime64[ns]'), np.datetime64('NaT', 'ns'), None)
+            else:
+                self.values[col] = (values.astype(float).values, np.nan, None)
+
+    def _composite(self, codes, date_ranks):
+        # Orders (key code, date rank) pairs as integers, ranks being within [0, len(self.dates)]
+        return codes * (len(self.dates) + 1) + date_ranks
+
+    def locate(self, keys, times):
+        """Returns the position of the row in effect for each key and time, or -1 where there is none.
+
+        Parameters
+        ----------
+        keys : pandas.Series
+            Key of each lookup, encoded with the same categorical dtype as the index.
+        times : pandas.Series or numpy.ndarray
+            Time of each lookup.
+        """
+        if keys.dtype != self.key_dtype:
+            raise ValueError("Keys must be encoded with the categorical dtype of the effective-dated index")
+        codes = keys.cat.codes.values.astype(np.int64)
+        times = np.asarray(times, dtype='datetime64[ns]')
+        has_key = codes >= 0
+        codes = np.where(has_key, codes, 0)
+        first, end = self.starts[codes], self.starts[codes + 1]
+
+        # Last row of the key effective at or before the time
+        ranks = np.searchsorted(self.dates, times, side='right')
+        positions = np.searchsorted(self.composite, self._composite(codes, ranks), side='left') - 1
+        found = has_key & (positions >= first) & (first < end)
+        if self.backfill:
+            positions = np.where(has_key & ~found & (first < end), first, positions)
+            found = has_key & (first < end)
+        return np.where(found, positions, -1)
+
+    def lookup(self, column, keys, times):
+        """Returns the value of `column` in effect for each key and time, as an array (or categorical) aligned with
+        `keys`, missing where no row is in effect. The effective date column may also be looked up."""
+        return self.take(column, self.locate(keys, times))
+
+    def take(self, column, positions):
+        """Returns the values of `column` at `positions` from `locate`, missing where the position is -1."""
+        values, missing, dtype = self.values[column]
+        result = np.where(positions >= 0, values[np.maximum(positions, 0)] if len(values) else missing, missing)
+        if dtype is not None:
+            return pd.Categorical.from_codes(result.astype(np.int32), dtype=dtype)
+        return result
@@ -0,0 +1,171 @@
+""" Opt-in instrumentation of pipeline stages, recording wall time, rows and peak memory of each stage"""
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+import pandas as pd
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak RSS is not recorded
+    resource = None
+
+logger = logging.getLogger(__name__)
+_active = contextvars.ContextVar("nemed_stats", default=None)
+
+
+class StageRecord:
+    """Measurements of a single run of a pipeline stage.
+
+    Attributes
+    ----------
+    name : str
+        Stage name, e.g. 'download', 'feather_read', 'region_filter', 'factor_merge', 'ramp', 'sent_out',
+        'aggregation' or 'pricesetter_parse'.
+    seconds : float
+        Wall time of the stage.
+    rows_in : int or None
+        Rows of the stage input, where applicable.
+    rows_out : int or None
+        Rows of the stage output, where applicable.
+    peak_rss_mb : float or None
+        Peak resident set size of the process [MB] at the end of the stage, None if unavailable on the platform.
+    peak_alloc_mb : float or None
+        Peak memory allocated during the stage [MB] as traced by tracemalloc, None unless `trace_allocations` is set.
+    """
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = None
+        self.peak_rss_mb = None
+        self.peak_alloc_mb = None
+        self._peak_alloc = 0
+
+    def as_dict(self):
+        return {'stage': self.name, 'seconds': self.seconds, 'rows_in': self.rows_in, 'rows_out': self.rows_out,
+                'peak_rss_mb': self.peak_rss_mb, 'peak_alloc_mb': self.peak_alloc_mb}
+
+
+class PipelineStats:
+    """Stage records collected by `profile`, in order of completion."""
+    def __init__(self, callbacks, trace_allocations):
+        self.records = []
+        self.trace_allocations = trace_allocations
+        self._callbacks = callbacks
+        self._open = []
+        self._lock = threading.Lock()
+
+    def to_frame(self):
+        """Returns a dataframe with a row per stage record."""
+        return pd.DataFrame([r.as_dict() for r in self.records],
+                            columns=['stage', 'seconds', 'rows_in', 'rows_out', 'peak_rss_mb', 'peak_alloc_mb'])
+
+    def summary(self):
+        """Returns totals for each stage: number of runs, total seconds and rows, and the maximum peak memory."""
+        return self.to_frame().groupby('stage', sort=False).agg(
+            runs=('seconds', 'size'), seconds=('seconds', 'sum'), rows_in=('rows_in', 'sum'),
+            rows_out=('rows_out', 'sum'), peak_rss_mb=('peak_rss_mb', 'max'), peak_alloc_mb=('peak_alloc_mb', 'max'))
+
+    def _add(self, record):
+        with self._lock:
+            self.records += [record]
+        for callback in self._callbacks:
+            try:
+                callback(record)
+            except Exception as e:
+                logger.warning(f"Instrumentation callback {callback} failed ({e})")
+
+
+def log_record(record):
+    """Exporter logging each stage record at INFO level, for use as a `profile` callback."""
+    logger.info("Stage {}: {:.3f}s, rows in {}, rows out {}, peak RSS {} MB, peak allocated {} MB".format(
+        record.name, record.seconds, record.rows_in, record.rows_out, record.peak_rss_mb, record.peak_alloc_mb))
+
+
+@contextmanager
+def profile(callback=None, trace_allocations=False):
+    """Records each pipeline stage run within the context, for the calling thread. Stages run in worker processes
+    (`n_jobs` other than 1, or price setter parsing processes) are recorded as the time spent waiting on them.
+
+    Example
+    -------
+    >>> with nemed.profile(callback=nemed.log_record) as stats:
+    ...     nemed.get_total_emissions("2022/01/01 00:00", "2022/02/01 00:00", cache)
+    >>> stats.summary()
+
+    Parameters
+    ----------
+    callback : callable or list(callable), optional
+        Called with each `StageRecord` as its stage completes, e.g. `log_record` or an exporter to a metrics system,
+        by default None
+    trace_allocations : bool, optional
+        Traces memory allocations with tracemalloc to record the peak allocated during each stage, by default False as
+        tracing slows processing considerably
+
+    Yields
+    ------
+    PipelineStats
+        Records of the stages run, complete on exit of the context.
+    """
+    callbacks = [] if callback is None else callback if isinstance(callback, list) else [callback]
+    stats = PipelineStats(callbacks, trace_allocations)
+    start_tracing = trace_allocations and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    token = _active.set(stats)
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+        if start_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Measures a pipeline stage if within `profile`, otherwise does nothing. Yields the `StageRecord`, on which
+    `rows_out` may be set.
+    """
+    record = StageRecord(name, rows_in)
+    stats = _active.get()
+    if stats is None:
+        yield record
+        return
+
+    tracing = stats.trace_allocations and tracemalloc.is_tracing()
+    if tracing:
+        _fold_peak(stats)
+    stats._open += [record]
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        if tracing:
+            _fold_peak(stats)
+            record.peak_alloc_mb = record._peak_alloc / 2**20
+        stats._open.remove(record)
+        record.peak_rss_mb = _peak_rss_mb()
+        stats._add(record)
+
+
+def _fold_peak(stats):
+    # Carries the traced peak since the last reset into all open stages, such that nested stages resetting the peak
+    # do not hide it from the enclosing stage
+    peak = tracemalloc.get_traced_memory()[1]
+    for record in stats._open:
+        record._peak_alloc = max(record._peak_alloc, peak)
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 2**10
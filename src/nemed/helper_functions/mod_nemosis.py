@@ -1,12 +1,14 @@
 """ Modifies functionality from nemosis to extract emissions factors"""
 import logging
 import os as _os
-import glob as _glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from nemosis import defaults as _defaults
 from nemosis import processing_info_maps as _processing_info_maps
 from nemosis import data_fetch_methods
 from nemosis.data_fetch_methods import _create_filename, _download_data, _get_read_function, \
     _determine_columns_and_read_csv, _perform_column_selection, _log_file_creation_message, _write_to_format
+from . import cache_index
+from .instrument import stage
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,35 @@ def overwrite_nemosis_defaults():
         "DUALLOC": ["EFFECTIVEDATE", "VERSIONNO", "DUID", "GENSETID", "LASTCHANGED"]})
 
 
+def mms_cache_filename(table_name, year, month, raw_data_location, fformat="feather"):
+    """Returns the path of the monthly MMS file for `table_name` as cached by nemosis (or `mod_dynamic_data_fetch_loop`)
+    in `raw_data_location`.
+    """
+    overwrite_nemosis_defaults()
+    _, full_filename, _ = _create_filename(table_name, _defaults.table_types[table_name], raw_data_location, fformat,
+                                           None, str(month).zfill(2), str(year), None)
+    return full_filename
+
+
+def cache_mms_month(table_name, month, raw_data_location):
+    """Downloads a single MMS monthly file and converts it to feather, without reading it. Raises an exception if the
+    file is not available from NEMWEB.
+    """
+    overwrite_nemosis_defaults()
+    mod_dynamic_data_fetch_loop(start_search=month,
+                                start_time=month,
+                                end_time=month,
+                                table_name=table_name,
+                                raw_data_location=raw_data_location,
+                                select_columns=_defaults.table_columns[table_name],
+                                date_filter=None,
+                                fformat="feather",
+                                keep_csv=False,
+                                caching_mode=True)
+    if not _os.path.exists(mms_cache_filename(table_name, month.year, month.month, raw_data_location)):
+        raise Exception("file not available from NEMWEB")
+
+
 def mod_dynamic_data_fetch_loop(
     start_search,
     start_time,
@@ -35,22 +66,36 @@ def mod_dynamic_data_fetch_loop(
     caching_mode=False,
     rebuild=False,
     write_kwargs={},
+    max_downloads=1,
+    max_converters=1,
 ):
     """Modified function from nemosis.data_fetch_methods
+
+    With `max_downloads` or `max_converters` other than 1, files not yet cached in `fformat` are first fetched in
+    parallel by `_fetch_and_convert`, then read in order. Otherwise (or with `rebuild`), each file is downloaded and
+    converted in turn.
     """
     data_tables = []
 
     table_type = _defaults.table_types[table_name]
-    date_gen = _processing_info_maps.date_gen[table_type](start_search, end_time)
+    date_gen = list(_processing_info_maps.date_gen[table_type](start_search, end_time))
+
+    fetched = set()
+    if (max_downloads != 1 or max_converters != 1) and fformat != "csv" and not rebuild:
+        fetched = _fetch_and_convert(table_name, date_gen, raw_data_location, select_columns, fformat, caching_mode,
+                                     keep_csv, write_kwargs, max_downloads, max_converters)
 
     for year, month, day, index in date_gen:
         filename_stub, full_filename, path_and_name = _create_filename(
             table_name, table_type, raw_data_location, fformat, day, month, year, index
         )
+        # Cached files are looked up in the cache index, rather than by scanning the cache directory
+        cached = cache_index.find(raw_data_location, full_filename) if fformat != "csv" else None
+        csv_path_and_name = None if cached and not rebuild else _find_csv(raw_data_location, path_and_name)
 
-        if not (
-            _glob.glob(full_filename) or _glob.glob(path_and_name + ".[cC][sS][vV]")
-        ) or (not _glob.glob(path_and_name + ".[cC][sS][vV]") and rebuild):
+        # Files already attempted by `_fetch_and_convert` are not downloaded again
+        if (not (cached or csv_path_and_name) or (not csv_path_and_name and rebuild)) and \
+                full_filename not in fetched:
             _download_data(
                 table_name,
                 table_type,
@@ -61,12 +106,20 @@ def mod_dynamic_data_fetch_loop(
                 index,
                 raw_data_location,
             )
+            csv_path_and_name = _record_csv(raw_data_location, path_and_name)
 
-        if _glob.glob(full_filename) and fformat != "csv" and not rebuild:
+        if cached and not rebuild:
             if not caching_mode:
-                data = _get_read_function(fformat, table_type, day)(full_filename)
-                data.insert(0, 'file_month', month)
-                data.insert(0, 'file_year', year)
+                try:
+                    with stage('feather_read') as read:
+                        data = _get_read_function(fformat, table_type, day)(full_filename)
+                        read.rows_out = len(data)
+                    data.insert(0, 'file_month', month)
+                    data.insert(0, 'file_year', year)
+                except FileNotFoundError:
+                    # Removed from cache since indexed, so it is retrieved again by the next call
+                    cache_index.forget(raw_data_location, full_filename)
+                    data = None
             else:
                 data = None
                 logger.info(
@@ -74,43 +127,12 @@ def mod_dynamic_data_fetch_loop(
                     + f" {raw_data_location}."
                 )
 
-        elif _glob.glob(path_and_name + ".[cC][sS][vV]"):
-
-            if select_columns != "all":
-                read_all_columns = False
-            else:
-                read_all_columns = True
-
-            if not caching_mode:
-                dtypes = "str"
-            else:
-                dtypes = "all"
-
-            csv_path_and_name = _glob.glob(path_and_name + ".[cC][sS][vV]")[0]
-
-            csv_read_function = _get_read_function(
-                fformat="csv", table_type=table_type, day=day
-            )
-            data = _determine_columns_and_read_csv(
-                table_name,
-                csv_path_and_name,
-                csv_read_function,
-                read_all_columns=read_all_columns,
-                dtypes=dtypes,
-            )
-            data.insert(0, 'file_month', month)
-            data.insert(0, 'file_year', year)
-            if caching_mode:
-                data = _perform_column_selection(data, select_columns, full_filename)
-                data.insert(0, 'file_month', month)
-                data.insert(0, 'file_year', year)
-            if data is not None and fformat != "csv":
+        elif csv_path_and_name:
+            if fformat != "csv":
                 _log_file_creation_message(fformat, table_name, year, month, day, index)
-                data.drop(['file_month','file_year'], axis=1,inplace=True)
-                _write_to_format(data, fformat, full_filename, write_kwargs)
-
-            if not keep_csv:
-                _os.remove(_glob.glob(path_and_name + ".[cC][sS][vV]")[0])
+            data = _convert_csv(table_name, day, csv_path_and_name, full_filename, select_columns, fformat,
+                                caching_mode, keep_csv, write_kwargs)
+            _index_conversion(raw_data_location, csv_path_and_name, full_filename, fformat, keep_csv)
         else:
             data = None
 
@@ -129,6 +151,113 @@ def mod_dynamic_data_fetch_loop(
     return data_tables
 
 
+def _fetch_and_convert(table_name, dates, raw_data_location, select_columns, fformat, caching_mode, keep_csv,
+                       write_kwargs, max_downloads, max_converters):
+    """Downloads and converts the files of an MMS table for `dates` which are not yet cached in `fformat`. Up to
+    `max_downloads` files are downloaded concurrently, and each CSV file is converted in a pool of `max_converters`
+    processes (None to use the number of CPUs) as soon as it is downloaded.
+
+    Returns
+    -------
+    set(str)
+        Paths (in `fformat`) of the files attempted, whether or not they could be retrieved.
+    """
+    table_type = _defaults.table_types[table_name]
+    pending = []
+    for year, month, day, index in dates:
+        filename_stub, full_filename, path_and_name = _create_filename(
+            table_name, table_type, raw_data_location, fformat, day, month, year, index
+        )
+        if not cache_index.find(raw_data_location, full_filename):
+            pending += [(year, month, day, index, filename_stub, full_filename, path_and_name)]
+    if not pending:
+        return set()
+    logger.info(f"Fetching {len(pending)} {table_name} files with up to {max_downloads} concurrent downloads...")
+
+    def download(year, month, day, index, filename_stub, full_filename, path_and_name):
+        csv_path_and_name = _find_csv(raw_data_location, path_and_name)
+        if not csv_path_and_name:
+            _download_data(table_name, table_type, filename_stub, day, month, year, index, raw_data_location)
+            csv_path_and_name = _record_csv(raw_data_location, path_and_name)
+        return csv_path_and_name
+
+    conversions = {}
+    with cache_index.batch(raw_data_location), \
+            ProcessPoolExecutor(max_workers=max_converters) as converters, \
+            ThreadPoolExecutor(max_workers=max_downloads) as downloads:
+        futures = {downloads.submit(download, *item): item for item in pending}
+        for future in as_completed(futures):
+            year, month, day, index, _, full_filename, _ = futures[future]
+            try:
+                csv_path_and_name = future.result()
+            except Exception as e:
+                logger.warning(f"Download of {full_filename} failed ({e}).")
+                continue
+            if csv_path_and_name is None:
+                continue
+            _log_file_creation_message(fformat, table_name, year, month, day, index)
+            conversion = converters.submit(_convert_csv, table_name, day, csv_path_and_name, full_filename,
+                                           select_columns, fformat, caching_mode, keep_csv, write_kwargs, False)
+            conversions[conversion] = (csv_path_and_name, full_filename)
+
+        for conversion in as_completed(conversions):
+            csv_path_and_name, full_filename = conversions[conversion]
+            try:
+                conversion.result()
+            except Exception as e:
+                logger.warning(f"Conversion of {csv_path_and_name} failed ({e}).")
+                continue
+            _index_conversion(raw_data_location, csv_path_and_name, full_filename, fformat, keep_csv)
+    return {item[5] for item in pending}
+
+
+def _convert_csv(table_name, day, csv_path_and_name, full_filename, select_columns, fformat, caching_mode, keep_csv,
+                 write_kwargs, return_data=True):
+    """Reads a downloaded CSV file of an MMS table as nemosis does, and writes it to `full_filename` unless `fformat` is
+    'csv'. The CSV file is removed unless `keep_csv`. Run in worker processes by `_fetch_and_convert`, where the data
+    is not returned.
+    """
+    overwrite_nemosis_defaults()
+    table_type = _defaults.table_types[table_name]
+    data = _determine_columns_and_read_csv(
+        table_name,
+        csv_path_and_name,
+        _get_read_function(fformat="csv", table_type=table_type, day=day),
+        read_all_columns=select_columns == "all",
+        dtypes="all" if caching_mode else "str",
+    )
+    if caching_mode:
+        data = _perform_column_selection(data, select_columns, full_filename)
+    if fformat != "csv":
+        _write_to_format(data, fformat, full_filename, write_kwargs)
+    if not keep_csv:
+        _os.remove(csv_path_and_name)
+    return data if return_data else None
+
+
+def _index_conversion(raw_data_location, csv_path_and_name, full_filename, fformat, keep_csv):
+    # Records the files written and removed by `_convert_csv` in the cache index
+    if fformat != "csv":
+        cache_index.record(raw_data_location, full_filename)
+    if not keep_csv:
+        cache_index.forget(raw_data_location, csv_path_and_name)
+
+
+def _find_csv(raw_data_location, path_and_name):
+    """Returns the path of the cached CSV file of an MMS table, of either case of file extension, or None."""
+    return cache_index.find(raw_data_location, path_and_name + ".CSV", path_and_name + ".csv")
+
+
+def _record_csv(raw_data_location, path_and_name):
+    """Adds the CSV file of an MMS table just downloaded (by nemosis, outside of the cache index) to the index,
+    returning its path, or None if it could not be downloaded."""
+    for csv_path_and_name in [path_and_name + ".CSV", path_and_name + ".csv"]:
+        if _os.path.exists(csv_path_and_name):
+            cache_index.record(raw_data_location, csv_path_and_name, checksum=False)
+            return csv_path_and_name
+    return None
+
+
 # def overwrite_nemosis_data_fetch():
 #     """Overwrites nemosis dyanmic_data_fetch_loop with added file year-month properties inserted into extracted data
 #     table from AEMO NEMWEB.
@@ -12,6 +12,7 @@ import pandas as pd
 from tqdm import tqdm
 from datetime import datetime, timedelta
 from nempy.historical_inputs.xml_cache import XMLCacheManager
+from .pricesetter_fetch import PRICESETTER_FIELDS
 logger = logging.getLogger(__name__)
 
 
@@ -128,20 +129,29 @@ def read_json_to_df(start_dt, end_dt, cache):
     print("Reading selected {} JSON files to pandas, of cached files".format(len(JSON_subset)))
     logger.info("Loading Cached Price Setter Files...")
 
-    all_df = []
-    for file in tqdm(JSON_subset):
-        with open(file, 'r') as f:
-            data = json.loads(f.read())
-        df_nested_list = pd.json_normalize(data)
-        df_nested_list['@PeriodID'] = pd.to_datetime(df_nested_list['@PeriodID'], format="%Y-%m-%d %H:%M:%S").dt.tz_localize(None)
-        df_nested_list = df_nested_list[(df_nested_list['@Market'] == 'Energy') &
-                                        (df_nested_list['@DispatchedMarket'] == 'ENOF')]
-        all_df += [df_nested_list]
+    all_df = [read_daily_json(file) for file in tqdm(JSON_subset)]
 
     all_df = pd.concat(all_df)
-    all_df.columns = all_df.columns.str.strip('@')
-    all_df.drop(['Market','DispatchedMarket'], axis=1, inplace=True)
-    all_df = all_df.astype({'RegionID': str, 'Price': float, 'Unit': str, 'BandNo': int, \
-                            'Increase': float, 'RRNBandPrice': float, 'BandCost': float})
     all_df = all_df[all_df['PeriodID'].between(start_dt, end_dt, inclusive="right")].sort_values(['PeriodID','RegionID'])
     return all_df.reset_index(drop=True)
+
+
+def read_daily_json(file):
+    """Reads a daily JSON price setter file (NEMED_PS_DAILY_*.json) and returns its Energy market (ENOF) entries as a
+    pandas dataframe with columns: [PeriodID, RegionID, Price, Unit, BandNo, Increase, RRNBandPrice, BandCost]
+    """
+    with open(file, 'r') as f:
+        data = json.loads(f.read())
+    if data and '@PeriodID' in data[0]:
+        # Legacy daily files hold all PriceSetting entries as parsed by xmltodict
+        df = pd.json_normalize(data)
+        df['@PeriodID'] = pd.to_datetime(df['@PeriodID'], format="%Y-%m-%d %H:%M:%S").dt.tz_localize(None)
+        df = df[(df['@Market'] == 'Energy') & (df['@DispatchedMarket'] == 'ENOF')]
+        df.columns = df.columns.str.strip('@')
+        df = df[list(PRICESETTER_FIELDS)]
+    else:
+        # Energy (ENOF) records only, as parsed by pricesetter_fetch.parse_interval
+        df = pd.DataFrame(data, columns=list(PRICESETTER_FIELDS))
+        df['PeriodID'] = pd.to_datetime(df['PeriodID'], format="%Y-%m-%d %H:%M:%S")
+    return df.astype({'RegionID': str, 'Price': float, 'Unit': str, 'BandNo': int, \
+                      'Increase': float, 'RRNBandPrice': float, 'BandCost': float})
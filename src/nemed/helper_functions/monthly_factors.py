@@ -0,0 +1,75 @@
+""" Dense (unit × month) arrays of monthly unit data, for assigning values to unit-interval rows by array indexing"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype
+
+
+def month_index(times):
+    """Returns the number of calendar months since January 1970 of each time in a datetime Series."""
+    return np.asarray(times.values, dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+
+class MonthlyFactorArray:
+    """Values of monthly unit data (e.g. emissions factors from `_get_duid_emissions_intensities`), held in an array
+    per column with a row per unit category code and a column per month. Looking up N unit-interval rows is then a
+    single gather on (DUID code, month), in place of a merge on (year, month, DUID).
+
+    Parameters
+    ----------
+    factors_df : pandas.DataFrame
+        Monthly data with columns 'file_year', 'file_month', 'DUID' (categorical, see `unit_dimension.unit_dtype`) and
+        `columns`, with at most one row per year, month and DUID. Rows without a DUID are ignored.
+    columns : list(str)
+        Columns to hold. Numeric columns are returned as floats, and categorical columns as categoricals.
+    """
+    def __init__(self, factors_df, columns):
+        if not is_categorical_dtype(factors_df['DUID']):
+            raise ValueError("DUID of monthly factors must be encoded as categorical")
+        self.unit_dtype = factors_df['DUID'].dtype
+        codes = factors_df['DUID'].cat.codes.values
+        months = ((factors_df['file_year'].astype(int).values - 1970) * 12 +
+                  factors_df['file_month'].astype(int).values - 1)
+        valid = codes >= 0
+        codes, months = codes[valid], months[valid]
+        self.first_month = months.min() if len(months) else 0
+        shape = (len(self.unit_dtype.categories), (months.max() - self.first_month + 1) if len(months) else 0)
+
+        self.arrays, self.dtypes = {}, {}
+        for col in columns:
+            values = factors_df[col][valid]
+            if is_categorical_dtype(values):
+                array = np.full(shape, -1, dtype=np.int32)
+                array[codes, months - self.first_month] = values.cat.codes.values
+                self.dtypes[col] = values.dtype
+            else:
+                array = np.full(shape, np.nan)
+                array[codes, months - self.first_month] = values.astype(float).values
+            self.arrays[col] = array
+
+    def lookup(self, column, duid, times):
+        """Returns the values of `column` for each unit and time, as an array aligned with `duid` and `times`. Units
+        or months without data are NaN (or missing for categorical columns).
+
+        Parameters
+        ----------
+        column : str
+            One of the columns held.
+        duid : pandas.Series
+            DUID of each row, encoded with the same categorical dtype as the factors.
+        times : pandas.Series
+            Time of each row, whose calendar month is looked up.
+        """
+        if duid.dtype != self.unit_dtype:
+            raise ValueError("DUID must be encoded with the unit dtype of the monthly factors")
+        array = self.arrays[column]
+        codes = duid.cat.codes.values
+        months = month_index(times) - self.first_month
+        found = (codes >= 0) & (months >= 0) & (months < array.shape[1])
+
+        if column in self.dtypes:
+            result = np.full(len(codes), -1, dtype=np.int32)
+            result[found] = array[codes[found], months[found]]
+            return pd.Categorical.from_codes(result, dtype=self.dtypes[column])
+        result = np.full(len(codes), np.nan)
+        result[found] = array[codes[found], months[found]]
+        return result
@@ -0,0 +1,264 @@
+""" Pipelined download and parsing of NEMDE price setter files from AEMO NEMWEB"""
+import io
+import os
+import re
+import zipfile
+import logging
+from xml.etree.ElementTree import iterparse
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ..defaults import PRICESETTER_URL, REQ_URL_HEADERS
+from .instrument import stage
+
+logger = logging.getLogger(__name__)
+MARKET_DAY_START = timedelta(hours=4, minutes=5)
+INTERVALS_PER_DAY = 288
+MEMBER_PATTERN = re.compile(r"NEMPriceSetter_(?P<day>\d{8})(?P<interval>\d{3})00(?P<variant>|_OCD|00)\.xml")
+VARIANT_PREFERENCE = {'': 0, '_OCD': 1, '00': 2}
+# PriceSetting attributes retained for the Energy market (ENOF) and their types
+PRICESETTER_FIELDS = {'PeriodID': str, 'RegionID': str, 'Price': float, 'Unit': str, 'BandNo': int,
+                      'Increase': float, 'RRNBandPrice': float, 'BandCost': float}
+
+
+def create_session(max_retries=5, backoff_factor=1.0, pool_maxsize=8):
+    """Creates a pooled `requests.Session` which retries failed requests with exponential backoff.
+
+    Parameters
+    ----------
+    max_retries : int, optional
+        Number of retries for connection errors and 429/5xx responses, by default 5
+    backoff_factor : float, optional
+        Backoff factor between retries in seconds (doubling each retry), by default 1.0
+    pool_maxsize : int, optional
+        Maximum number of pooled connections, by default 8
+    """
+    retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=["GET"])
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session = requests.Session()
+    session.headers.update(REQ_URL_HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def market_days_for(days):
+    """Market days (starting 04:05) spanned by calendar days (intervals ending 00:05 to 24:00)."""
+    market_days = set()
+    for day in days:
+        market_days.update([day - timedelta(days=1), day])
+    return sorted(market_days)
+
+
+def download_market_day(session, market_day, base_url=PRICESETTER_URL):
+    """Downloads the price setter zip for a market day, returning its content.
+
+    Raises
+    ------
+    zipfile.BadZipFile
+        If the response is not a zip file (e.g. the archive for the day is not published).
+    """
+    url = base_url.format(year=market_day.year, month=str(market_day.month).zfill(2),
+                          day=str(market_day.day).zfill(2))
+    r = session.get(url, timeout=120)
+    r.raise_for_status()
+    if not zipfile.is_zipfile(io.BytesIO(r.content)):
+        raise zipfile.BadZipFile(f"Price setter file for {market_day:%Y-%m-%d} is not a valid zip: {url}")
+    return r.content
+
+
+def resolve_interval_members(names):
+    """Resolves the price setter file for each interval from a single listing of archive members. Where an interval has
+    more than one file name variant, the plain name is preferred over `_OCD` and then `00`, as in
+    `mod_xml_cache.modpricesetter_get_file_name`.
+
+    Parameters
+    ----------
+    names : list(str)
+        Member names of one or more market day archives.
+
+    Returns
+    -------
+    dict
+        Mapping of (market day, interval number) to member name, where the interval number is from 1 (04:05) to 288
+        (04:00 on the following day).
+    """
+    ranked = {}
+    for name in names:
+        match = MEMBER_PATTERN.fullmatch(os.path.basename(name))
+        if match is None:
+            continue
+        key = (datetime.strptime(match['day'], "%Y%m%d"), int(match['interval']))
+        ranked[key] = min(ranked.get(key, (len(VARIANT_PREFERENCE), None)),
+                          (VARIANT_PREFERENCE[match['variant']], name))
+    return {key: name for key, (_, name) in ranked.items()}
+
+
+def parse_interval(stream):
+    """Incrementally parses a price setter XML file, returning a list of records of the typed `PRICESETTER_FIELDS` for
+    PriceSetting entries of the Energy market (ENOF). Entries for other markets are discarded as they are parsed.
+    PeriodID is returned without its timezone offset, in format 'yyyy-mm-dd HH:MM:SS'.
+
+    Parameters
+    ----------
+    stream : file-like
+        Binary XML content of a single interval.
+    """
+    records = []
+    for _, elem in iterparse(stream, events=("end",)):
+        if elem.tag != 'PriceSetting':
+            continue
+        attrib = elem.attrib
+        if attrib.get('Market') == 'Energy' and attrib.get('DispatchedMarket') == 'ENOF':
+            record = {field: convert(attrib[field]) for field, convert in PRICESETTER_FIELDS.items()}
+            record['PeriodID'] = record['PeriodID'][:19].replace('T', ' ')
+            records += [record]
+        elem.clear()
+    return records
+
+
+def parse_market_day(content, market_day):
+    """Parses all intervals of a market day price setter zip, returning a dict of interval (end) time to the list of
+    Energy market PriceSetting records for that interval (see `parse_interval`). Members are read from the zip in
+    memory; nothing is extracted to disk. Intervals missing from the archive are logged and omitted.
+    """
+    parsed = {}
+    with zipfile.ZipFile(io.BytesIO(content)) as z:
+        members = resolve_interval_members(z.namelist())
+        for n in range(INTERVALS_PER_DAY):
+            interval = market_day + MARKET_DAY_START + timedelta(minutes=5 * n)
+            name = members.get((market_day, n + 1))
+            if name is None:
+                logger.warning(f"Price setter file for {interval} not found in archive for {market_day:%Y-%m-%d}")
+                continue
+            with z.open(name) as stream:
+                parsed[interval] = parse_interval(stream)
+    return parsed
+
+
+def assemble_day(day, parsed_market_days):
+    """Combines the records of intervals ending within a calendar day, in interval order, from the parsed market days
+    it spans (see `parse_market_day`).
+
+    Raises
+    ------
+    Exception
+        If any interval of the day is missing.
+    """
+    intervals = {}
+    for parsed in parsed_market_days:
+        intervals.update({t: v for t, v in parsed.items() if day < t <= day + timedelta(days=1)})
+    if len(intervals) < INTERVALS_PER_DAY:
+        raise Exception(f"{INTERVALS_PER_DAY - len(intervals)} intervals missing")
+    return [record for t in sorted(intervals) for record in intervals[t]]
+
+
+def load_day(day, session=None, base_url=PRICESETTER_URL):
+    """Downloads and parses price setter data for a single calendar day, returning the list of Energy market
+    PriceSetting records for intervals ending within the day. Use `fetch_pricesetter_days` for many days.
+
+    Parameters
+    ----------
+    day : datetime
+        Calendar day to retrieve.
+    session : requests.Session, optional
+        Session to download with, by default one created by `create_session`
+    base_url : str, optional
+        Price setter zip URL template, by default `defaults.PRICESETTER_URL`
+    """
+    session = session or create_session()
+    return assemble_day(day, [parse_market_day(download_market_day(session, market_day, base_url), market_day)
+                              for market_day in market_days_for([day])])
+
+
+def fetch_pricesetter_days(days, write_day, max_downloads=4, max_parsers=None, session=None,
+                           base_url=PRICESETTER_URL):
+    """Downloads and parses price setter data for calendar days in a pipeline. Market day zips are downloaded
+    concurrently over a pooled session, parsed in memory in a separate process pool and each calendar day is passed to
+    `write_day` in order as soon as the two market days it spans are parsed.
+
+    Parameters
+    ----------
+    days : list(datetime)
+        Calendar days to retrieve.
+    write_day : callable
+        Called as `write_day(day, records)` for each day (in order) with the list of Energy market PriceSetting records
+        for intervals ending within the day. Days with any interval missing are not written.
+    max_downloads : int, optional
+        Maximum number of concurrent downloads, by default 4
+    max_parsers : int, optional
+        Number of parsing processes, by default None to use the number of CPUs
+    session : requests.Session, optional
+        Session to download with, by default one created by `create_session`
+    base_url : str, optional
+        Price setter zip URL template, by default `defaults.PRICESETTER_URL`
+
+    Returns
+    -------
+    list(datetime)
+        Days which could not be retrieved.
+    """
+    days = sorted(days)
+    session = session or create_session(pool_maxsize=max_downloads)
+    pending = iter(market_days_for(days))
+    # Market days downloaded, parsed or held ahead of writing are bounded by a window, such that memory does not grow
+    # with the number of days. Each calendar day spans two market days, and the window (of at least two) only holds
+    # market days required by days not yet written.
+    window = max_downloads + (max_parsers or os.cpu_count() or 1)
+    parsed = {}
+    failed = []
+
+    # Downloads are shut down (and waited on) before the parser pool they submit to
+    with ProcessPoolExecutor(max_workers=max_parsers) as parsers, \
+            ThreadPoolExecutor(max_workers=max_downloads) as downloads:
+
+        def chain(market_day, target):
+            # Parse each download once complete, resolving `target` with the parsed result (or error)
+            def on_parse(parse):
+                if parse.exception() is not None:
+                    target.set_exception(parse.exception())
+                else:
+                    target.set_result(parse.result())
+
+            def on_download(download):
+                try:
+                    parsers.submit(parse_market_day, download.result(), market_day).add_done_callback(on_parse)
+                except Exception as e:
+                    target.set_exception(e)
+            return on_download
+
+        def fill_window():
+            while len(parsed) < window:
+                market_day = next(pending, None)
+                if market_day is None:
+                    return
+                parsed[market_day] = Future()
+                downloads.submit(download_market_day, session, market_day, base_url).add_done_callback(
+                    chain(market_day, parsed[market_day]))
+
+        # Write calendar days in order
+        fill_window()
+        for n, day in enumerate(days):
+            try:
+                # Measured as the time waiting on the day's market days to be downloaded and parsed
+                with stage('pricesetter_parse') as parse:
+                    records = assemble_day(day, [parsed[market_day].result()
+                                                 for market_day in market_days_for([day])])
+                    parse.rows_out = len(records)
+            except Exception as e:
+                logger.warning("PriceSetter Download for {} failed ({}). Continuing with remaining dates..."
+                               .format(day, e))
+                failed += [day]
+            else:
+                write_day(day, records)
+            finally:
+                # Release market days not required by later days, whether or not the day was written. Days are
+                # sorted, so later days only require market days from the day before the next day.
+                required_from = min(market_days_for(days[n + 1:n + 2])) if n + 1 < len(days) else None
+                for market_day in [m for m in parsed if required_from is None or m < required_from]:
+                    del parsed[market_day]
+                fill_window()
+    return failed
@@ -0,0 +1,142 @@
+""" Columnar store of price setter data in cache, as Parquet files partitioned by year and month"""
+import os
+import logging
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from .mod_xml_cache import read_daily_json
+from . import unit_dimension as ud
+from . import cache_index
+
+logger = logging.getLogger(__name__)
+STORE_DIR = "NEMED_PS_STORE"
+SCHEMA = pa.schema([
+    ('PeriodID', pa.timestamp('ns')),
+    ('RegionID', pa.dictionary(pa.int32(), pa.string())),
+    ('Price', pa.float64()),
+    ('Unit', pa.dictionary(pa.int32(), pa.string())),
+    ('BandNo', pa.int64()),
+    ('Increase', pa.float64()),
+    ('RRNBandPrice', pa.float64()),
+    ('BandCost', pa.float64()),
+])
+
+
+def day_path(cache, day):
+    """Path of the Parquet file holding price setter data for intervals ending within a calendar day."""
+    return os.path.join(cache, STORE_DIR, f"year={day.year}", f"month={day.month:02d}",
+                        f"{day:%Y-%m-%d}.parquet")
+
+
+def stored_days(cache):
+    """Returns the set of calendar days held in the store, as listed in the cache index. Days whose files were removed
+    other than by NEMED are listed until `read_pricesetters` finds them missing."""
+    files = [f for f in cache_index.files(cache, STORE_DIR + "/") if f.endswith(".parquet")]
+    return {datetime.strptime(os.path.basename(f)[:10], "%Y-%m-%d") for f in files}
+
+
+def write_day(cache, day, records):
+    """Writes price setter data for a single day to the store.
+
+    Parameters
+    ----------
+    cache : str
+        Raw data location in local directory
+    day : datetime
+        Calendar day of the data.
+    records : list(dict) or pandas.DataFrame
+        Energy market PriceSetting records with the fields of `SCHEMA`, as parsed by `pricesetter_fetch.parse_interval`.
+    """
+    df = pd.DataFrame(records, columns=SCHEMA.names)
+    df['PeriodID'] = pd.to_datetime(df['PeriodID'], format="%Y-%m-%d %H:%M:%S")
+    table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+    path = day_path(cache, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file and rename, so a partially written day is never read
+    pq.write_table(table, path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+    cache_index.record(cache, path)
+
+
+def read_pricesetters(cache, start_dt, end_dt, regions=None):
+    """Reads price setter data for intervals ending within (start_dt, end_dt] from the store. Only the daily files
+    spanning the period are opened, and PeriodID and RegionID filters are pushed down to the Parquet reader.
+
+    Parameters
+    ----------
+    cache : str
+        Raw data location in local directory
+    start_dt : datetime
+        Start of period (exclusive)
+    end_dt : datetime
+        End of period (inclusive)
+    regions : list(str), optional
+        Regions to return, by default None for all regions
+
+    Returns
+    -------
+    pandas.DataFrame
+        Price Setter dataframe containing columns: [PeriodID, RegionID, Price, Unit, BandNo, Increase, RRNBandPrice,
+        BandCost], with RegionID and Unit as categoricals
+    """
+    days = pd.date_range(datetime(start_dt.year, start_dt.month, start_dt.day), end_dt - timedelta(minutes=5))
+    # Days indexed but no longer in cache are forgotten, so they are retrieved again by the next call
+    files = [day_path(cache, day) for day in days if cache_index.find(cache, day_path(cache, day))]
+    logger.info("Loading {} Cached Price Setter Files...".format(len(files)))
+    if not files:
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in
+                             zip(SCHEMA.names, ['datetime64[ns]', 'category', float, 'category', int, float, float,
+                                                float])})
+
+    condition = (ds.field('PeriodID') > pa.scalar(start_dt, pa.timestamp('ns'))) & \
+        (ds.field('PeriodID') <= pa.scalar(end_dt, pa.timestamp('ns')))
+    if regions is not None:
+        condition = condition & ds.field('RegionID').isin(list(regions))
+    table = ds.dataset(files, schema=SCHEMA, format="parquet").to_table(filter=condition)
+
+    # Categories in sorted order, so sorting by region matches sorting by region name
+    all_df = table.to_pandas()
+    all_df = ud.encode(all_df, {'RegionID': ud.region_dtype(all_df['RegionID']), 'Unit': ud.unit_dtype(all_df['Unit'])})
+    return all_df.sort_values(['PeriodID', 'RegionID'], kind='stable').reset_index(drop=True)
+
+
+def migrate_json(cache):
+    """One-off migration of daily JSON price setter files (NEMED_PS_DAILY_*.json) in cache to the store. Each JSON file
+    is removed once its day is written to the store and read back with all of its records, and is otherwise left in
+    place.
+
+    Returns
+    -------
+    int
+        Number of days migrated.
+    """
+    json_files = [f for f in cache_index.files(cache, "NEMED_PS_DAILY_") if f.endswith(".json")]
+    if not json_files:
+        return 0
+    logger.info("Migrating {} daily JSON Price Setter Files to Parquet...".format(len(json_files)))
+    migrated = 0
+    with cache_index.batch(cache):
+        for file in json_files:
+            day = datetime.strptime(file[-15:-5], "%Y-%m-%d")
+            records = read_daily_json(file)
+            write_day(cache, day, records)
+            if not _verify_day(cache, day, len(records)):
+                logger.warning(f"Price setter data for {day:%Y-%m-%d} could not be verified in the store. {file} is "
+                               "kept and will be migrated again.")
+                continue
+            os.remove(file)
+            cache_index.forget(cache, file)
+            migrated += 1
+    return migrated
+
+
+def _verify_day(cache, day, n_records):
+    """Returns True if the store file of a day matches its recorded checksum and holds `n_records` rows."""
+    path = day_path(cache, day)
+    try:
+        return cache_index.verify(cache, path) and pq.read_metadata(path).num_rows == n_records
+    except Exception:
+        return False
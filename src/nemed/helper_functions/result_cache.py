@@ -0,0 +1,135 @@
+""" Content-addressed cache of processed emissions segments, reused across calls with matching parameters and inputs"""
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from importlib.metadata import version, PackageNotFoundError
+import pandas as pd
+from .mod_nemosis import mms_cache_filename
+
+logger = logging.getLogger(__name__)
+MANIFEST_NAME = "nemed_results_manifest.json"
+
+
+def nemed_version():
+    """Installed NEMED version, included in cache keys so results are recomputed after an upgrade."""
+    try:
+        return version("nemed")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def file_fingerprint(path):
+    """Returns [size, mtime_ns] of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def segment_input_files(start_time, end_time, cache):
+    """Lists the cache files of MMS tables read for data in the period when processing total emissions for a segment.
+    Files which may be read but are not (yet) cached are included, such that a later download changes the fingerprint.
+    Reference tables (DUALLOC, DUDETAILSUMMARY) are keyed by content instead, see `table_digest`.
+
+    Parameters
+    ----------
+    start_time : str
+        Segment start in format 'yyyy/mm/dd HH:MM'
+    end_time : str
+        Segment end in format 'yyyy/mm/dd HH:MM'
+    cache : str
+        Raw data location in local directory
+    """
+    stime = datetime.strptime(start_time, "%Y/%m/%d %H:%M")
+    etime = datetime.strptime(end_time, "%Y/%m/%d %H:%M") + timedelta(minutes=5)
+
+    files = mms_month_files("DISPATCH_UNIT_SCADA", stime, etime, cache)
+    files += mms_month_files("GENUNITS", stime, etime, cache)
+    return files
+
+
+def table_digest(df):
+    """Returns a hash of the content of a dataframe, used to key segments on the reference data they use rather than on
+    the snapshot files it is read from (which are named by month, and change monthly)."""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+def mms_month_files(table_name, first, last, cache):
+    """Lists the monthly cache files of an MMS table which may be read for data between `first` and `last`, including
+    the month before `first` (read by nemosis when `first` falls at the start of a month).
+    """
+    months = pd.date_range(datetime(first.year, first.month, 1) - pd.DateOffset(months=1), last, freq='MS')
+    return [mms_cache_filename(table_name, m.year, m.month, cache) for m in months]
+
+
+def segment_key(params, input_files, references=None):
+    """Returns the cache key for a segment, as a hash of the processing parameters, the fingerprint of each input file,
+    the digest of each reference table and the NEMED version.
+
+    Parameters
+    ----------
+    params : dict
+        JSON serialisable processing parameters, including the segment start and end.
+    input_files : list(str)
+        Files read to process the segment.
+    references : dict, optional
+        Digest (from `table_digest`) of the reference data used to process the segment, by table name.
+    """
+    content = {'params': params,
+               'inputs': {os.path.basename(f): file_fingerprint(f) for f in input_files},
+               'references': references or {},
+               'version': nemed_version()}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def segment_id(params):
+    """Identifier of a segment by its processing parameters alone, used to name its results file."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def read_manifest(cache):
+    """Reads the manifest of cached segments, mapping cache key to file name and parameters."""
+    path = os.path.join(cache, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        logger.warning(f"Results manifest {path} could not be read and will be rebuilt")
+        return {}
+
+
+def _write_manifest(cache, manifest):
+    # Write to a temporary file and rename, so the manifest is never left partially written
+    path = os.path.join(cache, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def lookup(cache, key):
+    """Returns the file name of a cached segment matching `key`, or None if there is no valid entry."""
+    entry = read_manifest(cache).get(key)
+    if entry and os.path.exists(os.path.join(cache, entry['file'])):
+        return entry['file']
+    return None
+
+
+def record(cache, key, filename, params):
+    """Adds a processed segment to the manifest. Entries (and files) for the same segment parameters with a stale key
+    are removed.
+    """
+    manifest = read_manifest(cache)
+    seg_id = segment_id(params)
+    for stale_key in [k for k, v in manifest.items() if v.get('segment') == seg_id and k != key]:
+        stale_file = manifest.pop(stale_key)['file']
+        if stale_file != filename and os.path.exists(os.path.join(cache, stale_file)):
+            os.remove(os.path.join(cache, stale_file))
+    manifest[key] = {'file': filename, 'segment': seg_id, 'params': params, 'version': nemed_version(),
+                     'created': datetime.now().isoformat(timespec='seconds')}
+    _write_manifest(cache, manifest)
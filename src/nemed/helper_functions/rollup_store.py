@@ -0,0 +1,59 @@
+""" Store of region-level energy and emissions sums rolled up to standard time resolutions, one Parquet file per
+calendar month and parameter set"""
+import os
+import logging
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+STORE_DIR = "NEMED_ROLLUP_STORE"
+
+
+def month_file(month, seg_id):
+    """Path (relative to cache) of the rollups for a calendar month, as recorded in the results manifest.
+
+    Parameters
+    ----------
+    month : datetime
+        Start of the calendar month.
+    seg_id : str
+        Identifier of the rollup parameters, from `result_cache.segment_id`.
+    """
+    return os.path.join(STORE_DIR, f"{month:%Y-%m}_{seg_id[:12]}.parquet")
+
+
+def write_month(cache, filename, rollups):
+    """Writes the rollups of a calendar month to the store.
+
+    Parameters
+    ----------
+    cache : str
+        Raw data location in local directory
+    filename : str
+        Path relative to cache, from `month_file`.
+    rollups : pandas.DataFrame
+        Sums for each resolution, with columns [Resolution, TimeBeginning, TimeEnding, Region, Energy (or Energy_SO),
+        Total_Emissions].
+    """
+    path = os.path.join(cache, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file and rename, so a partially written month is never read
+    pq.write_table(pa.Table.from_pandas(rollups, preserve_index=False), path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+
+
+def read_months(cache, filenames, resolution):
+    """Reads the rollups of a single resolution for a set of months from the store, pushing the resolution filter down
+    to the Parquet reader.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Sums with columns [TimeBeginning, TimeEnding, Region, Energy (or Energy_SO), Total_Emissions], with Region as a
+        categorical.
+    """
+    paths = [os.path.join(cache, f) for f in filenames]
+    logger.info("Loading {} Cached Emissions Rollup Files...".format(len(paths)))
+    table = ds.dataset(paths, format="parquet").to_table(filter=ds.field('Resolution') == resolution)
+    return table.to_pandas().drop(columns='Resolution')
@@ -0,0 +1,59 @@
+""" In-process memoisation of reference tables, invalidated when the cache files they are read from change"""
+import json
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from .result_cache import file_fingerprint
+
+logger = logging.getLogger(__name__)
+MAX_ENTRIES = 32
+_memo = OrderedDict()
+_lock = threading.Lock()
+
+
+def memoize_table(input_files):
+    """Decorator memoising a function returning a pandas.DataFrame. Results are keyed on the function arguments and
+    the fingerprint (size, mtime) of the files the function reads, and a copy is returned on each call. The memo holds
+    at most `MAX_ENTRIES` tables, discarding the least recently used.
+
+    Parameters
+    ----------
+    input_files : callable
+        Called with the arguments of the decorated function, returning the list of files it reads. Files downloaded
+        by the call itself are fingerprinted after the call.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                call = json.dumps([func.__module__, func.__qualname__, args, kwargs], sort_keys=True, default=str)
+                files = input_files(*args, **kwargs)
+            except Exception:
+                # Leave invalid arguments to be reported by the function itself
+                return func(*args, **kwargs)
+
+            key = _memo_key(call, files)
+            with _lock:
+                if key in _memo:
+                    _memo.move_to_end(key)
+                    return _memo[key].copy()
+
+            result = func(*args, **kwargs)
+            with _lock:
+                _memo[_memo_key(call, files)] = result.copy()
+                while len(_memo) > MAX_ENTRIES:
+                    _memo.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
+
+def clear_memo():
+    """Discards all memoised tables."""
+    with _lock:
+        _memo.clear()
+
+
+def _memo_key(call, files):
+    return call, json.dumps([[str(f), file_fingerprint(f)] for f in files])
@@ -0,0 +1,62 @@
+""" Dictionary encoding of unit and region identifiers shared by the frames of the emissions calculations"""
+import logging
+import pandas as pd
+from pandas.api.types import is_categorical_dtype, is_object_dtype
+
+logger = logging.getLogger(__name__)
+NEM_REGIONS = ['NEM', 'NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1']
+# Identifier and descriptor columns held as categoricals within the package
+DIMENSION_COLUMNS = ['DUID', 'GENSETID', 'Region', 'REGIONID', 'DISPATCHTYPE', 'CO2E_ENERGY_SOURCE',
+                     'CO2E_DATA_SOURCE']
+
+
+def unit_dtype(*duid_columns):
+    """Returns the unit dimension for a set of DUID columns, as a categorical dtype of the sorted union of their DUIDs.
+    The category code of each DUID is its integer surrogate key, such that frames encoded with the same dtype are
+    merged and grouped on these codes.
+    """
+    duids = set()
+    for column in duid_columns:
+        values = column.cat.categories if is_categorical_dtype(column) else column.dropna().unique()
+        duids.update(values)
+    return pd.CategoricalDtype(sorted(duids))
+
+
+def region_dtype(*region_columns):
+    """Returns the region dimension, including the 'NEM' aggregate. Categories are sorted, so ordering by the
+    categorical matches ordering by region name."""
+    regions = set(NEM_REGIONS)
+    for column in region_columns:
+        regions.update(column.cat.categories if is_categorical_dtype(column) else column.dropna().unique())
+    return pd.CategoricalDtype(sorted(regions))
+
+
+def encode(df, dtypes=None):
+    """Encodes the `DIMENSION_COLUMNS` of a dataframe as categoricals, using the given dtype for any column in
+    `dtypes` (e.g. from `unit_dtype`) and otherwise categories of the column's own values. Returns a new dataframe.
+    """
+    dtypes = dtypes or {}
+    columns = {col: df[col].astype(dtype) for col, dtype in dtypes.items()
+               if col in df.columns and df[col].dtype != dtype}
+    columns.update({col: df[col].astype('category') for col in df.columns.intersection(DIMENSION_COLUMNS)
+                    if col not in dtypes and is_object_dtype(df[col])})
+    return df.assign(**columns) if columns else df
+
+
+def decode(df):
+    """Decodes all categorical columns of a dataframe to strings, as returned by the public API."""
+    columns = {col: df[col].astype(object) for col in df.columns if is_categorical_dtype(df[col])}
+    return df.assign(**columns) if columns else df
+
+
+def concat_encoded(frames, **kwargs):
+    """Concatenates encoded dataframes, unifying the categories of categorical columns such that they remain
+    categorical (pandas otherwise falls back to strings where categories differ)."""
+    frames = list(frames)
+    if len(frames) > 1:
+        dtypes = {}
+        for col in frames[0].columns:
+            if all(col in f.columns and is_categorical_dtype(f[col]) for f in frames):
+                dtypes[col] = unit_dtype(*[f[col] for f in frames])
+        frames = [encode(f, dtypes) for f in frames]
+    return pd.concat(frames, **kwargs)
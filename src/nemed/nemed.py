@@ -1,10 +1,13 @@
 """Core user interfacing module"""
 from . import process as nd
 from . helper_functions import helpers as hp
+from . helper_functions import unit_dimension as ud
+from . helper_functions import instrument
+from . helper_functions.instrument import profile, log_record  # noqa: F401 (re-exported for users)
 from datetime import datetime as dt, timedelta
-import pandas as pd
 
-def get_total_emissions(start_time, end_time, cache, filter_regions=None, by=None, generation_sent_out=True, assume_energy_ramp=True, return_pivot=False):
+def get_total_emissions(start_time, end_time, cache, filter_regions=None, by=None, generation_sent_out=True, assume_energy_ramp=True, return_pivot=False,
+                        n_jobs=1, max_ramp_gap=None):
     """Retrieve (Aggregated) Regional Emissions data for total emissions (absolute and emissions intensity), as well as sent-out
     energy generation for a defined period and time-resolution (e.g. hour, day, month)
 
@@ -18,14 +21,20 @@ def get_total_emissions(start_time, end_time, cache, filter_regions=None, by=Non
         Raw data location in local directory
     filter_regions : list(str)
         NEM regions to filter for while retrieving the data, as a list, by default None to collect all region data
-    by : str, one of ['interval', 'hour', 'day', 'month', 'year']
-        The time-resolution of output data to aggregate to, by default None to return unaggregated 5-minute time resolution
+    by : str, one of ['interval', 'trading_interval', 'hour', 'day', 'week', 'month', 'year', 'financial_year']
+        The time-resolution of output data to aggregate to, by default None to return unaggregated 5-minute time resolution.
+        Any pandas frequency string (e.g. '30T', 'Q', 'A-JUN') is also accepted
     generation_sent_out : bool
         Considers 'sent_out' generation (auxilary loads) as opposed to 'as generated' in calculations, by default True
     assume_ramp : bool
         Uses a linear ramp between dispatch scada points as opposed to a stepped function, by default True
     return_pivot : bool
         Changes the structure of the returned dataframe to a pivot with column hierarchy as Data Metric then Region, by default False
+    n_jobs : int
+        Number of monthly segments to process concurrently in a process pool, -1 to use all CPUs, by default 1
+    max_ramp_gap : int
+        Number of dispatch intervals between consecutive dispatch records of a unit beyond which energy is calculated as
+        a step rather than ramped, by default None to always ramp. Only used if `assume_ramp` is True
 
     Returns
     -------
@@ -45,34 +54,31 @@ def get_total_emissions(start_time, end_time, cache, filter_regions=None, by=Non
     # Check if cache folder exists
     hp._check_cache(cache)
 
-    # Get emissions for all units by dispatch interval
-    raw_table = nd.get_total_emissions_by_DI_DUID(
-        start_time, end_time, cache, filter_regions=filter_regions,
-        generation_sent_out=generation_sent_out, assume_energy_ramp=assume_energy_ramp, return_all=True)
-    clean_table = raw_table.drop_duplicates(subset=['Time', 'DUID'])
-
-    # Aggregate DUID data to regions
-    en_colname = clean_table.columns[clean_table.columns.str.contains('Energy')][0]
-    res = clean_table[['Time', 'Region', en_colname, 'Total_Emissions']].groupby(['Time', 'Region'])\
-        .sum().reset_index()
-
-    # Create NEM agggregation
-    if filter_regions == None:
-        nem = res.groupby(['Time']).sum().reset_index()
-        nem.insert(1,'Region','NEM')
-        res = pd.concat([res,nem],ignore_index=True)
-
-    # Aggregate data to `by`
-    if by != None:
-        aggregate = nd.aggregate_data_by(data=res, by=by)
-    else:
-        aggregate = res.rename(columns={'Time': 'TimeEnding'})
+    # Region (and period) sums, reduced from unit data as each segment is processed so that memory is proportional to
+    # the output, or read from the rollup store for whole calendar months of aggregated periods
+    partials = nd._iter_region_sums(start_time, end_time, cache, filter_regions, by, generation_sent_out,
+                                    assume_energy_ramp, n_jobs, max_ramp_gap)
+    res = ud.concat_encoded(partials, ignore_index=True)
+    en_colname = res.columns[res.columns.str.contains('Energy')][0]
+
+    # Aggregate data to `by`, merging partial sums of periods spanning segment boundaries
+    with instrument.stage('aggregation', rows_in=len(res)) as stage:
+        if by is None:
+            aggregate = res.rename(columns={'Time': 'TimeEnding'})
+        elif by == 'interval':
+            aggregate = nd.aggregate_data_by(data=res, by=by)
+        else:
+            aggregate = res.groupby(['TimeBeginning', 'TimeEnding', 'Region'], sort=False,
+                                    observed=True).sum().reset_index()
+            aggregate = aggregate[['TimeBeginning', 'TimeEnding', 'Region', en_colname, 'Total_Emissions']].round(3)
+        stage.rows_out = len(aggregate)
 
     # Calculate Intensity Index considering weighted sum of emissions / energy
     aggregate['Intensity_Index'] = aggregate['Total_Emissions'] / aggregate[en_colname]
     aggregate['Intensity_Index'] = aggregate['Intensity_Index'].fillna(0.0)
 
     # Return as pivot table
+    aggregate = ud.decode(aggregate)
     if return_pivot:
         aggregate = aggregate.pivot(index="TimeEnding",
                                     columns="Region",
@@ -4,17 +4,35 @@ import pandas as pd
 import numpy as np
 import logging
 import os
-from .downloader import download_cdeii_table, download_unit_dispatch, download_pricesetter_files, download_generators_info, \
-    download_duid_auxload, download_plant_emissions_factors, read_plant_auxload_csv, download_genset_map, download_dudetailsummary
+from joblib import Parallel, delayed
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick, MonthBegin, MonthEnd, QuarterBegin, QuarterEnd, YearBegin, YearEnd
+from .downloader import download_cdeii_table, download_unit_dispatch, download_generators_info, \
+    download_duid_auxload, download_plant_emissions_factors, read_plant_auxload_csv, download_genset_map, download_dudetailsummary, \
+    _pricesetter_table, PLANT_AUXLOAD_FILEPATH
 from .helper_functions import helpers as hp
+from .helper_functions import dispatch_store
+from .helper_functions import instrument
+from .helper_functions import result_cache
+from .helper_functions import rollup_store
+from .helper_functions import unit_dimension as ud
+from .helper_functions.mod_nemosis import mms_cache_filename
+from .helper_functions.monthly_factors import MonthlyFactorArray
+from .helper_functions.effective_index import EffectiveDatedIndex
 from .defaults import CO2E_DATA_SOURCE_YEARMAP
 
 DISP_INT_LENGTH = 5
+# Named time resolutions accepted by `aggregate_data_by`, any other pandas frequency string may also be passed
+TIME_RESOLUTIONS = {'trading_interval': '30T', 'hour': 'H', 'day': 'D', 'week': 'W-SUN', 'month': 'M', 'year': 'A',
+                    'financial_year': 'A-JUN'}
+# Resolutions held in the rollup store for each month, as pandas frequencies
+ROLLUP_RESOLUTIONS = {'interval': '5T', 'hour': 'H', 'day': 'D', 'month': 'M'}
 logger = logging.getLogger(__name__)
 
 
 def get_total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions=None, generation_sent_out=True, \
-                                   assume_energy_ramp=True, dropna_co2factors=True, return_all=False):
+                                   assume_energy_ramp=True, dropna_co2factors=True, return_all=False, n_jobs=1,
+                                   max_ramp_gap=None):
     """Retrieve the total emissions for each generation unit per dispatch interval.
 
     Parameters
@@ -35,6 +53,13 @@ def get_total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions=N
         Removes data (generation) entries which do not have a CO2E_EMISSIONS_FACTOR mapped to them, by default True
     return_all : bool
         Returns the entire table will all columns as opposed to tidied up table, by default False
+    n_jobs : int
+        Number of monthly segments to process concurrently in a process pool (via joblib), -1 to use all CPUs, by default
+        1 to process segments sequentially
+    max_ramp_gap : int
+        Number of dispatch intervals between consecutive dispatch records of a unit beyond which energy is calculated as
+        a step rather than ramped from the earlier record, by default None to always ramp. Only used if
+        `assume_energy_ramp` is True
 
     Returns
     -------
@@ -54,6 +79,46 @@ def get_total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions=N
         =========================  ========  ===================================================================================================================
 
     """
+    return ud.decode(_total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions, generation_sent_out,
+                                                 assume_energy_ramp, dropna_co2factors, return_all, n_jobs,
+                                                 max_ramp_gap))
+
+
+def _total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions=None, generation_sent_out=True,
+                                assume_energy_ramp=True, dropna_co2factors=True, return_all=False, n_jobs=1,
+                                max_ramp_gap=None):
+    """As `get_total_emissions_by_DI_DUID`, with units and regions returned as categoricals (see `unit_dimension`)."""
+    res = ud.concat_encoded(_iter_total_emissions(start_time, end_time, cache, filter_regions, generation_sent_out,
+                                                  assume_energy_ramp, dropna_co2factors, return_all, n_jobs,
+                                                  max_ramp_gap),
+                            ignore_index=True)
+    logger.info('Completed get_total_emissions_by_DI_DUID')
+    return res
+
+
+def iter_total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions=None, generation_sent_out=True,
+                                    assume_energy_ramp=True, dropna_co2factors=True, return_all=False, n_jobs=1,
+                                    max_ramp_gap=None):
+    """Generator of the total emissions for each generation unit per dispatch interval, yielding one frame per monthly
+    segment in time order. Only the last dispatch of each unit is carried between segments (to continue the energy
+    ramp), so arbitrarily long periods can be processed with memory bounded by a single segment.
+
+    Parameters are as for `get_total_emissions_by_DI_DUID`, and frames have the columns it returns. With `n_jobs` other
+    than 1 all segments not already cached are processed before the first frame is yielded.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Total emissions for each DUID and dispatch interval of a segment.
+    """
+    for df in _iter_total_emissions(start_time, end_time, cache, filter_regions, generation_sent_out,
+                                    assume_energy_ramp, dropna_co2factors, return_all, n_jobs, max_ramp_gap):
+        yield ud.decode(df)
+
+
+def _iter_total_emissions(start_time, end_time, cache, filter_regions, generation_sent_out, assume_energy_ramp,
+                          dropna_co2factors, return_all, n_jobs, max_ramp_gap=None):
+    """Yields the (encoded) total emissions of each segment in time order, see `iter_total_emissions_by_DI_DUID`."""
     # Check if cache is an existing directory
     hp._check_cache(cache)
 
@@ -68,34 +133,213 @@ def get_total_emissions_by_DI_DUID(start_time, end_time, cache, filter_regions=N
 
     # Segment emissions calculations into smaller chunks
     ts = _generate_timeseries_loop(prior_start_time, end_time)
-    res_str = []
-    for sdate, edate, st, et in zip(ts['start'], ts['end'], ts['s_str'], ts['e_str']):
-        logger.info(f"Processing total emissions from {st} to {et}")
-        df = _total_emissions_process(sdate, edate, cache, filter_regions, generation_sent_out, assume_energy_ramp, \
-                                      dropna_co2factors)
-        name = 'processed_co2_total_{}_{}.parquet'.format(st, et)
+    chunks = list(zip(ts['start'], ts['end'], ts['s_str'], ts['e_str']))
+
+    # Reuse previously processed segments where parameters and input files are unchanged
+    res_str, seg_params, pending = [], [], []
+    for idx, (sdate, edate, st, et) in enumerate(chunks):
+        params = _segment_params(sdate, edate, filter_regions, generation_sent_out, assume_energy_ramp,
+                                 dropna_co2factors, max_ramp_gap)
+        name = result_cache.lookup(cache, _segment_key(params, cache))
+        if name:
+            logger.info(f"Using cached total emissions from {st} to {et}")
+        else:
+            pending += [idx]
         res_str += [name]
-        df.to_parquet(os.path.join(cache, name))
+        seg_params += [params]
+
+    def process_segments(indexes, n_jobs):
+        computed = Parallel(n_jobs=n_jobs)(
+            delayed(_total_emissions_chunk)(*chunks[idx], cache, filter_regions, generation_sent_out,
+                                            assume_energy_ramp, dropna_co2factors, max_ramp_gap,
+                                            result_cache.segment_id(seg_params[idx])[:12])
+            for idx in indexes)
+        for idx, name in zip(indexes, computed):
+            result_cache.record(cache, _segment_key(seg_params[idx], cache), name, seg_params[idx])
+            res_str[idx] = name
+
+    # Segments are processed concurrently up front, or otherwise one at a time as they are reached
+    if n_jobs != 1 and len(pending) > 1:
+        _prefetch_chunk_inputs(chunks[pending[0]][0], chunks[pending[-1]][1], cache, n_jobs)
+        process_segments(pending, n_jobs)
+
+    # Load cached results files, continuing the energy ramp across segment boundaries
+    last_dispatch = None
+    for idx in range(len(chunks)):
+        if res_str[idx] is None:
+            process_segments([idx], 1)
+        logger.info(f"Loading results file {res_str[idx]}")
+        df = ud.encode(pd.read_parquet(os.path.join(cache, res_str[idx])))
+        if assume_energy_ramp:
+            df = _stitch_energy_ramp(df, last_dispatch, generation_sent_out, max_gap=max_ramp_gap)
+            last_dispatch = _last_dispatch_by_duid(df, last_dispatch, max_gap=max_ramp_gap)
+
+        df = df[df['Time'].between(start_time, end_time, inclusive="right")].reset_index(drop=True)
+        if not return_all:
+            if generation_sent_out:
+                df = df[['DUID', 'Time', 'Region', 'Plant_Emissions_Intensity', 'Energy', 'PCT_AUXILIARY_LOAD',
+                         'Energy_SO', 'Total_Emissions']]
+            else:
+                df = df[['DUID', 'Time', 'Region', 'Plant_Emissions_Intensity', 'Energy', 'Total_Emissions']]
+        yield df
+
+
+def _iter_region_sums(start_time, end_time, cache, filter_regions, by, generation_sent_out, assume_energy_ramp,
+                      n_jobs, max_ramp_gap=None):
+    """Yields region (and NEM, if `filter_regions` is None) sums of energy and emissions for the period, as used by
+    `get_total_emissions`. Sums are by interval (with a 'Time' column) if `by` is None or 'interval', and are otherwise
+    partial sums of `by` periods which are to be added across frames.
+
+    If `by` aggregates intervals, calendar months falling wholly within the period are answered from the rollup store,
+    at the coarsest stored resolution within `by`, with any months not yet stored (or whose inputs have changed) computed and stored first.
+    The remaining partial months at either end are computed from unit data.
+    """
+    stime = dt.strptime(start_time, "%Y/%m/%d %H:%M")
+    etime = dt.strptime(end_time, "%Y/%m/%d %H:%M")
+    resolution = _rollup_resolution(by)
+    months = [m for m in pd.date_range(stime, etime, freq='MS') if m + MonthBegin(1) <= etime]
+    if resolution is None or not months:
+        yield from _iter_computed_sums(start_time, end_time, cache, filter_regions, by, generation_sent_out,
+                                       assume_energy_ramp, n_jobs, max_ramp_gap)
+        return
+
+    first, last = months[0], months[-1] + MonthBegin(1)
+    if stime < first:
+        yield from _iter_computed_sums(start_time, dt.strftime(first, "%Y/%m/%d %H:%M"), cache, filter_regions, by,
+                                       generation_sent_out, assume_energy_ramp, n_jobs, max_ramp_gap)
+
+    files = _rollup_months(months, cache, filter_regions, generation_sent_out, assume_energy_ramp, n_jobs,
+                           max_ramp_gap)
+    if files:
+        logger.info(f"Using {resolution} rollups of total emissions from {first:%Y-%m-%d} to {last:%Y-%m-%d}")
+        with instrument.stage('aggregation') as stage:
+            rollups = rollup_store.read_months(cache, files, resolution)
+            stage.rows_in = len(rollups)
+            en_colname = rollups.columns[rollups.columns.str.contains('Energy')][0]
+            res = _sum_periods(rollups['Region'].values, rollups['TimeBeginning'], rollups[en_colname],
+                               rollups['Total_Emissions'], _resolve_frequency(by))
+            stage.rows_out = len(res)
+        yield res
+
+    if last < etime:
+        yield from _iter_computed_sums(dt.strftime(last, "%Y/%m/%d %H:%M"), end_time, cache, filter_regions, by,
+                                       generation_sent_out, assume_energy_ramp, n_jobs, max_ramp_gap)
+
+
+def _iter_computed_sums(start_time, end_time, cache, filter_regions, by, generation_sent_out, assume_energy_ramp,
+                        n_jobs, max_ramp_gap=None):
+    """Yields the region sums of `_iter_region_sums` for each segment, computed from unit data."""
+    for raw_table in _iter_total_emissions(start_time, end_time, cache, filter_regions, generation_sent_out,
+                                           assume_energy_ramp, True, True, n_jobs, max_ramp_gap):
+        with instrument.stage('aggregation', rows_in=len(raw_table)) as stage:
+            res = _region_interval_sums(raw_table, filter_regions)
+            # Partial sums of periods for the segment
+            if by not in [None, 'interval']:
+                res = _aggregate_periods(res, by)
+            stage.rows_out = len(res)
+        yield res
+
+
+def _region_interval_sums(raw_table, filter_regions):
+    """Sums energy and emissions of a segment's units to regions for each interval, adding the NEM as a region if
+    `filter_regions` is None."""
+    # Aggregate DUID data to regions
+    en_colname = raw_table.columns[raw_table.columns.str.contains('Energy')][0]
+    res = raw_table[['Time', 'Region', en_colname, 'Total_Emissions']].groupby(['Time', 'Region'],
+                                                                              observed=True).sum().reset_index()
+
+    # Create NEM agggregation
+    if filter_regions is None:
+        nem = res.groupby(['Time'])[[en_colname, 'Total_Emissions']].sum().reset_index()
+        nem.insert(1, 'Region', pd.Categorical(['NEM'] * len(nem), dtype=res['Region'].dtype))
+        res = pd.concat([res, nem], ignore_index=True)
+    return res
+
+
+def _rollup_months(months, cache, filter_regions, generation_sent_out, assume_energy_ramp, n_jobs, max_ramp_gap=None):
+    """Returns the rollup store files of consecutive calendar months, computing those not stored (or stale) in runs of
+    consecutive months. Months found incomplete (not having data to their final interval) are returned but not
+    recorded, such that they are rebuilt on the next call.
+    """
+    files, params, missing = [], [], []
+    for month in months:
+        month_params = dict(_segment_params(dt.strftime(month, "%Y/%m/%d %H:%M"),
+                                            dt.strftime(month + MonthBegin(1), "%Y/%m/%d %H:%M"), filter_regions,
+                                            generation_sent_out, assume_energy_ramp, True, max_ramp_gap),
+                            rollup=list(ROLLUP_RESOLUTIONS))
+        files += [result_cache.lookup(cache, _segment_key(month_params, cache))]
+        params += [month_params]
+        if files[-1] is None:
+            missing += [len(files) - 1]
+
+    # Split missing months into runs of consecutive months, each computed in a single pass
+    runs = []
+    for idx in missing:
+        if runs and runs[-1][-1] == idx - 1:
+            runs[-1] += [idx]
+        else:
+            runs += [[idx]]
+    for run in runs:
+        logger.info(f"Building rollups of total emissions from {months[run[0]]:%Y-%m} to {months[run[-1]]:%Y-%m}")
+        run_sums = {}
+        for raw_table in _iter_total_emissions(params[run[0]]['start_time'], params[run[-1]]['end_time'], cache,
+                                               filter_regions, generation_sent_out, assume_energy_ramp, True, True,
+                                               n_jobs, max_ramp_gap):
+            res = _region_interval_sums(raw_table, filter_regions)
+            res_months = (res['Time'] - timedelta(minutes=DISP_INT_LENGTH)).dt.to_period('M').dt.start_time
+            for month, month_sums in res.groupby(res_months):
+                run_sums.setdefault(month, []).append(month_sums)
+
+            # Months before the latest in the frame are complete and written out, bounding memory to a month of sums
+            for month in [m for m in run_sums if m < res_months.max()]:
+                files[months.index(month)] = _write_rollup(cache, month, params[months.index(month)],
+                                                           run_sums.pop(month))
+        for month, month_sums in run_sums.items():
+            files[months.index(month)] = _write_rollup(cache, month, params[months.index(month)], month_sums)
+    return [f for f in files if f is not None]
+
+
+def _write_rollup(cache, month, params, month_sums):
+    """Rolls up the interval region sums of a month to each of `ROLLUP_RESOLUTIONS` and writes them to the rollup store,
+    returning the file name."""
+    sums = ud.concat_encoded(month_sums, ignore_index=True)
+    en_colname = sums.columns[sums.columns.str.contains('Energy')][0]
+    time_beginning = sums['Time'] - timedelta(minutes=DISP_INT_LENGTH)
+    rollups = [_sum_periods(sums['Region'].values, time_beginning, sums[en_colname], sums['Total_Emissions'],
+                            to_offset(freq)).assign(Resolution=resolution)
+               for resolution, freq in ROLLUP_RESOLUTIONS.items()]
+    rollups = ud.concat_encoded(rollups, ignore_index=True)
+
+    filename = rollup_store.month_file(month, result_cache.segment_id(params))
+    rollup_store.write_month(cache, filename, rollups)
+    if sums['Time'].max() == month + MonthBegin(1):
+        result_cache.record(cache, _segment_key(params, cache), filename, params)
+    else:
+        logger.info(f"Rollups for {month:%Y-%m} are incomplete and will be rebuilt on the next call")
+    return filename
 
-    # Load cached results files
-    results_df = []
-    for name in res_str:
-        logger.info(f"Loading results file {name}")
-        results_df += [pd.read_parquet(os.path.join(cache, name))]
-    
-    flatten = pd.concat(results_df, ignore_index=True)
-    res = flatten[flatten['Time'].between(start_time, end_time, inclusive="right")]
 
-    logger.info('Completed get_total_emissions_by_DI_DUID')
+def _rollup_resolution(by):
+    """Coarsest resolution of `ROLLUP_RESOLUTIONS` whose periods each fall within a single `by` period, or None if
+    `by` cannot be answered from the rollup store. Unaggregated intervals (`by` None or 'interval') are not answered
+    from the store, being no smaller than the sums computed from unit data."""
+    if by in [None, 'interval']:
+        return None
+    freq = _resolve_frequency(by)
+    for resolution in ['month', 'day', 'hour', 'interval']:
+        if _nests_within(to_offset(ROLLUP_RESOLUTIONS[resolution]), freq):
+            return resolution
+    return None
 
-    if return_all:
-        return res
-    else:
-        if generation_sent_out:
-            return res[['DUID', 'Time', 'Region', 'Plant_Emissions_Intensity', 'Energy', 'PCT_AUXILIARY_LOAD', \
-                        'Energy_SO', 'Total_Emissions']]
-        else:
-            return res[['DUID', 'Time', 'Region', 'Plant_Emissions_Intensity', 'Energy', 'Total_Emissions']]
+
+def _nests_within(inner, outer):
+    """Whether each period of frequency `inner` falls within a single period of frequency `outer`."""
+    if isinstance(outer, Tick):
+        return isinstance(inner, Tick) and outer.nanos % inner.nanos == 0
+    if isinstance(inner, Tick):
+        # Periods of non-fixed frequencies (weeks, months, years) begin at midnight
+        return to_offset('D').nanos % inner.nanos == 0
+    return isinstance(outer, (MonthBegin, MonthEnd, QuarterBegin, QuarterEnd, YearBegin, YearEnd))
 
 
 def _generate_timeseries_loop(actual_start, actual_end):
@@ -114,57 +358,138 @@ def _generate_timeseries_loop(actual_start, actual_end):
     return time_segments
 
 
+def _total_emissions_chunk(start_time, end_time, start_str, end_str, cache, filter_regions, generation_sent_out,
+                           assume_energy_ramp, dropna_co2factors, max_ramp_gap, name_suffix):
+    """Runs `_total_emissions_process` for a single segment and writes the result to cache, returning the file name."""
+    logger.info(f"Processing total emissions from {start_str} to {end_str}")
+    df = _total_emissions_process(start_time, end_time, cache, filter_regions, generation_sent_out, assume_energy_ramp,
+                                  dropna_co2factors, max_ramp_gap)
+    name = 'processed_co2_total_{}_{}_{}.parquet'.format(start_str, end_str, name_suffix)
+    df.to_parquet(os.path.join(cache, name))
+    return name
+
+
+def _segment_params(start_time, end_time, filter_regions, generation_sent_out, assume_energy_ramp,
+                    dropna_co2factors, max_ramp_gap=None):
+    """Parameters which determine the processed result of a segment."""
+    return {'start_time': start_time, 'end_time': end_time,
+            'filter_regions': sorted(filter_regions) if filter_regions else None,
+            'generation_sent_out': generation_sent_out, 'assume_energy_ramp': assume_energy_ramp,
+            'dropna_co2factors': dropna_co2factors, 'max_ramp_gap': max_ramp_gap if assume_energy_ramp else None}
+
+
+def _segment_key(params, cache):
+    """Cache key of a segment from its parameters, the current state of its input files and the reference data in
+    effect up to the end of its last month. Reference rows effective later do not change the key, so segments are not
+    invalidated by newer snapshots of DUALLOC and DUDETAILSUMMARY unless their history up to the segment changes.
+    """
+    input_files = result_cache.segment_input_files(params['start_time'], params['end_time'], cache)
+    # Emissions factors of the last month take the genset allocation as of the month end
+    end = dt.strptime(params['end_time'], "%Y/%m/%d %H:%M")
+    cutoff = dt(end.year, end.month, 1) + (MonthBegin(1) if end > dt(end.year, end.month, 1) else timedelta(0))
+    references = {}
+    for name, table, effective in [('DUDETAILSUMMARY', download_dudetailsummary(cache, history=True), 'START_DATE'),
+                                   ('DUALLOC', download_genset_map(cache, history=True), 'EFFECTIVEDATE')]:
+        references[name] = result_cache.table_digest(table[table[effective] <= cutoff])
+    return result_cache.segment_key(params, input_files + [str(PLANT_AUXLOAD_FILEPATH)], references)
+
+
+def _prefetch_chunk_inputs(start_time, end_time, cache, n_jobs):
+    """Downloads raw data shared by neighbouring segments before they are processed concurrently, such that no two
+    workers download or convert the same cache file.
+    """
+    logger.info("Prefetching data for concurrent processing")
+    download_dudetailsummary(cache, history=True)
+    download_genset_map(cache, history=True)
+
+    # Each segment also reads the first interval of the following month
+    stime = dt.strptime(start_time, "%Y/%m/%d %H:%M")
+    etime = dt.strptime(end_time, "%Y/%m/%d %H:%M") + timedelta(minutes=DISP_INT_LENGTH)
+    months = pd.date_range(dt(stime.year, stime.month, 1), etime, freq='MS')
+    Parallel(n_jobs=n_jobs, prefer="threads")(delayed(_prefetch_month)(month, cache) for month in months)
+
+
+def _prefetch_month(month_start, cache):
+    """Caches the DISPATCH_UNIT_SCADA and GENUNITS files for a single month, if not already cached."""
+    interval = dt.strftime(month_start + timedelta(minutes=DISP_INT_LENGTH), "%Y/%m/%d %H:%M")
+    try:
+        dispatch_store.ensure_month(cache, month_start)
+        if not os.path.exists(mms_cache_filename("GENUNITS", month_start.year, month_start.month, cache)):
+            download_plant_emissions_factors(interval, interval, cache)
+    except Exception as e:
+        logger.warning(f"Prefetch for {month_start:%Y-%m} failed ({e}). Data will be retrieved during processing.")
+
+
 def _total_emissions_process(start_time, end_time, cache, filter_regions=None,
-                             generation_sent_out=True, assume_energy_ramp=True, dropna_co2factors=True):
+                             generation_sent_out=True, assume_energy_ramp=True, dropna_co2factors=True,
+                             max_ramp_gap=None):
     """Process for calculating total emissions based on the parameters defined in `get_total_emissions_by_DI_DUID`.
     """
     # Download Unit Dispatch Data and Generation Information
-    disp_df = download_unit_dispatch(start_time, end_time, cache, source_initialmw=False, source_scada=True,
-                                     return_all=False, check=False, overwrite="scada", rm_negative=True)
-
-    geninfo_df = download_dudetailsummary(cache)
-
-    # Merge geninfo and filter out loads
-    disp_df.set_index('DUID', inplace=True)
-    geninfo_df.set_index('DUID', inplace=True)
-    filt_df = disp_df.join(geninfo_df[['REGIONID', 'DISPATCHTYPE']], how="left")
-    filt_df.reset_index(inplace=True)
-    
-    filt_df = filt_df[filt_df['DISPATCHTYPE'] == 'GENERATOR']
+    with instrument.stage('download') as stage:
+        geninfo_df = download_dudetailsummary(cache, history=True)
+        # Only dispatch of units registered as generators in the regions (at any time) is read from the dispatch store
+        generators = geninfo_df[geninfo_df['DISPATCHTYPE'] == 'GENERATOR']
+        if filter_regions:
+            generators = generators[generators['REGIONID'].isin(filter_regions)]
+        disp_df = download_unit_dispatch(start_time, end_time, cache, source_initialmw=False, source_scada=True,
+                                         return_all=False, check=False, overwrite="scada", rm_negative=True,
+                                         duids=generators['DUID'].unique().tolist())
+        stage.rows_out = len(disp_df)
+    co2factors_df = _get_duid_emissions_intensities(start_time, end_time, cache)
 
-    # Filter by region if specified
-    if filter_regions:
-        if not pd.Series(filt_df["REGIONID"].unique()).isin(filter_regions).any():
-            raise ValueError("filter_region paramaters passed were not found in NEM regions")
-        filt_df = filt_df[filt_df["REGIONID"].isin(filter_regions)]
+    # Encode units and regions on shared categories, so joins and groupings below operate on integer codes
+    dtypes = {'DUID': ud.unit_dtype(disp_df['DUID'], geninfo_df['DUID'], co2factors_df['DUID']),
+              'REGIONID': ud.region_dtype(geninfo_df['REGIONID'])}
+    disp_df = ud.encode(disp_df, dtypes)
+    geninfo_df = ud.encode(geninfo_df, dtypes)
+    co2factors_df = ud.encode(co2factors_df, dtypes)
+
+    # Assign region and dispatch type in effect at each interval, and filter out loads
+    with instrument.stage('region_filter', rows_in=len(disp_df)) as stage:
+        geninfo = EffectiveDatedIndex(geninfo_df, 'DUID', 'START_DATE', ['REGIONID', 'DISPATCHTYPE'], backfill=True)
+        positions = geninfo.locate(disp_df['DUID'], disp_df['Time'])
+        filt_df = disp_df[['DUID'] + disp_df.columns.drop('DUID').tolist()].assign(
+            REGIONID=geninfo.take('REGIONID', positions), DISPATCHTYPE=geninfo.take('DISPATCHTYPE', positions))
+
+        filt_df = filt_df[filt_df['DISPATCHTYPE'] == 'GENERATOR']
+
+        # Filter by region if specified
+        if filter_regions:
+            if not pd.Series(filt_df["REGIONID"].unique()).isin(filter_regions).any():
+                raise ValueError("filter_region paramaters passed were not found in NEM regions")
+            filt_df = filt_df[filt_df["REGIONID"].isin(filter_regions)]
+        stage.rows_out = len(filt_df)
 
     # Merge Energy data with Plant Emissions Factors
-    filt_df['year'], filt_df['month'] = filt_df['Time'].dt.year, filt_df['Time'].dt.month
-    co2factors_df = _get_duid_emissions_intensities(start_time, end_time, cache)
-    plt_df = pd.merge(left=filt_df,
-                      right=co2factors_df[["file_year", "file_month", "DUID", "CO2E_EMISSIONS_FACTOR"]],
-                      left_on=["year", "month", "DUID"],
-                      right_on=["file_year", "file_month", "DUID"],
-                      how="left")
+    with instrument.stage('factor_merge', rows_in=len(filt_df)) as stage:
+        factors = MonthlyFactorArray(co2factors_df, ['CO2E_EMISSIONS_FACTOR'])
+        plt_df = filt_df.reset_index(drop=True)
+        plt_df['CO2E_EMISSIONS_FACTOR'] = factors.lookup('CO2E_EMISSIONS_FACTOR', plt_df['DUID'], plt_df['Time'])
 
-    # Filter out Data with Null CO2_EMISSIONS_FACTORS
-    if dropna_co2factors:
-        plt_df = plt_df[~plt_df['CO2E_EMISSIONS_FACTOR'].isna()]
+        # Filter out Data with Null CO2_EMISSIONS_FACTORS
+        if dropna_co2factors:
+            plt_df = plt_df[~plt_df['CO2E_EMISSIONS_FACTOR'].isna()]
+        stage.rows_out = len(plt_df)
 
     # Calculate Energy (MWh)
-    if not assume_energy_ramp:
-        plt_df["Energy"] = plt_df["Dispatch"] * (DISP_INT_LENGTH / 60)
-        result = plt_df
-    else:
-        result = _calculate_energy_ramp(plt_df)
-        
+    with instrument.stage('ramp', rows_in=len(plt_df)) as stage:
+        if not assume_energy_ramp:
+            plt_df["Energy"] = plt_df["Dispatch"] * (DISP_INT_LENGTH / 60)
+            result = plt_df
+        else:
+            result = _calculate_energy_ramp(plt_df, max_gap=max_ramp_gap)
+        stage.rows_out = len(result)
+
     # Calculate Sent-Out Energy (MWh)
-    if generation_sent_out:
-        result = _calculate_sent_out(result)
-        # Compute emissions
-        result["Total_Emissions"] = result["Energy_SO"] * result["CO2E_EMISSIONS_FACTOR"]
-    else:
-        result["Total_Emissions"] = result["Energy"] * result["CO2E_EMISSIONS_FACTOR"]
+    with instrument.stage('sent_out', rows_in=len(result)) as stage:
+        if generation_sent_out:
+            result = _calculate_sent_out(result)
+            # Compute emissions
+            result["Total_Emissions"] = result["Energy_SO"] * result["CO2E_EMISSIONS_FACTOR"]
+        else:
+            result["Total_Emissions"] = result["Energy"] * result["CO2E_EMISSIONS_FACTOR"]
+        stage.rows_out = len(result)
 
     result.rename(columns={"CO2E_EMISSIONS_FACTOR": "Plant_Emissions_Intensity",
                            "REGIONID": "Region"}, inplace=True)
@@ -173,11 +498,11 @@ def _total_emissions_process(start_time, end_time, cache, filter_regions=None,
 
 def _get_duid_emissions_intensities(start_time, end_time, cache):
     """Merges emissions factors from GENSETID to DUID and cleans data"""
-    co2factors_df = download_plant_emissions_factors(start_time, end_time, cache)
-    genset_map = download_genset_map(cache)
-    co2factors_df = co2factors_df.merge(right=genset_map[["GENSETID", "DUID"]],
-                                        on=["GENSETID"],
-                                        how="left")
+    with instrument.stage('download') as stage:
+        co2factors_df = download_plant_emissions_factors(start_time, end_time, cache)
+        genset_map = download_genset_map(cache, history=True)
+        stage.rows_out = len(co2factors_df)
+    co2factors_df = co2factors_df.assign(DUID=_genset_duids(co2factors_df, genset_map))
 
     # Filter out older assumptions, where duplicate CO2 factors exist for data entry
     co2factors_df['CO2E_DATA_YEAR'] = co2factors_df['CO2E_DATA_SOURCE'].map(CO2E_DATA_SOURCE_YEARMAP)
@@ -195,63 +520,185 @@ def _get_duid_emissions_intensities(start_time, end_time, cache):
                           'CO2E_ENERGY_SOURCE', 'CO2E_DATA_SOURCE']]
 
 
+def _genset_duids(co2factors_df, genset_map):
+    """DUID to which the GENSETID of each monthly emissions factor is allocated as of the end of its month (or the
+    earliest allocation of the GENSETID, where later), from the effective-dated allocations of the DUALLOC snapshot
+    returned by `download_genset_map`."""
+    gensets = ud.unit_dtype(co2factors_df['GENSETID'], genset_map['GENSETID'])
+    allocations = EffectiveDatedIndex(genset_map.assign(GENSETID=genset_map['GENSETID'].astype(gensets),
+                                                        DUID=genset_map['DUID'].astype('category')),
+                                      'GENSETID', 'EFFECTIVEDATE', ['DUID'], backfill=True)
+    months = ((co2factors_df['file_year'].astype(int).values - 1970) * 12 +
+              co2factors_df['file_month'].astype(int).values)
+    month_ends = months.astype('datetime64[M]').astype('datetime64[ns]')
+    duids = allocations.lookup('DUID', co2factors_df['GENSETID'].astype(gensets), month_ends)
+    return np.asarray(duids.astype(object), dtype=object)
+
+
 def _condense_genset_co2_differences(all_df):
-    """Patch duplicate or differing co2 factors for the same year-month-DUID."""
-    for duid in all_df[all_df.duplicated(['file_year','file_month','DUID'])]['DUID'].unique():
-        correction = all_df[all_df['DUID']==duid].dropna(subset=['CO2E_EMISSIONS_FACTOR', 'CO2E_ENERGY_SOURCE', \
-                                                                 'CO2E_DATA_SOURCE'])
-
-        # If year-month-gensetid is duplicated in correction df, average vals and drop correction
-        if correction.duplicated(subset=['file_year','file_month','DUID']).any():
-            result = []
-            for yr in correction['file_year'].unique():
-                for mn in correction[correction['file_year'] == yr]['file_month'].unique():
-                    subset = correction[(correction['file_year'] == yr) & (correction['file_month'] == mn)]
-                    descriptor = [' / '.join(subset['CO2E_ENERGY_SOURCE'].to_list()) \
-                        if len(subset['CO2E_DATA_SOURCE'].unique())==1 else subset['CO2E_ENERGY_SOURCE'].iloc[0]][0]
-                    emissions = subset['CO2E_EMISSIONS_FACTOR'].mean()
-                    subset = subset.drop_duplicates(['file_year','file_month','DUID'], keep='first')
-                    subset['CO2E_ENERGY_SOURCE'] = descriptor
-                    subset['CO2E_EMISSIONS_FACTOR'] = emissions
-                    result += [subset]
-            result = pd.concat(result,ignore_index=True)
-        else:
-            result = correction
-        
-        # Remove duid entry in main df
-        all_df = all_df[~all_df['DUID'].isin([duid])]
+    """Patch duplicate or differing co2 factors for the same year-month-DUID.
 
-        # Add resultant duid entry to main df
-        all_df = pd.concat([all_df, result], ignore_index=True)
+    All DUIDs with more than one entry for a year-month are resolved together. Entries for these DUIDs missing a
+    factor, energy source or data source are dropped. Where a year-month-DUID remains duplicated the factors are
+    averaged, with energy sources joined by ' / ' when they share a single data source (otherwise the first energy
+    source is kept). Corrected DUIDs are appended after the untouched entries, in order of their first duplicate.
+    """
+    key = ['file_year', 'file_month', 'DUID']
+    all_df = all_df.reset_index(drop=True)
+    dup_duids = all_df.loc[all_df.duplicated(key), 'DUID'].unique()
+    is_dup = all_df['DUID'].isin(dup_duids)
+    untouched = all_df[~is_dup]
+
+    correction = all_df[is_dup].dropna(subset=['DUID', 'CO2E_EMISSIONS_FACTOR', 'CO2E_ENERGY_SOURCE',
+                                               'CO2E_DATA_SOURCE'])
+    position = pd.Series(np.arange(len(correction)), index=correction.index)
+
+    # DUIDs still duplicated after dropping incomplete entries have their year-month groups averaged
+    avg_duids = correction.loc[correction.duplicated(key), 'DUID'].unique()
+    to_avg = correction['DUID'].isin(avg_duids)
+
+    avg_df = correction[to_avg]
+    stats = avg_df.groupby(key, sort=False).agg(n_sources=('CO2E_DATA_SOURCE', 'nunique'),
+                                                joined=('CO2E_ENERGY_SOURCE', ' / '.join),
+                                                first=('CO2E_ENERGY_SOURCE', 'first'),
+                                                factor=('CO2E_EMISSIONS_FACTOR', 'mean'))
+
+    # First entry of each group is retained, groups being in order of first appearance as in `stats`
+    averaged = avg_df.drop_duplicates(key, keep='first').copy()
+    averaged['CO2E_ENERGY_SOURCE'] = np.where(stats['n_sources'] == 1, stats['joined'], stats['first'])
+    averaged['CO2E_EMISSIONS_FACTOR'] = stats['factor'].values
+
+    # Order groups by first appearance of year, then month within year, matching the sequence of patched entries
+    year_order = position[to_avg].groupby([avg_df['DUID'], avg_df['file_year']]).transform('min')
+    averaged['_year_order'] = year_order[averaged.index]
+    averaged['_month_order'] = position[averaged.index]
+
+    # Remaining DUIDs keep their (complete) entries as is
+    kept = correction[~to_avg].assign(_year_order=position[~to_avg], _month_order=position[~to_avg])
+
+    result = pd.concat([averaged, kept])
+    result['_duid_order'] = pd.Categorical(result['DUID'], categories=dup_duids[pd.notna(dup_duids)]).codes
+    result = result.sort_values(['_duid_order', '_year_order', '_month_order'], kind='mergesort')
+    result = result.drop(columns=['_duid_order', '_year_order', '_month_order'])
+
+    all_df = pd.concat([untouched, result], ignore_index=True)
     return all_df.drop(['GENSETID'], axis=1).reset_index(drop=True)
 
 
-def _calculate_energy_ramp(dispatch_df):
+def _calculate_energy_ramp(dispatch_df, max_gap=None):
     """Returns dataframe with energy calculated as ramp between dispatch scada points.
+
+    Rows are ordered by DUID (in order of first appearance) then Time. The ramp for each row starts from the previous
+    record of the same DUID; the first record of each DUID has no prior dispatch and returns NaN energy.
+
+    Parameters
+    ----------
+    dispatch_df : pandas.DataFrame
+        Dispatch data containing columns ['DUID', 'Time', 'Dispatch'].
+    max_gap : int, optional
+        Maximum number of dispatch intervals between consecutive records of a DUID for them to be ramped. Records which
+        follow a larger gap in the interval sequence are computed as a step (no ramp), by default None which ramps from
+        the previous record irrespective of any gap.
     """
     logger.info('Compiling Energy from Dispatch')
-    aggregate = []
-    for duid in dispatch_df['DUID'].unique():
-        sub_df = dispatch_df[dispatch_df['DUID'] == duid]
-        sub_df = sub_df.sort_values('Time')
-        sub_df.reset_index(drop=True, inplace=True)
-        sub_df['Dispatch_prev'] = np.nan
-        sub_df.loc[1:, 'Dispatch_prev'] = sub_df['Dispatch'][:len(sub_df)-1].to_list()
-        sub_df.loc[:, 'Energy'] = (0.5*(sub_df['Dispatch'] - sub_df['Dispatch_prev']) + sub_df['Dispatch_prev']) \
-            * (DISP_INT_LENGTH / 60)
-        aggregate += [sub_df]
-    aggregate = pd.concat(aggregate, ignore_index=True)
-    return aggregate.reset_index(drop=True)
+    # Order of first appearance of each DUID, used to sort by (DUID, Time) in a single pass
+    duid_order = dispatch_df.groupby('DUID', sort=False, observed=True).ngroup()
+    result = dispatch_df.assign(_duid_order=duid_order.values)
+    result = result[result['_duid_order'] >= 0]
+    result = result.sort_values(['_duid_order', 'Time'], kind='mergesort').reset_index(drop=True)
+
+    grouped = result.groupby('_duid_order', sort=False)
+    result['Dispatch_prev'] = grouped['Dispatch'].shift(1)
+
+    # Handle gaps in the interval sequence explicitly
+    if max_gap is not None:
+        gap = grouped['Time'].diff() > timedelta(minutes=DISP_INT_LENGTH * max_gap)
+        result.loc[gap, 'Dispatch_prev'] = result.loc[gap, 'Dispatch']
+
+    result['Energy'] = _ramp_energy(result['Dispatch'], result['Dispatch_prev'])
+    return result.drop(columns=['_duid_order'])
+
+
+def _ramp_energy(dispatch, dispatch_prev):
+    """Energy (MWh) of a dispatch interval assuming a linear ramp from `dispatch_prev` to `dispatch` (MW)."""
+    return (0.5*(dispatch - dispatch_prev) + dispatch_prev) * (DISP_INT_LENGTH / 60)
+
+
+def _stitch_energy_ramp(result, last_dispatch, generation_sent_out, max_gap=None):
+    """Continues the energy ramp into a processed segment from the last dispatch record of each DUID in the preceding
+    segment(s). Otherwise the first record of each DUID in a segment has no prior dispatch and returns NaN energy.
+
+    Parameters
+    ----------
+    result : pandas.DataFrame
+        Processed segment as returned by `_total_emissions_process`, with `assume_energy_ramp` = True.
+    last_dispatch : pandas.DataFrame or None
+        Time and Dispatch of the last record of each DUID (as index) prior to this segment, from
+        `_last_dispatch_by_duid`.
+    generation_sent_out : bool
+        Whether sent-out energy is used for Total_Emissions.
+    max_gap : int, optional
+        Maximum number of dispatch intervals from the last record for the first record of a DUID to be ramped, as for
+        `_calculate_energy_ramp`. Records after a larger gap are computed as a step, by default None which ramps
+        irrespective of any gap.
+    """
+    if last_dispatch is None or result.empty:
+        return result
+    first = result['Time'] == result.groupby('DUID', observed=True)['Time'].transform('min')
+    last = last_dispatch.reindex(result.loc[first, 'DUID'].astype(object).values).set_index(result.index[first])
+    last = last[last['Dispatch'].notna()]
+    if last.empty:
+        return result
+
+    prev = last['Dispatch']
+    if max_gap is not None:
+        gap = result.loc[last.index, 'Time'] - last['Time'] > timedelta(minutes=DISP_INT_LENGTH * max_gap)
+        prev = prev.where(~gap, result.loc[last.index, 'Dispatch'])
+
+    result = result.copy()
+    result.loc[prev.index, 'Dispatch_prev'] = prev
+    result.loc[prev.index, 'Energy'] = _ramp_energy(result.loc[prev.index, 'Dispatch'], prev)
+    if generation_sent_out:
+        result.loc[prev.index, 'Energy_SO'] = result.loc[prev.index, 'Energy'] * result.loc[prev.index, 'pct_sent_out']
+        result.loc[prev.index, 'Total_Emissions'] = result.loc[prev.index, 'Energy_SO'] * \
+            result.loc[prev.index, 'Plant_Emissions_Intensity']
+    else:
+        result.loc[prev.index, 'Total_Emissions'] = result.loc[prev.index, 'Energy'] * \
+            result.loc[prev.index, 'Plant_Emissions_Intensity']
+    return result
+
+
+def _last_dispatch_by_duid(result, last_dispatch=None, max_gap=None):
+    """Updates `last_dispatch` with the Time and Dispatch of the last record of each DUID in a processed segment.
+
+    Records more than `max_gap` dispatch intervals before the end of the segment are dropped, as the following segment
+    would not ramp from them (see `_stitch_energy_ramp`), by default None to keep all records.
+    """
+    latest = result.sort_values('Time', kind='mergesort').drop_duplicates('DUID', keep='last')
+    latest = latest.set_index(latest['DUID'].astype(object))[['Time', 'Dispatch']]
+    if last_dispatch is not None:
+        latest = pd.concat([last_dispatch[~last_dispatch.index.isin(latest.index)], latest])
+    if max_gap is not None and not result.empty:
+        latest = latest[latest['Time'] >= result['Time'].max() - timedelta(minutes=DISP_INT_LENGTH * max_gap)]
+    return latest
 
 
 def _calculate_sent_out(energy_df):
     """Returns dataframe with sent-out generation calculated by considering auxload factor for corresponding DUID.
+
+    Each row takes the auxiliary load assumption of its DUID in effect at its Time (the latest EFFECTIVEFROM at or
+    before it, or the earliest for times before all of them), so rows are never duplicated. Assumptions listed for a
+    DUID more than once from the same date (e.g. for several stations) are averaged.
     """
     logger.info('Compiling Sent Out Generation')
-    auxload = read_plant_auxload_csv()
-
-    # Merge data and compute auxilary load factor
-    so_df = energy_df.merge(auxload, on=["DUID"], how="left")
+    auxload = ud.encode(read_plant_auxload_csv(), {'DUID': energy_df['DUID'].dtype})
+    auxload = auxload.groupby(['DUID', 'EFFECTIVEFROM'], observed=True, as_index=False)['PCT_AUXILIARY_LOAD'].mean()
+    index = EffectiveDatedIndex(auxload, 'DUID', 'EFFECTIVEFROM', ['PCT_AUXILIARY_LOAD'], backfill=True)
+
+    # Join the assumptions in effect and compute auxilary load factor
+    positions = index.locate(energy_df['DUID'], energy_df['Time'])
+    so_df = energy_df.assign(EFFECTIVEFROM=index.take('EFFECTIVEFROM', positions),
+                             PCT_AUXILIARY_LOAD=index.take('PCT_AUXILIARY_LOAD', positions))
     so_df['pct_sent_out'] = (100 - so_df["PCT_AUXILIARY_LOAD"]) / 100
     """add error checking measure for % of no matches in auxload"""
     so_df['pct_sent_out'].fillna(1.0, inplace=True)
@@ -296,25 +743,28 @@ def get_marginal_emitter(start_time, end_time, cache):
     ## gen_info = download_generators_info(cache)
     logger.warning('Warning: Gen_info table only has most recent NEM registration and exemption list. Does not account for retired generators')
     co2_factors = _get_duid_emissions_intensities(start_time, end_time, cache)
-    price_setters = download_pricesetter_files(start_time, end_time, cache)
+    price_setters = _pricesetter_table(start_time, end_time, cache)
 
     # Drop Basslink
     filt_df = price_setters[~price_setters['Unit'].str.contains('T-V-MNSP1')]
     filt_df = filt_df.rename(columns={'Unit': 'DUID', 'PeriodID': 'Time', 'RegionID': 'Region'})
-    filt_df['file_year'], filt_df['file_month'] = filt_df['Time'].dt.year, filt_df['Time'].dt.month
 
-    # Merge CO2 Factors
-    filt_df = pd.merge(filt_df[["Time", "Region", "DUID", "Increase", "file_year", "file_month"]],
-        co2_factors[["DUID", "file_year", "file_month", "CO2E_EMISSIONS_FACTOR", "CO2E_ENERGY_SOURCE"]],
-        how="left", on=["DUID", "file_year", "file_month"], sort=False)
+    # Encode units on shared categories for the merge
+    duid_dtype = ud.unit_dtype(filt_df['DUID'], co2_factors['DUID'])
+    filt_df = ud.encode(filt_df, {'DUID': duid_dtype})
+    co2_factors = ud.encode(co2_factors, {'DUID': duid_dtype})
 
-    filt_df.drop(['file_year', 'file_month'], axis=1, inplace=True)
+    # Assign CO2 Factors of each unit and month
+    factors = MonthlyFactorArray(co2_factors, ["CO2E_EMISSIONS_FACTOR", "CO2E_ENERGY_SOURCE"])
+    filt_df = filt_df[["Time", "Region", "DUID", "Increase"]].reset_index(drop=True)
+    for col in ["CO2E_EMISSIONS_FACTOR", "CO2E_ENERGY_SOURCE"]:
+        filt_df[col] = factors.lookup(col, filt_df['DUID'], filt_df['Time'])
 
     # Weigh CO2 intensity by 'Increase' contributions
     filt_df['weighted_co2_factor'] = filt_df['Increase'] * filt_df['CO2E_EMISSIONS_FACTOR']
 
     # Aggregate sum of weighted CO2 intensities
-    values = filt_df.groupby(by=['Time','Region'], axis=0).sum()
+    values = filt_df.groupby(by=['Time','Region'], axis=0, observed=True)[['weighted_co2_factor']].sum()
     values = values.reset_index()[['Time','Region','weighted_co2_factor']]
     values.rename(columns={'weighted_co2_factor': 'Intensity_Index'}, inplace=True)
 
@@ -322,7 +772,7 @@ def get_marginal_emitter(start_time, end_time, cache):
     source = filt_df.sort_values(['Increase']).drop_duplicates(['Time','Region'], keep="last")[['Time', 'Region', 'DUID', 'CO2E_ENERGY_SOURCE']]
     result = values.merge(source, on=['Time','Region'], how='left')
 
-    return result
+    return ud.decode(result)
 
 
 def tech_rename(fuel, tech_descriptor, dispatch_type):
@@ -381,7 +831,8 @@ def aggregate_data_by(data, by):
     data : pandas.DataFrame
         Dataframe input must correspond to the output from `get_total_emissions` with the `by` arugment set to None.
     by : str
-        One of ['interval', 'hour', 'day', 'month', 'year']
+        One of ['interval', 'trading_interval', 'hour', 'day', 'week', 'month', 'year', 'financial_year'], or any
+        pandas frequency string (e.g. '30T', 'W-SUN', 'Q', 'A-JUN'). Periods are labelled by their beginning.
 
     Returns
     -------
@@ -403,112 +854,78 @@ def aggregate_data_by(data, by):
     Exception
         Invalid dataframe input.
     """
-    aggregate = []
-    for region in data['Region'].unique():
-        sub_df = data[data['Region']==region]
-        if ('TimeEnding' in sub_df.columns):
-            sub_df = sub_df.rename(columns={'TimeEnding': 'Time'})
-        
-        if ('TimeBeginning' in sub_df.columns):
-            raise Exception("already aggregated data cannot be passed to `aggregate_data_by` function. " +\
-                "The `get_total_emissions` `by` input must be set to None to use this function post-operand")       
-
-        sub_df = _time_aggregations(data=sub_df, by=by)
-        sub_df.insert(2, 'Region', region)
-        aggregate += [sub_df]
-    aggregate = pd.concat(aggregate, ignore_index=True)
-    return aggregate
-
-
-def _time_aggregations(data, by):
-    """Aggregations of total emissions dataset from 5-minute DI resolution to hour, day, month, or year
-    """
-    result = data.copy()
+    if 'TimeBeginning' in data.columns:
+        raise Exception("already aggregated data cannot be passed to `aggregate_data_by` function. " +\
+            "The `get_total_emissions` `by` input must be set to None to use this function post-operand")
+    return _aggregate_periods(data, by).round(3)
+
+
+def _aggregate_periods(data, by):
+    """Aggregation of `aggregate_data_by` without rounding, such that partial sums of a period may be added."""
+    result = data.rename(columns={'TimeEnding': 'Time'})
     en_colname = result.columns[result.columns.str.contains('Energy')][0]
-    agg_map = {en_colname: np.sum, "Total_Emissions": np.sum}
-    if 'Intensity_Index' in result.columns:
-        reproduce_II = True
-        result.drop(['Intensity_Index'], axis=1, inplace=True)
-    else:
-        reproduce_II = False
+    reproduce_II = 'Intensity_Index' in result.columns
+
+    # Regions are returned in order of appearance, each sorted by time
+    region = result['Region'].astype('category').cat.remove_unused_categories()
+    region = region.cat.reorder_categories(region.cat.categories[pd.unique(region.cat.codes[region.cat.codes >= 0])])
+    region = region.values
 
     # Shift data to time-beginning for aggregations
-    result['Time'] = result['Time'] - timedelta(minutes=5)
-    result.set_index(['Time'], inplace=True)
+    time_beginning = result['Time'] - timedelta(minutes=DISP_INT_LENGTH)
 
-    # Aggregations
     if by == "interval":
         # Format result to show on interval resolution
-        result.drop(["Region"],axis=1,inplace=True)
-        result.insert(0, "TimeBeginning", result.index)
-        result.insert(1, "TimeEnding", result.index + timedelta(minutes=5))
-        result.reset_index(drop=True, inplace=True)
-        
-    elif by == "hour":
-        # Hourly time resolution
-        result = result.groupby(by=[result.index.year,
-                                    result.index.month,
-                                    result.index.day,
-                                    result.index.hour]).agg(agg_map)
-
-        result.index.names = ['Y','m','d','H']
-        result.reset_index(inplace=True)
-        result.insert(0,"TimeBeginning", pd.to_datetime(dict(year=result.Y,
-                                                             month=result.m,
-                                                             day=result.d,
-                                                             hour=result.H)))
-        result.drop(['Y','m','d','H'], axis=1, inplace=True)
-        result.insert(1,"TimeEnding", result['TimeBeginning'] + timedelta(hours=1))
-
-    elif by == "day":
-        # Daily time resolution
-        result = result.groupby(by=[result.index.year,
-                                    result.index.month,
-                                    result.index.day]).agg(agg_map)
-
-        result.index.names = ['Y','m','d']
-        result.reset_index(inplace=True)
-        result.insert(0,"TimeBeginning", pd.to_datetime(dict(year=result.Y,
-                                                             month=result.m,
-                                                             day=result.d)))
-        result.drop(['Y','m','d'], axis=1, inplace=True)
-        result.insert(1, "TimeEnding", result['TimeBeginning'] + timedelta(days=1))
-
-    elif by == "month":
-        # Monthly time resolution
-        result = result.groupby(by=[result.index.year,
-                                    result.index.month]).agg(agg_map)
-        result.index.names = ['Y','m']
-        result.reset_index(inplace=True)
-        result.insert(0,"TimeBeginning", pd.to_datetime(dict(year=result.Y,
-                                                             month=result.m,
-                                                             day=1)))
-        result.insert(1,"TimeEnding", pd.to_datetime(dict(year=result.Y,
-                                                          month=result.m + 1,
-                                                          day=result['TimeBeginning'].dt.day)))
-        result.drop(['Y','m'], axis=1, inplace=True)
-
-    elif by == "year":
-        # Annual time resolution
-        result = result.groupby(by=[result.index.year]).agg(agg_map)
-        result.index.names = ['Y']
-        result.reset_index(inplace=True)
-        result.insert(0,"TimeBeginning", pd.to_datetime(dict(year=result.Y,
-                                                             month=1,
-                                                             day=1)))
-        result.insert(1,"TimeEnding", pd.to_datetime(dict(year=result.Y + 1,
-                                                          month=1,
-                                                          day=1)))
-        result.drop(['Y'], axis=1, inplace=True)
-
+        values = result.drop(columns=['Time', 'Region', 'Intensity_Index'], errors='ignore')
+        result = pd.concat([pd.DataFrame({'TimeBeginning': time_beginning, 'TimeEnding': result['Time'],
+                                          'Region': region}), values], axis=1)
+        result = result.sort_values(['Region', 'TimeBeginning'], kind='mergesort')
     else:
-        raise Exception(
-            "Error: invalid by argument. Must be one of [interval, hour, day, month, year]"
-        )
+        result = _sum_periods(region, time_beginning, result[en_colname], result['Total_Emissions'],
+                              _resolve_frequency(by))
+
+    result['Region'] = result['Region'].astype(object)
+    result = result.reset_index(drop=True)
 
     # Update Intensity Index is found in data input
     if reproduce_II:
         result['Intensity_Index'] = result['Total_Emissions'] / result[en_colname]
         result['Intensity_Index'] = result['Intensity_Index'].fillna(0.0)
 
-    return result.round(3)
\ No newline at end of file
+    return result
+
+
+def _sum_periods(region, time_beginning, energy, emissions, freq):
+    """Sums energy and emissions of each region over the `freq` periods containing each of `time_beginning`."""
+    begin, end = _period_bounds(time_beginning, freq)
+    result = pd.DataFrame({'Region': region, 'TimeBeginning': begin, 'TimeEnding': end, energy.name: energy.values,
+                           'Total_Emissions': emissions.values})
+    result = result.groupby(['Region', 'TimeBeginning', 'TimeEnding'], observed=True).sum().reset_index()
+    return result[['TimeBeginning', 'TimeEnding', 'Region', energy.name, 'Total_Emissions']]
+
+
+def _resolve_frequency(by):
+    """Maps the `by` argument of `aggregate_data_by` to a pandas frequency."""
+    freq = TIME_RESOLUTIONS.get(by, by)
+    try:
+        return to_offset(freq)
+    except (TypeError, ValueError):
+        raise Exception(
+            "Error: invalid by argument. Must be one of {} or a pandas frequency string".format(list(TIME_RESOLUTIONS))
+        )
+
+
+def _period_bounds(times, freq):
+    """Returns the beginning and ending timestamps of the `freq` period containing each of `times`. Bounds are computed
+    once per unique timestamp and broadcast back to all rows.
+    """
+    codes, uniques = pd.factorize(times, sort=False)
+    uniques = pd.DatetimeIndex(uniques)
+    if isinstance(freq, Tick):
+        begin = uniques.floor(freq)
+        end = begin + freq
+    else:
+        periods = uniques.to_period(freq)
+        begin = periods.start_time
+        end = (periods + 1).start_time
+    return begin.take(codes), end.take(codes)
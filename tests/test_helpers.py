@@ -0,0 +1,554 @@
+from nemed.helper_functions import result_cache, pricesetter_store, table_memo, unit_dimension, instrument, \
+    dispatch_store, cache_index
+from nemed.helper_functions.pricesetter_fetch import fetch_pricesetter_days, create_session, \
+    resolve_interval_members, parse_interval, load_day
+from nemed.helper_functions.mod_xml_cache import read_json_to_df
+from nemed.helper_functions.mod_nemosis import mms_cache_filename
+from nemed.helper_functions import mod_nemosis, pricesetter_fetch
+from nemed.helper_functions.monthly_factors import MonthlyFactorArray
+from nemed.helper_functions.effective_index import EffectiveDatedIndex
+from nemed import cli
+from nemed.downloader import _cdeii_summary_file, download_genset_map, download_dudetailsummary, _default_asof_date
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import functools
+import io
+import json
+import xmltodict
+import numpy as np
+import pandas as pd
+import threading
+import zipfile
+import pytest
+import os
+import time
+
+
+def test_result_cache_lookup_and_stale_inputs(tmp_path):
+    cache = str(tmp_path)
+    input_file = tmp_path / "PUBLIC_DVD_DISPATCH_UNIT_SCADA_202201010000.feather"
+    input_file.write_bytes(b"v1")
+    params = {'start_time': '2022/01/01 00:00', 'end_time': '2022/02/01 00:00', 'filter_regions': None}
+
+    key = result_cache.segment_key(params, [str(input_file)])
+    assert result_cache.lookup(cache, key) is None
+    (tmp_path / "segment.parquet").write_bytes(b"")
+    result_cache.record(cache, key, "segment.parquet", params)
+    assert result_cache.lookup(cache, key) == "segment.parquet"
+
+    # Different parameters or changed inputs do not match the cached segment
+    other_params = dict(params, filter_regions=['TAS1'])
+    assert result_cache.lookup(cache, result_cache.segment_key(other_params, [str(input_file)])) is None
+    time.sleep(0.01)
+    input_file.write_bytes(b"version 2")
+    new_key = result_cache.segment_key(params, [str(input_file)])
+    assert new_key != key and result_cache.lookup(cache, new_key) is None
+
+    # Recording the recomputed segment replaces the stale entry and removes its file
+    (tmp_path / "segment_v2.parquet").write_bytes(b"")
+    result_cache.record(cache, new_key, "segment_v2.parquet", params)
+    assert list(result_cache.read_manifest(cache)) == [new_key]
+    assert not os.path.exists(tmp_path / "segment.parquet")
+
+
+def _pricesetter_zip(path, market_day, ocd_intervals=()):
+    with zipfile.ZipFile(path, 'w') as z:
+        for n in range(1, 289):
+            interval = market_day + timedelta(hours=4, minutes=5 * n)
+            name = "NEMPriceSetter_{}{:03d}00{}.xml".format(market_day.strftime("%Y%m%d"), n,
+                                                           "_OCD" if n in ocd_intervals else "")
+            entries = "".join(f'<PriceSetting PeriodID="{interval:%Y-%m-%dT%H:%M:%S}+10:00" RegionID="{region}" '
+                              f'Market="{market}" Price="50" Unit="UNIT_A" DispatchedMarket="{dispatched}" BandNo="3" '
+                              f'Increase="1" RRNBandPrice="50" BandCost="50"/>'
+                              for region in ['NSW1', 'VIC1']
+                              for market, dispatched in [('Energy', 'ENOF'), ('Raise6Sec', 'R6SE')])
+            z.writestr(name, f"<SolutionAnalysis>{entries}</SolutionAnalysis>")
+
+
+@pytest.fixture
+def nemweb_standin(tmp_path):
+    """Local HTTP server standing in for the NEMWEB price setter archive"""
+    served = tmp_path / "nemweb"
+    served.mkdir()
+    handler = functools.partial(QuietHandler, directory=str(served))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield served, "http://127.0.0.1:{}/".format(server.server_port) + "NemPriceSetter_{year}{month}{day}_xml.zip"
+    server.shutdown()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def test_fetch_pricesetter_days_pipeline(tmp_path, nemweb_standin):
+    served, base_url = nemweb_standin
+    for market_day in [datetime(2022, 1, 1), datetime(2022, 1, 2), datetime(2022, 1, 3)]:
+        _pricesetter_zip(served / "NemPriceSetter_{}_xml.zip".format(market_day.strftime("%Y%m%d")), market_day,
+                         ocd_intervals=(240, 241))
+    cache = tmp_path / "cache"
+    cache.mkdir()
+
+    written = []
+    def write_day(day, entries):
+        written.append(day)
+        pricesetter_store.write_day(str(cache), day, entries)
+
+    days = [datetime(2022, 1, 5), datetime(2022, 1, 3), datetime(2022, 1, 2)]
+    failed = fetch_pricesetter_days(days, write_day, max_downloads=2, max_parsers=2,
+                                    session=create_session(backoff_factor=0), base_url=base_url)
+    assert written == [datetime(2022, 1, 2), datetime(2022, 1, 3)]
+    assert failed == [datetime(2022, 1, 5)]
+    assert sorted(os.listdir(cache)) == [pricesetter_store.STORE_DIR, cache_index.JOURNAL_NAME, cache_index.INDEX_NAME]
+    assert pricesetter_store.stored_days(str(cache)) == {datetime(2022, 1, 2), datetime(2022, 1, 3)}
+
+    table = pricesetter_store.read_pricesetters(str(cache), datetime(2022, 1, 2), datetime(2022, 1, 4))
+    assert len(table) == 2 * 288 * 2
+    assert table['PeriodID'].min() == datetime(2022, 1, 2, 0, 5)
+    assert table['PeriodID'].max() == datetime(2022, 1, 4)
+    assert table['PeriodID'].drop_duplicates().diff().dropna().eq(timedelta(minutes=5)).all()
+
+    vic = pricesetter_store.read_pricesetters(str(cache), datetime(2022, 1, 2, 12), datetime(2022, 1, 3, 12),
+                                              regions=['VIC1'])
+    assert len(vic) == 288 and (vic['RegionID'] == 'VIC1').all()
+    assert vic['PeriodID'].min() == datetime(2022, 1, 2, 12, 5)
+
+    # The day-level loader returns the same records as the pipeline
+    records = load_day(datetime(2022, 1, 3), session=create_session(backoff_factor=0), base_url=base_url)
+    day = pricesetter_store.read_pricesetters(str(cache), datetime(2022, 1, 3), datetime(2022, 1, 4))
+    pd.testing.assert_frame_equal(pd.DataFrame(records).assign(PeriodID=lambda x: pd.to_datetime(x['PeriodID'])),
+                                  unit_dimension.decode(day))
+
+    # A day deleted from the store is forgotten once it is found missing on reading, so it is retrieved again
+    os.remove(pricesetter_store.day_path(str(cache), datetime(2022, 1, 2)))
+    assert len(pricesetter_store.read_pricesetters(str(cache), datetime(2022, 1, 2), datetime(2022, 1, 4))) == 288 * 2
+    assert pricesetter_store.stored_days(str(cache)) == {datetime(2022, 1, 3)}
+
+
+def test_fetch_pricesetter_days_bounded_window(tmp_path, nemweb_standin, monkeypatch):
+    served, base_url = nemweb_standin
+    for n in range(9):
+        if n != 4:
+            market_day = datetime(2022, 1, 1) + timedelta(days=n)
+            _pricesetter_zip(served / "NemPriceSetter_{}_xml.zip".format(market_day.strftime("%Y%m%d")), market_day)
+
+    # Track the day being assembled, and the furthest market day downloaded ahead of it
+    market_days_for, download_market_day = pricesetter_fetch.market_days_for, pricesetter_fetch.download_market_day
+    current, ahead = [datetime(2022, 1, 1)], []
+
+    def tracked_market_days_for(days):
+        if len(days) == 1:
+            current[0] = days[0]
+        return market_days_for(days)
+
+    def tracked_download(session, market_day, base_url):
+        ahead.append(market_day - current[0])
+        return download_market_day(session, market_day, base_url)
+
+    monkeypatch.setattr(pricesetter_fetch, 'market_days_for', tracked_market_days_for)
+    monkeypatch.setattr(pricesetter_fetch, 'download_market_day', tracked_download)
+    written = []
+    days = [datetime(2022, 1, 2) + timedelta(days=n) for n in range(8)]
+    failed = fetch_pricesetter_days(days, lambda day, entries: written.append(day), max_downloads=1, max_parsers=1,
+                                    session=create_session(backoff_factor=0), base_url=base_url)
+
+    # Market days failing to download release their window, so later days are still retrieved
+    assert failed == [datetime(2022, 1, 5), datetime(2022, 1, 6)]
+    assert written == [day for day in days if day not in failed]
+    assert max(ahead) <= timedelta(days=1)
+
+
+def test_fetch_pricesetter_days_non_contiguous(tmp_path, nemweb_standin):
+    served, base_url = nemweb_standin
+    for market_day in [datetime(2021, 12, 31), datetime(2022, 1, 1), datetime(2022, 1, 4), datetime(2022, 1, 5)]:
+        _pricesetter_zip(served / "NemPriceSetter_{}_xml.zip".format(market_day.strftime("%Y%m%d")), market_day)
+
+    # With a window of two market days, those of written days are released for the next requested day
+    written = []
+    days = [datetime(2022, 1, 1), datetime(2022, 1, 5)]
+    failed = fetch_pricesetter_days(days, lambda day, entries: written.append(day), max_downloads=1, max_parsers=1,
+                                    session=create_session(backoff_factor=0), base_url=base_url)
+    assert failed == [] and written == days
+
+
+def test_resolve_interval_members_variants():
+    names = ["NEMPriceSetter_2022010100100.xml", "NEMPriceSetter_2022010100200_OCD.xml",
+             "NEMPriceSetter_202201010030000.xml", "NEMPriceSetter_2022010100300_OCD.xml",
+             "NEMPriceSetter_2022010100300.xml", "NEMPriceSetter_2022010228800.xml", "readme.txt"]
+    members = resolve_interval_members(names)
+    market_day = datetime(2022, 1, 1)
+    assert members[(market_day, 1)] == "NEMPriceSetter_2022010100100.xml"
+    assert members[(market_day, 2)] == "NEMPriceSetter_2022010100200_OCD.xml"
+    assert members[(market_day, 3)] == "NEMPriceSetter_2022010100300.xml"
+    assert members[(datetime(2022, 1, 2), 288)] == "NEMPriceSetter_2022010228800.xml"
+    assert len(members) == 4
+
+
+def test_parse_interval_and_migrate_legacy_json(tmp_path, monkeypatch):
+    xml = ('<SolutionAnalysis>'
+           '<PriceSetting PeriodID="2022-01-02T00:05:00+10:00" RegionID="NSW1" Market="Energy" Price="50.5" '
+           'Unit="UNIT_A" DispatchedMarket="ENOF" BandNo="3" Increase="0.5" RRNBandPrice="51" BandCost="25.5"/>'
+           '<PriceSetting PeriodID="2022-01-02T00:05:00+10:00" RegionID="NSW1" Market="Raise6Sec" Price="2" '
+           'Unit="UNIT_B" DispatchedMarket="R6SE" BandNo="1" Increase="1" RRNBandPrice="2" BandCost="2"/>'
+           '</SolutionAnalysis>').encode()
+    records = parse_interval(io.BytesIO(xml))
+    assert records == [{'PeriodID': '2022-01-02 00:05:00', 'RegionID': 'NSW1', 'Price': 50.5, 'Unit': 'UNIT_A',
+                        'BandNo': 3, 'Increase': 0.5, 'RRNBandPrice': 51.0, 'BandCost': 25.5}]
+
+    # Legacy daily files (all entries as parsed by xmltodict) read the same as the compact records
+    legacy = xmltodict.parse(xml)['SolutionAnalysis']['PriceSetting']
+    for day, data in [('2022-01-02', legacy), ('2022-01-03', [dict(records[0], PeriodID='2022-01-03 00:05:00')])]:
+        with open(tmp_path / f"NEMED_PS_DAILY_{day}.json", 'w') as f:
+            json.dump(data, f)
+    table = read_json_to_df(datetime(2022, 1, 2), datetime(2022, 1, 4), str(tmp_path))
+    assert len(table) == 2
+    pd.testing.assert_frame_equal(table.iloc[[0]].drop(columns='PeriodID'),
+                                  table.iloc[[1]].drop(columns='PeriodID').set_axis([0]))
+
+    # Daily JSON files are kept where the day written to the store does not read back, then migrated once
+    write_day = pricesetter_store.write_day
+    with monkeypatch.context() as m:
+        m.setattr(pricesetter_store, 'write_day', lambda cache, day, records: write_day(cache, day, records[:0]))
+        assert pricesetter_store.migrate_json(str(tmp_path)) == 0
+    assert len(list(tmp_path.glob("NEMED_PS_DAILY_*.json"))) == 2
+    assert pricesetter_store.migrate_json(str(tmp_path)) == 2
+    assert pricesetter_store.migrate_json(str(tmp_path)) == 0
+    stored = pricesetter_store.read_pricesetters(str(tmp_path), datetime(2022, 1, 2), datetime(2022, 1, 4))
+    pd.testing.assert_frame_equal(unit_dimension.decode(stored), table)
+
+
+def test_memoize_table_invalidation(tmp_path):
+    source = tmp_path / "PUBLIC_DVD_DUALLOC_202201010000.feather"
+    source.write_bytes(b"v1")
+    calls = []
+
+    @table_memo.memoize_table(lambda cache, asof_date=None: [source])
+    def read_table(cache, asof_date=None):
+        calls.append(asof_date)
+        return pd.DataFrame({'DUID': ['UNIT_A'], 'VALUE': [len(calls)]})
+
+    first = read_table(str(tmp_path))
+    first.loc[0, 'VALUE'] = -1
+    assert read_table(str(tmp_path))['VALUE'].iloc[0] == 1
+    assert read_table(str(tmp_path), asof_date='2022/01/01 00:00')['VALUE'].iloc[0] == 2
+    assert len(calls) == 2
+
+    # Changed cache files invalidate the memoised table
+    time.sleep(0.01)
+    source.write_bytes(b"version 2")
+    assert read_table(str(tmp_path))['VALUE'].iloc[0] == 3
+    table_memo.clear_memo()
+    assert read_table(str(tmp_path))['VALUE'].iloc[0] == 4
+
+
+def test_unit_dimension_encode_concat_decode():
+    first = pd.DataFrame({'DUID': ['UNIT_B', 'UNIT_A'], 'Region': ['VIC1', 'NSW1'], 'Energy': [1.0, 2.0]})
+    second = pd.DataFrame({'DUID': ['UNIT_C', 'UNIT_A'], 'Region': ['QLD1', 'NSW1'], 'Energy': [3.0, 4.0]})
+    dtype = unit_dimension.unit_dtype(first['DUID'], second['DUID'])
+    assert list(dtype.categories) == ['UNIT_A', 'UNIT_B', 'UNIT_C']
+
+    encoded = [unit_dimension.encode(df) for df in [first, second]]
+    assert all(df['DUID'].dtype == 'category' and df['Energy'].dtype == float for df in encoded)
+    combined = unit_dimension.concat_encoded(encoded, ignore_index=True)
+    assert combined['DUID'].dtype == 'category' and combined['Region'].dtype == 'category'
+    pd.testing.assert_frame_equal(unit_dimension.decode(combined), pd.concat([first, second], ignore_index=True))
+
+    regions = unit_dimension.region_dtype(combined['Region'])
+    assert list(regions.categories) == sorted(regions.categories) and 'NEM' in regions.categories
+
+
+def test_instrument_stages():
+    with instrument.stage('download') as record:
+        record.rows_out = 1
+
+    exported = []
+    with instrument.profile(callback=exported.append, trace_allocations=True) as stats:
+        with instrument.stage('download', rows_in=10) as outer:
+            with instrument.stage('feather_read') as inner:
+                data = [0] * 100000
+                inner.rows_out = len(data)
+            del data
+            outer.rows_out = 5
+    assert [r.name for r in stats.records] == ['feather_read', 'download'] and exported == stats.records
+    assert outer.seconds >= inner.seconds and outer.peak_alloc_mb >= inner.peak_alloc_mb > 0
+
+    summary = stats.summary()
+    assert summary.loc['download', 'rows_in'] == 10 and summary.loc['feather_read', 'rows_out'] == 100000
+    assert list(stats.to_frame()['stage']) == ['feather_read', 'download']
+
+
+def test_warm_cache_resumes_mms_files(tmp_path, monkeypatch):
+    cache = str(tmp_path)
+    fetched = []
+
+    def cache_month(table_name, month, cache):
+        fetched.append((table_name, month))
+        if table_name == "GENUNITS" and month.month == 3:
+            raise Exception("file not available from NEMWEB")
+        open(mms_cache_filename(table_name, month.year, month.month, cache), 'w').close()
+
+    monkeypatch.setattr(cli, '_cache_mms_month', cache_month)
+    monkeypatch.setattr(cli, '_default_asof_date', lambda: datetime(2022, 6, 1))
+    open(mms_cache_filename("DISPATCH_UNIT_SCADA", 2022, 1, cache), 'w').close()
+
+    failed = cli.warm_cache("2022/01/15 00:00", "2022/02/28 23:55", cache, skip=['pricesetters', 'cdeii'])
+    assert failed == ["GENUNITS 2022-03 (file not available from NEMWEB)"]
+    scada = sorted(m for t, m in fetched if t == "DISPATCH_UNIT_SCADA")
+    assert scada == [datetime(2021, 12, 1), datetime(2022, 2, 1), datetime(2022, 3, 1)]
+    assert sorted(m for t, m in fetched if t == "DUALLOC") == [datetime(2022, 5, 1), datetime(2022, 6, 1)]
+
+    # A repeated run only retrieves files still missing
+    fetched.clear()
+    assert cli.main(["warm-cache", "--start", "2022/01/15 00:00", "--end", "2022/02/28 23:55", "--cache", cache,
+                     "--skip", "pricesetters", "cdeii"]) == 1
+    assert fetched == [("GENUNITS", datetime(2022, 3, 1))]
+
+
+def test_dispatch_store_reads_selected_units(tmp_path):
+    cache = str(tmp_path)
+    times = pd.date_range("2022/01/01 00:05", "2022/02/01 00:00", freq='5T')
+    scada = pd.DataFrame([(t, d, 1.0 + i) for t in times for i, d in enumerate(['UNIT_C', 'LOAD_A', 'UNIT_B'])],
+                         columns=['SETTLEMENTDATE', 'DUID', 'SCADAVALUE'])
+    feather = mms_cache_filename("DISPATCH_UNIT_SCADA", 2022, 1, cache)
+    scada.to_feather(feather)
+
+    start, end = datetime(2022, 1, 10), datetime(2022, 1, 11)
+    read = dispatch_store.read_unit_scada(cache, start, end, duids=['UNIT_B', 'UNIT_C'])
+    assert os.path.exists(dispatch_store.month_path(cache, start))
+    assert read['SETTLEMENTDATE'].min() == start + timedelta(minutes=5) and read['SETTLEMENTDATE'].max() == end
+    assert list(read['DUID'][:2]) == ['UNIT_B', 'UNIT_C'] and len(read) == 2 * 288
+    expected = scada[(scada['SETTLEMENTDATE'] > start) & (scada['SETTLEMENTDATE'] <= end)]
+    assert len(dispatch_store.read_unit_scada(cache, start, end)) == len(expected)
+    assert dispatch_store.read_unit_scada(cache, start, end, duids=[]).empty
+
+    # Changes to the cached feather file are written to the store
+    scada.assign(SCADAVALUE=-1.0).to_feather(feather)
+    later = os.path.getmtime(dispatch_store.month_path(cache, start)) + 5
+    os.utime(feather, (later, later))
+    assert (dispatch_store.read_unit_scada(cache, start, end, duids=['UNIT_B'])['SCADAVALUE'] == -1.0).all()
+
+
+def test_cache_index_lookups(tmp_path, monkeypatch):
+    cache = str(tmp_path)
+    (tmp_path / "PUBLIC_DVD_GENUNITS_202201010000.feather").write_bytes(b"v1")
+    (tmp_path / "PUBLIC_DVD_GENUNITS_202202010000.CSV").write_bytes(b"csv")
+
+    # The index is built by a single scan of the cache, then consulted without reading the directory
+    feather = os.path.join(cache, "PUBLIC_DVD_GENUNITS_202201010000.feather")
+    assert cache_index.find(cache, feather) == feather
+    assert cache_index.read_index(cache)["PUBLIC_DVD_GENUNITS_202201010000.feather"]['format'] == "feather"
+    stub = os.path.join(cache, "PUBLIC_DVD_GENUNITS_202202010000")
+    assert cache_index.find(cache, stub + ".CSV", stub + ".csv") == stub + ".CSV"
+
+    # Files written other than by NEMED after the index was built are not found until the cache is rescanned
+    later = os.path.join(cache, "PUBLIC_DVD_GENUNITS_202203010000.csv")
+    open(later, 'w').close()
+    monkeypatch.setattr(os.path, 'exists', lambda path: pytest.fail(f"{path} checked on disk"))
+    assert cache_index.find(cache, later[:-4] + ".CSV", later) is None
+    monkeypatch.undo()
+    assert cache_index.rescan(cache) == 3
+    assert not os.path.exists(os.path.join(cache, cache_index.JOURNAL_NAME))
+    assert cache_index.find(cache, later[:-4] + ".CSV", later) == later
+    assert cache_index.find(cache, os.path.join(cache, "missing.feather")) is None
+
+    # Recorded files carry a checksum, and changes within a batch are appended to the journal once on exit
+    journal = os.path.join(cache, cache_index.JOURNAL_NAME)
+    cache_index.record(cache, stub + ".CSV")
+    with open(journal) as f:
+        appended = len(f.readlines())
+    with cache_index.batch(cache):
+        with open(feather, 'wb') as f:
+            f.write(b"version 2")
+        cache_index.record(cache, feather)
+        os.remove(later)
+        cache_index.forget(cache, later)
+        assert "PUBLIC_DVD_GENUNITS_202203010000.csv" not in cache_index.read_index(cache)
+        with open(journal) as f:
+            assert len(f.readlines()) == appended
+    with open(journal) as f:
+        assert len(f.readlines()) == appended + 1
+    cache_index._loaded.clear()
+    on_disk = cache_index.read_index(cache)
+    assert "PUBLIC_DVD_GENUNITS_202203010000.csv" not in on_disk
+    assert on_disk["PUBLIC_DVD_GENUNITS_202201010000.feather"]['size'] == 9
+    assert cache_index.verify(cache, feather)
+    with open(feather, 'wb') as f:
+        f.write(b"version 3")
+    assert not cache_index.verify(cache, feather)
+
+    # Indexed files deleted from cache are listed until forgotten on lookup, and a large journal is compacted into the
+    # index
+    os.remove(feather)
+    assert cache_index.files(cache, "PUBLIC_DVD_GENUNITS_2022") == [feather, stub + ".CSV"]
+    assert cache_index.find(cache, feather) is None
+    assert cache_index.files(cache, "PUBLIC_DVD_GENUNITS_2022") == [stub + ".CSV"]
+    monkeypatch.setattr(cache_index, 'COMPACT_BYTES', 0)
+    cache_index.record(cache, stub + ".CSV")
+    assert not os.path.exists(os.path.join(cache, cache_index.JOURNAL_NAME))
+    cache_index._loaded.clear()
+    assert list(cache_index.read_index(cache)) == ["PUBLIC_DVD_GENUNITS_202202010000.CSV"]
+
+
+def test_fetch_loop_downloads_and_converts_in_parallel(tmp_path, monkeypatch):
+    cache = str(tmp_path)
+    downloads = []
+
+    def download_data(table_name, table_type, filename_stub, day, month, year, index, raw_data_location):
+        downloads.append((year, month))
+        if (year, month) == ('2022', '03'):
+            return
+        rows = ["C,NEMP.WORLD,DVD_GENUNITS", "I,PARTICIPANT_REGISTRATION,GENUNITS,2,GENSETID,CO2E_EMISSIONS_FACTOR"]
+        rows += [f"D,PARTICIPANT_REGISTRATION,GENUNITS,2,UNIT_{i},{int(month) / 10}" for i in range(3)]
+        rows += ["C,END OF REPORT,5"]
+        stub = mms_cache_filename("GENUNITS", int(year), int(month), raw_data_location)[:-len(".feather")]
+        with open(stub + ".CSV", 'w') as f:
+            f.write("\n".join(rows) + "\n")
+
+    monkeypatch.setattr(mod_nemosis, '_download_data', download_data)
+    mod_nemosis.overwrite_nemosis_defaults()
+    args = dict(start_search=datetime(2022, 1, 1), start_time=datetime(2022, 1, 1), end_time=datetime(2022, 4, 1),
+                table_name="GENUNITS", raw_data_location=cache, select_columns=["GENSETID", "CO2E_EMISSIONS_FACTOR"],
+                date_filter=None, keep_csv=False, max_downloads=3, max_converters=2)
+    tables = mod_nemosis.mod_dynamic_data_fetch_loop(**args)
+
+    # Months unavailable are attempted once, and the remainder returned in order
+    assert sorted(downloads) == [('2021', '12'), ('2022', '01'), ('2022', '02'), ('2022', '03'), ('2022', '04')]
+    assert [t['file_month'].iloc[0] for t in tables] == ['12', '01', '02', '04']
+    assert list(tables[2]['CO2E_EMISSIONS_FACTOR']) == ['0.2'] * 3
+    assert os.path.exists(mms_cache_filename("GENUNITS", 2022, 4, cache))
+    assert not [f for f in os.listdir(cache) if f.endswith(".CSV")]
+
+    # A repeated call only attempts the unavailable month, and results match those converted in turn
+    downloads.clear()
+    assert len(mod_nemosis.mod_dynamic_data_fetch_loop(**args)) == 4
+    assert downloads == [('2022', '03')]
+    (tmp_path / "sequential").mkdir()
+    sequential = mod_nemosis.mod_dynamic_data_fetch_loop(**dict(args, raw_data_location=str(tmp_path / "sequential"),
+                                                                max_downloads=1, max_converters=1))
+    for parallel_table, sequential_table in zip(tables, sequential):
+        pd.testing.assert_frame_equal(parallel_table, sequential_table)
+
+
+def test_monthly_factor_array_matches_merge():
+    factors = pd.DataFrame({'file_year': [2021, 2022, 2022, 2022, 2022], 'file_month': [12, 1, 1, 2, 2],
+                            'DUID': ['UNIT_A', 'UNIT_A', 'UNIT_B', 'UNIT_A', None],
+                            'CO2E_EMISSIONS_FACTOR': [0.9, 1.0, 0.5, 1.1, 2.0],
+                            'CO2E_ENERGY_SOURCE': ['Black coal', 'Black coal', 'Natural Gas', None, 'Hydro']})
+    rows = pd.DataFrame({'DUID': ['UNIT_B', 'UNIT_A', 'UNIT_A', 'UNIT_C', 'UNIT_A', 'UNIT_B'],
+                         'Time': pd.to_datetime(['2022-01-31 23:55', '2022-02-01 00:00', '2021-12-15', '2022-01-01',
+                                                 '2022-03-01', '2022-02-01'])})
+    dtype = unit_dimension.unit_dtype(factors['DUID'], rows['DUID'])
+    factors, rows = unit_dimension.encode(factors, {'DUID': dtype}), unit_dimension.encode(rows, {'DUID': dtype})
+
+    array = MonthlyFactorArray(factors, ['CO2E_EMISSIONS_FACTOR', 'CO2E_ENERGY_SOURCE'])
+    merged = rows.assign(file_year=rows['Time'].dt.year, file_month=rows['Time'].dt.month).merge(
+        factors, on=['file_year', 'file_month', 'DUID'], how='left')
+    np.testing.assert_array_equal(array.lookup('CO2E_EMISSIONS_FACTOR', rows['DUID'], rows['Time']),
+                                  merged['CO2E_EMISSIONS_FACTOR'].values)
+    sources = array.lookup('CO2E_ENERGY_SOURCE', rows['DUID'], rows['Time'])
+    assert list(pd.Series(sources).astype(object).fillna('-')) == ['Natural Gas', '-', 'Black coal', '-', '-', '-']
+    with pytest.raises(ValueError):
+        array.lookup('CO2E_EMISSIONS_FACTOR', rows['DUID'].astype(object), rows['Time'])
+
+
+def test_effective_dated_index_as_of_lookup():
+    table = pd.DataFrame({'DUID': ['UNIT_B', 'UNIT_A', 'UNIT_A', 'UNIT_A', 'UNIT_B', None],
+                          'EFFECTIVEDATE': pd.to_datetime(['2020-01-01', '2021-06-01', '2020-01-01', '2021-06-01',
+                                                           '2022-01-01', '2020-01-01']),
+                          'REGIONID': ['VIC1', 'NSW1', 'QLD1', 'SA1', 'TAS1', 'VIC1'],
+                          'VALUE': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+    dtype = unit_dimension.unit_dtype(table['DUID'], pd.Series(['UNIT_C']))
+    table = unit_dimension.encode(table, {'DUID': dtype})
+    index = EffectiveDatedIndex(table, 'DUID', 'EFFECTIVEDATE', ['REGIONID', 'VALUE'])
+
+    keys = pd.Series(['UNIT_A', 'UNIT_A', 'UNIT_A', 'UNIT_B', 'UNIT_B', 'UNIT_B', 'UNIT_C']).astype(dtype)
+    times = pd.to_datetime(['2019-12-31', '2021-05-31 23:55', '2021-06-01', '2020-01-01', '2021-12-31', '2023-01-01',
+                            '2021-01-01'])
+    # Rows with the same key and date keep the last, and times before the first date have no value
+    np.testing.assert_array_equal(index.lookup('VALUE', keys, times), [np.nan, 3.0, 4.0, 1.0, 1.0, 5.0, np.nan])
+    regions = index.lookup('REGIONID', keys, times)
+    assert list(pd.Series(regions).astype(object).fillna('-')) == ['-', 'QLD1', 'SA1', 'VIC1', 'VIC1', 'TAS1', '-']
+    assert index.lookup('EFFECTIVEDATE', keys, times)[2] == np.datetime64('2021-06-01')
+
+    backfilled = EffectiveDatedIndex(table, 'DUID', 'EFFECTIVEDATE', ['VALUE'], backfill=True)
+    np.testing.assert_array_equal(backfilled.lookup('VALUE', keys, times), [3.0, 3.0, 4.0, 1.0, 1.0, 5.0, np.nan])
+
+
+def test_reference_table_history(tmp_path):
+    cache = str(tmp_path)
+    dualloc = pd.DataFrame({'EFFECTIVEDATE': ['2020/01/01 00:00:00'] * 3 + ['2022/03/01 00:00:00'] * 2,
+                            'VERSIONNO': ['1', '2', '2', '1', '1'],
+                            'DUID': ['UNIT_A', 'UNIT_A', 'UNIT_A', 'UNIT_B', 'UNIT_B'],
+                            'GENSETID': ['GEN_1', 'GEN_2', 'GEN_3', 'GEN_3', 'GEN_4'],
+                            'LASTCHANGED': '2020/01/01 00:00:00'})
+    dudetail = pd.DataFrame({'DUID': ['UNIT_A', 'UNIT_A', 'UNIT_A'],
+                             'START_DATE': ['2020/01/01 00:00:00', '2021/07/01 00:00:00', '2021/07/01 00:00:00'],
+                             'END_DATE': ['2021/07/01 00:00:00', '2999/12/31 00:00:00', '2999/12/31 00:00:00'],
+                             'DISPATCHTYPE': 'GENERATOR', 'REGIONID': ['NSW1', 'QLD1', 'VIC1'],
+                             'LASTCHANGED': ['2020/01/01 00:00:00', '2021/08/01 00:00:00', '2021/06/01 00:00:00']})
+    asof = _default_asof_date()
+    for table_name, table in [("DUALLOC", dualloc), ("DUDETAILSUMMARY", dudetail)]:
+        for path in result_cache.mms_month_files(table_name, asof, asof, cache):
+            table.to_feather(path)
+
+    # Only the latest version of each DUID and effective date is in effect
+    gensets = download_genset_map(cache, history=True)
+    assert list(gensets.itertuples(index=False, name=None)) == [
+        (datetime(2020, 1, 1), 'UNIT_A', 'GEN_2'), (datetime(2020, 1, 1), 'UNIT_A', 'GEN_3'),
+        (datetime(2022, 3, 1), 'UNIT_B', 'GEN_3'), (datetime(2022, 3, 1), 'UNIT_B', 'GEN_4')]
+    assert list(download_genset_map(cache)['DUID']) == ['UNIT_A', 'UNIT_A', 'UNIT_B', 'UNIT_B']
+
+    details = download_dudetailsummary(cache, history=True)
+    assert list(details['REGIONID']) == ['NSW1', 'QLD1']
+    assert details['START_DATE'].tolist() == [datetime(2020, 1, 1), datetime(2021, 7, 1)]
+    assert len(download_dudetailsummary(cache)) == 1
+
+
+def _cdeii_csv(path, days):
+    rows = ["C,NEMP.WORLD,CO2EII_SUMMARY_RESULTS", "I,CO2EII,PUBLISHING,1,CONTRACTYEAR,WEEKNO,SETTLEMENTDATE,"
+            "REGIONID,TOTAL_SENT_OUT_ENERGY,TOTAL_EMISSIONS,CO2E_INTENSITY_INDEX"]
+    rows += [f"D,CO2EII,PUBLISHING,1,2023,1,2023/01/{day:02d} 00:00:00,NSW1,100,80,0.8" for day in days]
+    path.write_text("\n".join(rows) + "\n")
+
+
+def test_cdeii_summary_file_cached_and_revalidated(tmp_path):
+    served = tmp_path / "nemweb"
+    served.mkdir()
+    _cdeii_csv(served / "CURRENT.CSV", [1, 2])
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    requests_seen = []
+
+    class RecordingHandler(QuietHandler):
+        def send_response(self, code, message=None):
+            requests_seen.append(code)
+            super().send_response(code, message)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RecordingHandler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/CURRENT.CSV".format(server.server_port)
+    try:
+        current = _cdeii_summary_file('CURRENT', url, "%Y/%m/%d %H:%M:%S", str(cache), revalidate=True)
+        assert list(current['SETTLEMENTDATE']) == [datetime(2023, 1, 1), datetime(2023, 1, 2)]
+
+        # Unchanged files are not downloaded again
+        again = _cdeii_summary_file('CURRENT', url, "%Y/%m/%d %H:%M:%S", str(cache), revalidate=True)
+        pd.testing.assert_frame_equal(again, current)
+        assert requests_seen == [200, 304]
+
+        _cdeii_csv(served / "CURRENT.CSV", [1, 2, 3])
+        later = os.stat(served / "CURRENT.CSV").st_mtime + 5
+        os.utime(served / "CURRENT.CSV", (later, later))
+        assert len(_cdeii_summary_file('CURRENT', url, "%Y/%m/%d %H:%M:%S", str(cache), revalidate=True)) == 3
+        assert requests_seen == [200, 304, 200]
+
+        # Historical files are parsed once and then read without any request
+        historical = _cdeii_summary_file('2022', url, "%Y/%m/%d %H:%M:%S", str(cache))
+        assert len(historical) == 3 and requests_seen[-1] == 200
+        assert len(_cdeii_summary_file('2022', "http://127.0.0.1:1/unreachable", "%Y/%m/%d %H:%M:%S",
+                                       str(cache))) == 3
+        assert os.path.exists(cache / "AEMO_CO2EII_2022.parquet")
+    finally:
+        server.shutdown()
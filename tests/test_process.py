@@ -0,0 +1,389 @@
+from nemed import process
+from nemed.nemed import get_total_emissions, profile
+from nemed.process import _calculate_energy_ramp, _condense_genset_co2_differences, aggregate_data_by, \
+    _stitch_energy_ramp, _last_dispatch_by_duid, _calculate_sent_out, _genset_duids
+from nemed.helper_functions import unit_dimension as ud
+import legacy
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+import os
+
+
+def _dispatch_table(duids=('UNIT_B', 'UNIT_A', 'UNIT_C'), intervals=12, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(datetime(2022, 1, 1, 0, 5), periods=intervals, freq='5T')
+    df = pd.DataFrame([(t, d) for t in times for d in duids], columns=['Time', 'DUID'])
+    df['Dispatch'] = rng.uniform(0, 300, len(df))
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def _legacy_energy_ramp(dispatch_df):
+    aggregate = []
+    for duid in dispatch_df['DUID'].unique():
+        sub_df = dispatch_df[dispatch_df['DUID'] == duid]
+        sub_df = sub_df.sort_values('Time')
+        sub_df.reset_index(drop=True, inplace=True)
+        sub_df['Dispatch_prev'] = np.nan
+        sub_df.loc[1:, 'Dispatch_prev'] = sub_df['Dispatch'][:len(sub_df)-1].to_list()
+        sub_df.loc[:, 'Energy'] = (0.5*(sub_df['Dispatch'] - sub_df['Dispatch_prev']) + sub_df['Dispatch_prev']) \
+            * (5 / 60)
+        aggregate += [sub_df]
+    return pd.concat(aggregate, ignore_index=True)
+
+
+def test_calculate_energy_ramp_matches_legacy():
+    table = _dispatch_table()
+    pd.testing.assert_frame_equal(_calculate_energy_ramp(table), _legacy_energy_ramp(table))
+
+
+def test_calculate_energy_ramp_gaps():
+    table = _dispatch_table(duids=('UNIT_A',), intervals=6)
+    table = table[table['Time'] != datetime(2022, 1, 1, 0, 15)]
+
+    ramp = _calculate_energy_ramp(table)
+    pd.testing.assert_frame_equal(ramp, _legacy_energy_ramp(table))
+
+    stepped = _calculate_energy_ramp(table, max_gap=1).set_index('Time')
+    after_gap = stepped.loc[datetime(2022, 1, 1, 0, 20)]
+    assert after_gap['Energy'] == pytest.approx(after_gap['Dispatch'] * 5 / 60)
+    assert np.isnan(stepped['Energy'].iloc[0])
+    assert (stepped['Energy'].iloc[3:] == ramp.set_index('Time')['Energy'].iloc[3:]).all()
+
+
+def _genset_factors_table():
+    rows = []
+    for year, month in [(2021, 12), (2022, 1), (2021, 11)]:
+        rows += [
+            (year, month, 'GEN_A1', 'UNIT_A', 0.9, 'Black coal', 'NGA 2018', '2018'),
+            (year, month, 'GEN_B1', 'UNIT_B', 0.5, 'Natural Gas', 'NGA 2018', '2018'),
+            (year, month, 'GEN_B2', 'UNIT_B', 0.7, 'Diesel oil', 'NGA 2018', '2018'),
+            (year, month, 'GEN_C1', 'UNIT_C', 0.4, 'Natural Gas', 'ISP 2018', '2018'),
+            (year, month, 'GEN_C2', 'UNIT_C', 0.6, 'Coal seam methane', 'NTNDP 2014', '2014'),
+            (year, month, 'GEN_D1', 'UNIT_D', None, 'Hydro', None, None),
+            (year, month, 'GEN_D2', 'UNIT_D', 0.0, 'Hydro', 'NGA 2018', '2018'),
+            (year, month, 'GEN_E1', None, 0.8, 'Brown coal', 'NGA 2018', '2018'),
+        ]
+    rows += [(2022, 2, 'GEN_B1', 'UNIT_B', 0.5, 'Natural Gas', 'NGA 2018', '2018')]
+    return pd.DataFrame(rows, columns=['file_year', 'file_month', 'GENSETID', 'DUID', 'CO2E_EMISSIONS_FACTOR',
+                                       'CO2E_ENERGY_SOURCE', 'CO2E_DATA_SOURCE', 'CO2E_DATA_YEAR'])
+
+
+def test_condense_genset_co2_differences_matches_legacy():
+    table = _genset_factors_table()
+    result = _condense_genset_co2_differences(table)
+    pd.testing.assert_frame_equal(result, legacy.condense_genset_co2_differences(table))
+
+    unit_b = result[(result['DUID'] == 'UNIT_B') & (result['file_month'] == 12)].iloc[0]
+    assert unit_b['CO2E_EMISSIONS_FACTOR'] == pytest.approx(0.6)
+    assert unit_b['CO2E_ENERGY_SOURCE'] == 'Natural Gas / Diesel oil'
+    unit_c = result[(result['DUID'] == 'UNIT_C') & (result['file_month'] == 12)].iloc[0]
+    assert unit_c['CO2E_ENERGY_SOURCE'] == 'Natural Gas'
+    assert not result.duplicated(['file_year', 'file_month', 'DUID']).any()
+
+
+def _region_table(start='2021/11/30 00:05', periods=24 * 12 * 40):
+    times = pd.date_range(start, periods=periods, freq='5T')
+    table = pd.concat([pd.DataFrame({'Time': times, 'Region': region, 'Energy_SO': 100.0 + i,
+                                     'Total_Emissions': 50.0 * (i + 1)})
+                       for i, region in enumerate(['VIC1', 'NSW1', 'NEM'])], ignore_index=True)
+    return table
+
+
+def test_aggregate_data_by_hour_and_day():
+    table = _region_table()
+    hourly = aggregate_data_by(table, 'hour')
+    assert list(hourly.columns) == ['TimeBeginning', 'TimeEnding', 'Region', 'Energy_SO', 'Total_Emissions']
+    assert list(hourly['Region'].unique()) == ['VIC1', 'NSW1', 'NEM']
+    first = hourly.iloc[0]
+    assert first['TimeBeginning'] == datetime(2021, 11, 30) and first['TimeEnding'] == datetime(2021, 11, 30, 1)
+    assert first['Energy_SO'] == pytest.approx(1200.0)
+
+    daily = aggregate_data_by(table.assign(Intensity_Index=0.0), 'day')
+    assert (daily.groupby('Region')['Energy_SO'].sum() == table.groupby('Region')['Energy_SO'].sum()).all()
+    assert daily['Intensity_Index'].iloc[0] == pytest.approx(0.5)
+
+
+def test_aggregate_data_by_month_spans_december():
+    monthly = aggregate_data_by(_region_table(), 'month')
+    vic = monthly[monthly['Region'] == 'VIC1']
+    assert list(vic['TimeBeginning']) == [datetime(2021, 11, 1), datetime(2021, 12, 1), datetime(2022, 1, 1)]
+    assert list(vic['TimeEnding']) == [datetime(2021, 12, 1), datetime(2022, 1, 1), datetime(2022, 2, 1)]
+    assert vic['Energy_SO'].iloc[1] == pytest.approx(100.0 * 31 * 288)
+
+
+def test_aggregate_data_by_pandas_frequencies():
+    table = _region_table(start='2022/06/30 23:35', periods=12)
+    financial = aggregate_data_by(table, 'financial_year')
+    assert financial['TimeBeginning'].drop_duplicates().tolist() == [datetime(2021, 7, 1), datetime(2022, 7, 1)]
+    assert financial.groupby('TimeBeginning')['Energy_SO'].sum().tolist() == pytest.approx([6 * 303.0, 6 * 303.0])
+
+    half_hourly = aggregate_data_by(table, '30T')
+    assert half_hourly['TimeEnding'].drop_duplicates().tolist() == [datetime(2022, 7, 1), datetime(2022, 7, 1, 0, 30)]
+
+    interval = aggregate_data_by(table, 'interval')
+    assert len(interval) == len(table)
+    assert (interval['TimeEnding'] - interval['TimeBeginning'] == timedelta(minutes=5)).all()
+
+    with pytest.raises(Exception):
+        aggregate_data_by(table, 'fortnightly')
+
+
+def test_stitch_energy_ramp_across_segments():
+    table = _dispatch_table(intervals=24)
+    table['Plant_Emissions_Intensity'] = table['DUID'].map({'UNIT_A': 0.9, 'UNIT_B': 0.5, 'UNIT_C': 1.1})
+
+    def process(df):
+        result = _calculate_energy_ramp(df)
+        result['Total_Emissions'] = result['Energy'] * result['Plant_Emissions_Intensity']
+        return result
+
+    expected = process(table).sort_values(['Time', 'DUID']).reset_index(drop=True)
+
+    boundary = datetime(2022, 1, 1, 1, 0)
+    last_dispatch, segments = None, []
+    for segment in [table[table['Time'] <= boundary], table[table['Time'] > boundary]]:
+        result = _stitch_energy_ramp(process(segment), last_dispatch, generation_sent_out=False)
+        last_dispatch = _last_dispatch_by_duid(result, last_dispatch)
+        segments += [result]
+    stitched = pd.concat(segments).sort_values(['Time', 'DUID']).reset_index(drop=True)
+
+    assert stitched['Energy'].isna().sum() == 3
+    pd.testing.assert_frame_equal(stitched, expected)
+
+
+def test_stitch_energy_ramp_steps_after_gap():
+    table = _dispatch_table(intervals=24)
+    table['Plant_Emissions_Intensity'] = 1.0
+    boundary = datetime(2022, 1, 1, 1, 0)
+    # UNIT_A is missing for the first three intervals after the boundary
+    table = table[~((table['DUID'] == 'UNIT_A') & table['Time'].between(boundary, boundary + timedelta(minutes=15),
+                                                                          inclusive='right'))]
+
+    def process(df):
+        result = _calculate_energy_ramp(df, max_gap=1)
+        result['Total_Emissions'] = result['Energy'] * result['Plant_Emissions_Intensity']
+        return result
+
+    first = process(table[table['Time'] <= boundary])
+    second = _stitch_energy_ramp(process(table[table['Time'] > boundary]), _last_dispatch_by_duid(first),
+                                 generation_sent_out=False, max_gap=1)
+    expected = process(table).set_index(['DUID', 'Time'])
+    pd.testing.assert_series_equal(second.set_index(['DUID', 'Time'])['Energy'],
+                                   expected.loc[second.set_index(['DUID', 'Time']).index, 'Energy'])
+    after_gap = second[second['DUID'] == 'UNIT_A'].iloc[0]
+    assert after_gap['Energy'] == pytest.approx(after_gap['Dispatch'] * 5 / 60)
+
+    # Records of DUIDs absent at the end of a segment are not carried into later segments
+    carried = _last_dispatch_by_duid(second[second['DUID'] != 'UNIT_B'], _last_dispatch_by_duid(first), max_gap=1)
+    assert sorted(carried.index) == ['UNIT_A', 'UNIT_C']
+    assert (carried['Time'] == table['Time'].max()).all()
+
+
+def test_calculate_sent_out_effective_dated(monkeypatch):
+    auxload = pd.DataFrame({'EFFECTIVEFROM': pd.to_datetime(['2018-07-17', '2018-07-17', '2018-07-17', '2022-01-01']),
+                            'DUID': ['MURRAY', 'MURRAY', 'UNIT_A', 'UNIT_A'],
+                            'PCT_AUXILIARY_LOAD': [1.0, 3.0, 5.0, 10.0]})
+    monkeypatch.setattr(process, 'read_plant_auxload_csv', lambda: auxload)
+    energy = pd.DataFrame({'DUID': ['MURRAY', 'UNIT_A', 'UNIT_A', 'UNIT_A', 'UNIT_X'],
+                           'Time': pd.to_datetime(['2022-01-01', '2017-01-01', '2021-12-31 23:55', '2022-01-01',
+                                                   '2022-01-01']),
+                           'Energy': 10.0})
+    energy = ud.encode(energy, {'DUID': ud.unit_dtype(energy['DUID'])})
+
+    # One row per input row, with the assumption in effect (the earliest before all), averaged where listed twice
+    result = _calculate_sent_out(energy)
+    assert len(result) == len(energy)
+    assert list(result['PCT_AUXILIARY_LOAD'].fillna(-1)) == [2.0, 5.0, 5.0, 10.0, -1]
+    assert list(result['Energy_SO']) == [9.8, 9.5, 9.5, 9.0, 10.0]
+
+
+def test_genset_duids_as_of_month():
+    genset_map = pd.DataFrame({'EFFECTIVEDATE': pd.to_datetime(['2020-01-01', '2021-06-15', '2021-06-15']),
+                               'DUID': ['UNIT_A', 'UNIT_B', 'UNIT_C'], 'GENSETID': ['GEN_1', 'GEN_1', 'GEN_2']})
+    co2factors = pd.DataFrame({'file_year': ['2019', '2021', '2021', '2021', '2021'],
+                               'file_month': ['1', '5', '6', '7', '7'],
+                               'GENSETID': ['GEN_1', 'GEN_1', 'GEN_1', 'GEN_1', 'GEN_9']})
+    # Allocated as of the end of each month, with the earliest allocation before it began
+    assert list(pd.Series(_genset_duids(co2factors, genset_map)).fillna('-')) == \
+        ['UNIT_A', 'UNIT_A', 'UNIT_B', 'UNIT_B', '-']
+
+
+def test_total_emissions_regions_as_of_interval(tmp_path, synthetic_inputs, monkeypatch):
+    details = pd.DataFrame({'DUID': ['UNIT_A', 'UNIT_A', 'UNIT_B', 'UNIT_C', 'LOAD_D'],
+                            'START_DATE': [datetime(2020, 1, 1), datetime(2022, 1, 1, 12), datetime(2020, 1, 1),
+                                           datetime(2020, 1, 1), datetime(2020, 1, 1)],
+                            'DISPATCHTYPE': ['GENERATOR'] * 4 + ['LOAD'],
+                            'REGIONID': ['VIC1', 'NSW1', 'NSW1', 'VIC1', 'VIC1']})
+    monkeypatch.setattr(process, 'download_dudetailsummary', lambda cache, asof_date=None, history=False: details)
+    result = process._total_emissions_process("2022/01/01 00:00", "2022/01/02 00:00", str(tmp_path))
+    unit_a = result[result['DUID'] == 'UNIT_A'].set_index('Time')['Region'].astype(object)
+    assert unit_a[datetime(2022, 1, 1, 11, 55)] == 'VIC1' and unit_a[datetime(2022, 1, 1, 12)] == 'NSW1'
+    assert 'LOAD_D' not in set(result['DUID'])
+
+
+def test_aggregate_data_by_encoded_regions():
+    table = _region_table(periods=24)
+    encoded = table.assign(Region=table['Region'].astype(pd.CategoricalDtype(['NEM', 'NSW1', 'VIC1'])))
+    pd.testing.assert_frame_equal(aggregate_data_by(encoded, 'hour'), aggregate_data_by(table, 'hour'))
+
+
+@pytest.fixture
+def synthetic_inputs(monkeypatch):
+    """Replaces downloads of dispatch, unit details and emissions factors with synthetic data"""
+    duids = ['UNIT_A', 'UNIT_B', 'UNIT_C', 'LOAD_D']
+
+    def dispatch(start_time, end_time, cache, **kwargs):
+        times = pd.date_range(dt_parse(start_time) + timedelta(minutes=5), dt_parse(end_time), freq='5T')
+        table = pd.DataFrame([(t, d) for t in times for d in duids], columns=['Time', 'DUID'])
+        table['Dispatch'] = (table['Time'].astype('int64') // 300e9 % 97 + table.index % 4).astype(float)
+        return table
+
+    def dudetailsummary(cache, asof_date=None, history=False):
+        return pd.DataFrame({'DUID': duids, 'START_DATE': datetime(2020, 1, 1), 'DISPATCHTYPE': ['GENERATOR'] * 3 + ['LOAD'],
+                             'REGIONID': ['VIC1', 'NSW1', 'VIC1', 'VIC1']})
+
+    def emissions_intensities(start_time, end_time, cache):
+        months = pd.date_range(dt_parse(start_time).replace(day=1, hour=0, minute=0), dt_parse(end_time), freq='MS')
+        return pd.DataFrame([(m.year, m.month, d, f, 'Black coal', 'NGA 2018') for m in months
+                             for d, f in zip(duids, [1.0, 0.5, 0.0, 0.1])],
+                            columns=['file_year', 'file_month', 'DUID', 'CO2E_EMISSIONS_FACTOR', 'CO2E_ENERGY_SOURCE',
+                                     'CO2E_DATA_SOURCE'])
+
+    def genset_map(cache, asof_date=None, history=False):
+        return pd.DataFrame({'EFFECTIVEDATE': datetime(2020, 1, 1), 'DUID': duids, 'GENSETID': duids})
+
+    monkeypatch.setattr(process, 'download_unit_dispatch', dispatch)
+    monkeypatch.setattr(process, 'download_dudetailsummary', dudetailsummary)
+    monkeypatch.setattr(process, 'download_genset_map', genset_map)
+    monkeypatch.setattr(process, '_get_duid_emissions_intensities', emissions_intensities)
+
+
+def dt_parse(time):
+    return datetime.strptime(time, "%Y/%m/%d %H:%M")
+
+
+def test_iter_total_emissions_by_DI_DUID(tmp_path, synthetic_inputs):
+    args = ("2022/01/31 22:00", "2022/03/02 02:00", str(tmp_path))
+    frames = list(process.iter_total_emissions_by_DI_DUID(*args))
+    assert len(frames) == 3
+    assert all(a['Time'].max() < b['Time'].min() for a, b in zip(frames, frames[1:]))
+    assert all(f['DUID'].dtype == object for f in frames)
+
+    full = process.get_total_emissions_by_DI_DUID(*args)
+    pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True), full)
+    assert full['Time'].min() == datetime(2022, 1, 31, 22, 5) and full['Time'].max() == datetime(2022, 3, 2, 2)
+    assert not full['Energy'].isna().any()
+
+
+def test_total_emissions_max_ramp_gap_opt_in(tmp_path, synthetic_inputs, monkeypatch):
+    dispatch = process.download_unit_dispatch
+    gap = (datetime(2022, 1, 31, 23, 0), datetime(2022, 2, 1, 1, 0))
+
+    def dispatch_with_gap(start_time, end_time, cache, **kwargs):
+        table = dispatch(start_time, end_time, cache, **kwargs)
+        return table[~((table['DUID'] == 'UNIT_A') & table['Time'].between(*gap, inclusive='left'))]
+
+    monkeypatch.setattr(process, 'download_unit_dispatch', dispatch_with_gap)
+    args = ("2022/01/31 20:00", "2022/02/01 04:00", str(tmp_path))
+    ramped = process.get_total_emissions_by_DI_DUID(*args).set_index(['DUID', 'Time'])
+    stepped = process.get_total_emissions_by_DI_DUID(*args, max_ramp_gap=1).set_index(['DUID', 'Time'])
+
+    # Only the first record of UNIT_A after the gap differs, being ramped from before the gap by default
+    differs = ramped['Energy'] != stepped['Energy']
+    assert differs[differs].index.tolist() == [('UNIT_A', gap[1])]
+    dispatched = dispatch_with_gap(*args).set_index(['DUID', 'Time']).loc[('UNIT_A', gap[1]), 'Dispatch']
+    assert stepped.loc[('UNIT_A', gap[1]), 'Energy'] == pytest.approx(dispatched * 5 / 60)
+
+
+def test_get_total_emissions_merges_periods_across_segments(tmp_path, synthetic_inputs):
+    args = ("2022/01/20 00:00", "2022/02/10 00:00", str(tmp_path))
+    intervals = get_total_emissions(*args)
+    weekly = get_total_emissions(*args, by='week')
+
+    # The week from 31 Jan 2022 spans the January and February segments
+    expected = aggregate_data_by(intervals.drop(columns='Intensity_Index'), 'week')
+    expected = expected.sort_values(['TimeEnding', 'Region']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(weekly.drop(columns='Intensity_Index'), expected)
+    assert datetime(2022, 1, 31) in set(weekly['TimeBeginning'])
+    assert list(weekly['Region'].unique()) == ['NEM', 'NSW1', 'VIC1']
+
+
+def test_get_total_emissions_from_rollups(tmp_path, synthetic_inputs, monkeypatch):
+    args = ("2022/01/15 00:00", "2022/04/10 00:00")
+    resolutions = [None, 'interval', 'hour', 'day', 'week', 'month']
+    (tmp_path / "computed").mkdir()
+    with monkeypatch.context() as m:
+        m.setattr(process, '_rollup_resolution', lambda by: None)
+        expected = {by: get_total_emissions(*args, str(tmp_path / "computed"), by=by) for by in resolutions}
+
+    (tmp_path / "rollup").mkdir()
+    cache = str(tmp_path / "rollup")
+    for by in resolutions:
+        pd.testing.assert_frame_equal(get_total_emissions(*args, cache, by=by), expected[by])
+    assert len(os.listdir(tmp_path / "rollup" / "NEMED_ROLLUP_STORE")) == 2
+
+    # Unaggregated intervals are computed from unit data, without writing rollups
+    (tmp_path / "intervals").mkdir()
+    for by in [None, 'interval']:
+        get_total_emissions(*args, str(tmp_path / "intervals"), by=by)
+    assert not os.path.exists(tmp_path / "intervals" / "NEMED_ROLLUP_STORE")
+
+    # Whole months are answered from the store without processing unit data
+    monkeypatch.setattr(process, '_iter_total_emissions', None)
+    monthly = get_total_emissions("2022/02/01 00:00", "2022/04/01 00:00", cache, by='month')
+    pd.testing.assert_frame_equal(monthly, expected['month'][expected['month']['TimeBeginning'].isin(
+        [datetime(2022, 2, 1), datetime(2022, 3, 1)])].reset_index(drop=True))
+    assert process._rollup_resolution('financial_year') == 'month'
+    assert process._rollup_resolution('week') == 'day'
+    assert process._rollup_resolution('10T') == 'interval'
+    assert process._rollup_resolution('7T') is None
+
+
+def test_get_total_emissions_rollups_missing_in_separate_runs(tmp_path, synthetic_inputs, monkeypatch):
+    args = ("2022/01/01 00:00", "2022/06/01 00:00")
+    (tmp_path / "computed").mkdir()
+    with monkeypatch.context() as m:
+        m.setattr(process, '_rollup_resolution', lambda by: None)
+        expected = get_total_emissions(*args, str(tmp_path / "computed"), by='month')
+
+    # January, March and May are stored, leaving February and April to be built in two separate runs
+    cache = str(tmp_path)
+    for start, end in [("2022/01/01 00:00", "2022/02/01 00:00"), ("2022/03/01 00:00", "2022/04/01 00:00"),
+                       ("2022/05/01 00:00", "2022/06/01 00:00")]:
+        get_total_emissions(start, end, cache, by='month')
+    iter_total_emissions = process._iter_total_emissions
+    built = []
+
+    def recording_iter(start_time, end_time, *iter_args):
+        built.append((start_time, end_time))
+        return iter_total_emissions(start_time, end_time, *iter_args)
+
+    monkeypatch.setattr(process, '_iter_total_emissions', recording_iter)
+    pd.testing.assert_frame_equal(get_total_emissions(*args, cache, by='month'), expected)
+    assert built == [("2022/02/01 00:00", "2022/03/01 00:00"), ("2022/04/01 00:00", "2022/05/01 00:00")]
+
+
+def test_segment_key_unchanged_by_later_reference_rows(tmp_path, synthetic_inputs, monkeypatch):
+    params = process._segment_params("2022/01/01 00:00", "2022/01/15 00:00", None, True, True, True)
+    key = process._segment_key(params, str(tmp_path))
+    details = process.download_dudetailsummary(str(tmp_path), history=True)
+
+    # A newer snapshot adding rows effective after the segment's month keeps its key, rows within it do not
+    later = pd.concat([details, details.iloc[[0]].assign(START_DATE=datetime(2022, 2, 1, 0, 5), REGIONID='NSW1')])
+    monkeypatch.setattr(process, 'download_dudetailsummary', lambda cache, asof_date=None, history=False: later)
+    assert process._segment_key(params, str(tmp_path)) == key
+    earlier = pd.concat([details, details.iloc[[0]].assign(START_DATE=datetime(2022, 1, 20), REGIONID='NSW1')])
+    monkeypatch.setattr(process, 'download_dudetailsummary', lambda cache, asof_date=None, history=False: earlier)
+    assert process._segment_key(params, str(tmp_path)) != key
+
+
+def test_get_total_emissions_profiled_stages(tmp_path, synthetic_inputs):
+    with profile() as stats:
+        get_total_emissions("2022/01/01 00:00", "2022/01/02 00:00", str(tmp_path), by='hour')
+    summary = stats.summary()
+    for name in ['download', 'region_filter', 'factor_merge', 'ramp', 'sent_out', 'aggregation']:
+        assert name in summary.index
+    assert summary.loc['region_filter', 'rows_out'] == summary.loc['factor_merge', 'rows_in']
+    assert (stats.to_frame()['seconds'] >= 0).all()